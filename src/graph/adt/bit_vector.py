@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Bit vector with rank support """
+from array import array
+import numpy as np
+from graph.core.base import Base
+
+
+class BitVector(Base):
+    """
+    Static bit vector, bits are packed (little endian) and a directory keeps
+    the number of ones before every block of BLOCK_SIZE bits,
+    N + 32 N / BLOCK_SIZE bits in total. rank is O(BLOCK_SIZE / 64).
+    """
+
+    BLOCK_SIZE = 256  # bits, multiple of 8
+
+    def __init__(self, bits):
+        """
+        bits - boolean array.
+        """
+        super().__init__()
+        bits = np.asarray(bits, dtype=np.bool_)
+        padded = np.zeros(-(-len(bits) // BitVector.BLOCK_SIZE) * BitVector.BLOCK_SIZE, dtype=np.bool_)
+        padded[:len(bits)] = bits
+        counts = padded.reshape(-1, BitVector.BLOCK_SIZE).sum(axis=1, dtype=np.uint32)
+        directory = np.zeros(len(counts) + 1, dtype=np.uint32)
+        np.cumsum(counts, out=directory[1:])
+        self.populate(len(bits), np.packbits(padded, bitorder='little'), directory)
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._length}:{self.count}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return self._length
+
+    def __getitem__(self, index):
+        """
+        """
+        return (self._bits[index >> 3] >> (index & 7)) & 1
+
+    def populate(self, length, bits, directory):
+        """
+        """
+        self._length = int(length)
+        self._bits = np.asarray(bits, dtype=np.uint8).tobytes()  # immutable, fast scalar access and slicing
+        self._directory = array('I', np.asarray(directory, dtype=np.uint32).tobytes())
+
+    @property
+    def count(self):
+        """
+        Number of ones.
+        """
+        return self._directory[-1]
+
+    @property
+    def nbytes(self):
+        """
+        """
+        return len(self._bits) + self._directory.itemsize * len(self._directory)
+
+    def rank1(self, index):
+        """
+        Number of ones in [0, index).
+        """
+        block = index // BitVector.BLOCK_SIZE
+        byte = index >> 3
+        result = self._directory[block]
+        result += int.from_bytes(self._bits[block * (BitVector.BLOCK_SIZE >> 3):byte], 'little').bit_count()
+        remainder = index & 7
+        if remainder:
+            result += (self._bits[byte] & ((1 << remainder) - 1)).bit_count()
+        return result
+
+    def rank0(self, index):
+        """
+        Number of zeros in [0, index).
+        """
+        return index - self.rank1(index)
+
+    def to_arrays(self):
+        """
+        Returns (length, packed bits, directory) for serialization.
+        """
+        return self._length, np.frombuffer(self._bits, dtype=np.uint8), np.asarray(self._directory, dtype=np.uint32)
+
+    @staticmethod
+    def from_arrays(length, bits, directory):
+        """
+        See to_arrays.
+        """
+        result = BitVector.__new__(BitVector)
+        Base.__init__(result)
+        result.populate(length, bits, directory)
+        return result
@@ -0,0 +1,223 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Compressed Sparse Row (CSR) graph """
+import numbers
+import numpy as np
+from graph.core.base import Base
+
+
+class CsrGraph(Base):
+    """
+    Frozen Compressed Sparse Row (CSR) graph representation.
+    Vertices are numbered densely 0 ... N-1, out-adjacencies of vertex k are
+    targets[offsets[k]:offsets[k + 1]] with weights[offsets[k]:offsets[k + 1]].
+    Memory is O(N + E) machine words, arrays are read-only once built.
+    """
+
+    def __init__(self,
+                 offsets,
+                 targets,
+                 weights=None,  # None means unit weights
+                 ids=None,      # original vertex ids, dense index -> id
+                 digraph=True):
+        """
+        """
+        super().__init__()
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._targets = np.asarray(targets, dtype=CsrGraph.get_index_type(len(self._offsets) - 1))
+        self._weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        assert self._offsets.ndim == 1 and len(self._offsets) > 0, "Invalid offsets."
+        assert self._offsets[0] == 0 and self._offsets[-1] == len(self._targets), "Invalid offsets, size mismatch."
+        assert self._weights is None or len(self._weights) == len(self._targets), "Invalid weights, size mismatch."
+        number_of_vertices = len(self._offsets) - 1
+        if ids is None:
+            ids = np.arange(number_of_vertices)
+        self._ids = np.asarray(ids)
+        assert len(self._ids) == number_of_vertices, "Invalid ids, size mismatch."
+        self._digraph = digraph
+        self._indices = None  # id -> dense index, populated on demand
+        for array in (self._offsets, self._targets, self._weights, self._ids):
+            if array is not None:
+                array.flags.writeable = False  # frozen
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self.number_of_vertices}:{self.number_of_edges}:{self._digraph}"
+
+    __str__ = __repr__
+
+    @property
+    def offsets(self):
+        """
+        """
+        return self._offsets
+
+    @property
+    def targets(self):
+        """
+        """
+        return self._targets
+
+    @property
+    def weights(self):
+        """
+        """
+        return self._weights
+
+    @property
+    def ids(self):
+        """
+        """
+        return self._ids
+
+    @property
+    def digraph(self):
+        """
+        """
+        return self._digraph
+
+    @property
+    def number_of_vertices(self):
+        """
+        """
+        return len(self._offsets) - 1
+
+    @property
+    def number_of_edges(self):
+        """
+        """
+        return len(self._targets)
+
+    @property
+    def nbytes(self):
+        """
+        Memory occupied by the arrays, in bytes.
+        """
+        result = self._offsets.nbytes + self._targets.nbytes + self._ids.nbytes
+        if self._weights is not None:
+            result += self._weights.nbytes
+        return result
+
+    def index_of(self, id):
+        """
+        Returns dense index of the vertex with the given (original) id.
+        """
+        if self._indices is None:
+            self._indices = {vertex_id: k for k, vertex_id in enumerate(self._ids.tolist())}
+        return self._indices[id]
+
+    def get_vertex_degree(self, index):
+        """
+        """
+        return int(self._offsets[index + 1] - self._offsets[index])
+
+    def get_adjacencies(self, index):
+        """
+        Returns (targets, weights) views of the out-adjacencies of the vertex.
+        """
+        lo = self._offsets[index]
+        hi = self._offsets[index + 1]
+        weights = None if self._weights is None else self._weights[lo:hi]
+        return self._targets[lo:hi], weights
+
+    def get_weights(self):
+        """
+        Returns weights, unit weights if the graph is unweighted.
+        """
+        if self._weights is None:
+            return np.ones(len(self._targets), dtype=np.float64)
+        return self._weights
+
+    def get_sources(self):
+        """
+        Returns source vertex of every edge, aligned with targets.
+        """
+        return np.repeat(np.arange(self.number_of_vertices, dtype=self._targets.dtype), np.diff(self._offsets))
+
+    def transpose(self):
+        """
+        Builds CSR of the reversed graph (in-adjacencies), for undirected graphs it is the graph itself.
+        """
+        if not self._digraph:
+            return self
+        return CsrGraph.from_edges(self._targets,
+                                   self.get_sources(),
+                                   self._weights,
+                                   number_of_vertices=self.number_of_vertices,
+                                   ids=self._ids,
+                                   digraph=True)
+
+    @staticmethod
+    def get_index_type(number_of_vertices):
+        """
+        """
+        return np.int32 if number_of_vertices < np.iinfo(np.int32).max else np.int64
+
+    @staticmethod
+    def from_edges(sources,
+                   targets,
+                   weights=None,
+                   number_of_vertices=None,
+                   ids=None,
+                   digraph=True):
+        """
+        Builds CSR directly from edge arrays of dense vertex indices.
+        For undirected graphs every edge is stored in both directions, U -> V and U <- V,
+        the same way Graph.add_edge does. Adjacency order per vertex follows edges order.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        assert sources.shape == targets.shape, "Invalid edges, size mismatch."
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+            assert weights.shape == sources.shape, "Invalid weights, size mismatch."
+        if number_of_vertices is None:
+            number_of_vertices = int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+        if not digraph:
+            sources, targets = (np.stack((sources, targets), axis=1).ravel(),
+                                np.stack((targets, sources), axis=1).ravel())
+            if weights is not None:
+                weights = np.repeat(weights, 2)
+        offsets, targets, weights = CsrGraph.compress(sources, targets, weights, number_of_vertices)
+        return CsrGraph(offsets, targets, weights, ids=ids, digraph=digraph)
+
+    @staticmethod
+    def compress(sources, targets, weights, number_of_vertices):
+        """
+        Groups edges by source vertex, returns offsets, targets and weights arrays.
+        """
+        order = np.argsort(sources, kind='stable')  # stable, keeps adjacencies order
+        counts = np.bincount(sources, minlength=number_of_vertices)
+        offsets = np.zeros(number_of_vertices + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets, targets[order], None if weights is None else weights[order]
+
+    @staticmethod
+    def from_graph(graph, weight=None):
+        """
+        Builds CSR from Graph, vertices are numbered in graph.vertices order.
+        weight - optional callable edge -> number, by default edge values are used
+                 if all of them are numbers, otherwise the graph is unweighted.
+        """
+        ids = list(graph.vertices.keys())
+        indices = {id: k for k, id in enumerate(ids)}
+        sources = list()
+        targets = list()
+        values = list()
+        for vertex in graph.vertices.values():  # vertex adjacencies order is preserved
+            for adjacence in vertex.adjacencies:
+                sources.append(indices[vertex.id])
+                targets.append(indices[adjacence.vertex.id])
+                values.append(weight(adjacence.edge) if weight else adjacence.edge.value)
+        weights = None
+        if all(isinstance(value, numbers.Real) for value in values):
+            weights = np.asarray(values, dtype=np.float64)
+        offsets, targets, weights = CsrGraph.compress(np.asarray(sources, dtype=np.int64),
+                                                      np.asarray(targets, dtype=np.int64),
+                                                      weights,
+                                                      len(ids))
+        # undirected graph already holds both directions U -> V and U <- V
+        return CsrGraph(offsets, targets, weights, ids=ids, digraph=graph.digraph)
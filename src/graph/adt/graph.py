@@ -4,6 +4,7 @@
 #
 """ Graph string type """
 import numpy as np
+from graph.core.domain_helper import DomainHelper
 from graph.core.entity import Entity
 from graph.adt.edge import Edge
 
@@ -27,6 +28,8 @@ class Graph(Entity):
         self._attributes = attributes
         self._vertices = dict()
         self._edges = dict()
+        self._predecessors = dict()  # in-adjacency index, V -> {edge id: (U, U -> V edge)}
+        self._edges_counter = 0  # edge ids are never reused
 
     def __repr__(self):
         """
@@ -111,19 +114,20 @@ class Graph(Entity):
         assert vertex is not None, "Invalid argument 'vertex'"
         assert vertex.id not in self.vertices, f"Vertex already exist: {vertex}"
         self._vertices[vertex.id] = vertex
+        self._predecessors[vertex.id] = dict()
 
     def remove_vertex(self, vertex):
         """
         """
         assert vertex is not None, "Invalid argument 'vertex'"
         assert vertex.id in self.vertices, f"Missing vertex: {vertex}"
-        edges = self._edges.values()
-        for edge in list(edges):
-            vertex_u = edge.endpoints[0]
-            vertex_v = edge.endpoints[1]
-            if vertex_u.id == vertex.id or vertex_v.id == vertex.id:
-                self.remove_edge(edge)
+        for adjacence in vertex.adjacencies:  # U -> V edges
+            self.remove_edge(adjacence.edge)
+        for adjacence in list(self._predecessors[vertex.id].values()):  # U <- V edges
+            self.remove_edge(adjacence.edge)
         assert len(vertex.adjacencies) == 0
+        assert len(self._predecessors[vertex.id]) == 0
+        del self._predecessors[vertex.id]
         del self._vertices[vertex.id]
 
     def add_edge(self, vertex_u, vertex_v, edge_value=None):
@@ -134,12 +138,14 @@ class Graph(Entity):
         assert vertex_v is not None, "Invalid argument 'vertex'"
         assert vertex_u.id in self.vertices, f"Missing vertex: {vertex_u}"
         assert vertex_v.id in self.vertices, f"Missing vertex: {vertex_v}"
-        edge = Edge(len(self._edges) + 1, [vertex_u, vertex_v], edge_value, version=self._version)
+        edge = Edge(self.get_next_edge_id(), [vertex_u, vertex_v], edge_value, version=self._version)
         vertex_u.add_adjacence(vertex_v, edge)  # add adjacent, U -> V
+        self._predecessors[vertex_v.id][edge.id] = DomainHelper.AdjValue(vertex_u, edge)
         self._edges[edge.id] = edge
         if not self._digraph:
-            edge = Edge(len(self._edges) + 1, [vertex_v, vertex_u], edge_value, version=self._version)
+            edge = Edge(self.get_next_edge_id(), [vertex_v, vertex_u], edge_value, version=self._version)
             vertex_v.add_adjacence(vertex_u, edge)  # add adjacent, U <- V
+            self._predecessors[vertex_u.id][edge.id] = DomainHelper.AdjValue(vertex_v, edge)
             self._edges[edge.id] = edge
 
     def remove_edge(self, edge):
@@ -154,8 +160,27 @@ class Graph(Entity):
         assert vertex_u.id in self.vertices, f"Missing vertex: {vertex_u}"
         assert vertex_v.id in self.vertices, f"Missing vertex: {vertex_v}"
         vertex_u.remove_adjacence(vertex_v, edge)  # break U -> V relation
+        del self._predecessors[vertex_v.id][edge.id]
         del self._edges[edge.id]
 
+    def get_next_edge_id(self):
+        """
+        """
+        self._edges_counter += 1
+        return self._edges_counter
+
+    def get_predecessors(self, vertex):
+        """
+        Returns (U, edge) pairs of all U -> V edges, O(in-degree).
+        """
+        assert vertex.id in self.vertices, f"Missing vertex: {vertex}"
+        return tuple(self._predecessors[vertex.id].values())
+
+    def get_vertex_in_degree(self, vertex):
+        """
+        """
+        return len(self._predecessors[vertex.id])
+
     def get_vertex_degree(self, vertex):
         """
         """
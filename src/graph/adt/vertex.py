@@ -150,6 +150,10 @@ class Vertex(Entity, Visitable):
     def remove_adjacence(self, vertex, edge):
         """
         """
+        for k, adjacence in enumerate(self._adjacencies):
+            if adjacence.edge is edge:  # identity first, avoids deep equality of vertices
+                del self._adjacencies[k]
+                return
         self._adjacencies.remove(DomainHelper.AdjValue(vertex, edge))
 
     def validate(self):
@@ -0,0 +1,131 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Wavelet matrix """
+import numpy as np
+from graph.core.base import Base
+from graph.adt.bit_vector import BitVector
+
+
+class WaveletMatrix(Base):
+    """
+    Wavelet matrix over a sequence of integers 0 <= x < abc_size,
+    F. Claude, G. Navarro, 'The Wavelet Matrix', SPIRE 2012.
+    Level l keeps bit (L - 1 - l) of every value, values are stably partitioned
+    by that bit (zeros first) before the next level, L = ceil(log(abc_size)).
+    Memory is about N log(abc_size) bits, access and rank are O(log(abc_size)).
+    """
+
+    def __init__(self, values, abc_size):
+        """
+        """
+        super().__init__()
+        values = np.asarray(values, dtype=np.int64)
+        assert len(values) == 0 or (values.min() >= 0 and values.max() < abc_size), "Invalid values, alphabet."
+        self._length = len(values)
+        self._abc_size = int(abc_size)
+        self._bits = list()   # bit vector per level
+        self._zeros = list()  # number of zeros per level
+        number_of_levels = max(1, (self._abc_size - 1).bit_length())
+        for level in range(number_of_levels):
+            bits = ((values >> (number_of_levels - 1 - level)) & 1).astype(np.bool_)
+            self._bits.append(BitVector(bits))
+            self._zeros.append(self._length - self._bits[-1].count)
+            values = np.concatenate((values[~bits], values[bits]))  # stable partition
+        self._starts = WaveletMatrix.calculate_starts(values, self._abc_size)
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._length}:{self._abc_size}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return self._length
+
+    def __getitem__(self, index):
+        """
+        """
+        return self.access_rank(index)[0]
+
+    @property
+    def abc_size(self):
+        """
+        """
+        return self._abc_size
+
+    @property
+    def nbytes(self):
+        """
+        """
+        return sum(bits.nbytes for bits in self._bits) + self._starts.nbytes
+
+    @staticmethod
+    def calculate_starts(values, abc_size):
+        """
+        Returns offset of every value at the last level, values are in the last level order.
+        """
+        starts = np.zeros(abc_size, dtype=np.int64)
+        if len(values):
+            first = np.ones(len(values), dtype=np.bool_)
+            first[1:] = values[1:] != values[:-1]
+            positions = np.flatnonzero(first)
+            starts[values[positions]] = positions
+        return starts
+
+    def rank(self, value, index):
+        """
+        Number of occurrences of the value in [0, index).
+        """
+        number_of_levels = len(self._bits)
+        for level, bits in enumerate(self._bits):
+            if (value >> (number_of_levels - 1 - level)) & 1:
+                index = self._zeros[level] + bits.rank1(index)
+            else:
+                index = bits.rank0(index)
+        return index - int(self._starts[value])
+
+    def access_rank(self, index):
+        """
+        Returns value at the index and number of its occurrences in [0, index).
+        """
+        value = 0
+        for level, bits in enumerate(self._bits):
+            bit = bits[index]
+            value = (value << 1) | bit
+            if bit:
+                index = self._zeros[level] + bits.rank1(index)
+            else:
+                index = bits.rank0(index)
+        return value, index - int(self._starts[value])
+
+    def to_arrays(self):
+        """
+        Returns dictionary of arrays for serialization.
+        """
+        result = {'length': np.int64(self._length),
+                  'abc_size': np.int64(self._abc_size),
+                  'zeros': np.asarray(self._zeros, dtype=np.int64),
+                  'starts': self._starts}
+        for level, bits in enumerate(self._bits):
+            _, result[f'bits_{level}'], result[f'directory_{level}'] = bits.to_arrays()
+        return result
+
+    @staticmethod
+    def from_arrays(arrays):
+        """
+        See to_arrays.
+        """
+        result = WaveletMatrix.__new__(WaveletMatrix)
+        Base.__init__(result)
+        result._length = int(arrays['length'])
+        result._abc_size = int(arrays['abc_size'])
+        result._zeros = arrays['zeros'].tolist()
+        result._starts = np.asarray(arrays['starts'], dtype=np.int64)
+        result._bits = [BitVector.from_arrays(result._length, arrays[f'bits_{level}'], arrays[f'directory_{level}'])
+                        for level in range(len(result._zeros))]
+        return result
@@ -0,0 +1,253 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Aho-Corasick multi-pattern matcher """
+import bisect
+from array import array
+from collections import deque
+import numpy as np
+from graph.core.base import Base
+from graph.algorithms.suffix_array import SuffixArray
+
+
+class AhoCorasick(Base):
+    """
+    Aho-Corasick automaton over a set of patterns, all occurrences of all patterns
+    are reported in a single pass over the text,
+      A. Aho, M. Corasick, 'Efficient string matching: an aid to bibliographic search',
+      Communications of the ACM 18 (1975) 333-340.
+    Symbols of patterns are mapped to dense ids 1 ... K, any other symbol is 0.
+    Small alphabets (K < DENSE_MAX_WIDTH) fold goto and fail into a complete transition table (DFA),
+    states x (K + 1) int32 (flat array('i')), so every text symbol costs one table lookup.
+    Wide alphabets (CJK text, integer tokens) keep goto sparse, CSR arrays of sorted edges
+    of every state, memory is O(trie edges), a text symbol costs amortized O(1) fail steps
+    of O(log degree) edge lookups. Outputs are kept as CSR arrays of patterns ending at every state
+    plus output (dictionary suffix) links to the next state with outputs.
+    patterns might be str, bytes or sequences of integers (tokens), texts must be of the same kind.
+    """
+    BLOCK_SIZE = 1 << 12  # symbols per block of limited searches, see search
+    DENSE_MAX_WIDTH = 256  # symbol ids (K + 1) of the complete transition table
+
+    def __init__(self, patterns):
+        """
+        """
+        super().__init__()
+        self._patterns = [pattern if isinstance(pattern, (str, bytes)) else list(pattern) for pattern in patterns]
+        assert all(len(pattern) > 0 for pattern in self._patterns), "Invalid pattern, empty."
+        symbols = [SuffixArray.get_symbols(pattern) for pattern in self._patterns]
+        self._alphabet = np.unique(np.concatenate(symbols)) if symbols else np.zeros(0, dtype=np.int64)
+        width = len(self._alphabet) + 1
+        # trie, goto function
+        children = [dict()]
+        terminals = [list()]
+        for pattern_id, pattern in enumerate(symbols):
+            state = 0
+            for symbol in (np.searchsorted(self._alphabet, pattern) + 1).tolist():
+                child = children[state].get(symbol)
+                if child is None:
+                    child = len(children)
+                    children[state][symbol] = child
+                    children.append(dict())
+                    terminals.append(list())
+                state = child
+            terminals[state].append(pattern_id)
+        number_of_states = len(children)
+        fail = [0] * number_of_states
+        links = [0] * number_of_states  # output links
+        queue = deque(children[0].values())
+        self._width = width
+        if width <= AhoCorasick.DENSE_MAX_WIDTH:
+            # fail function in BFS order, transitions of a state are those of its fail state overridden by goto
+            transitions = np.zeros((number_of_states, width), dtype=np.int32)
+            for symbol, child in children[0].items():
+                transitions[0, symbol] = child
+            while queue:
+                state = queue.popleft()
+                transitions[state] = transitions[fail[state]]
+                for symbol, child in children[state].items():
+                    fail[child] = int(transitions[fail[state], symbol])
+                    links[child] = fail[child] if terminals[fail[child]] else links[fail[child]]
+                    transitions[state, symbol] = child
+                    queue.append(child)
+            self._transitions = array('i', transitions.tobytes())
+            self._edge_starts = self._edge_symbols = self._edge_targets = array('i')
+        else:
+            # fail function in BFS order over goto
+            self._transitions = array('i')
+            while queue:
+                state = queue.popleft()
+                for symbol, child in children[state].items():
+                    target = fail[state]
+                    while target and symbol not in children[target]:
+                        target = fail[target]
+                    target = children[target].get(symbol, 0)
+                    fail[child] = target if target != child else 0
+                    links[child] = fail[child] if terminals[fail[child]] else links[fail[child]]
+                    queue.append(child)
+            edges = [sorted(kids.items()) for kids in children]
+            edge_starts = np.zeros(number_of_states + 1, dtype=np.int32)
+            np.cumsum([len(state_edges) for state_edges in edges], out=edge_starts[1:])
+            self._edge_starts = array('i', edge_starts.tobytes())
+            self._edge_symbols = array('i', [symbol for state_edges in edges for symbol, _ in state_edges])
+            self._edge_targets = array('i', [child for state_edges in edges for _, child in state_edges])
+        self._fail = array('i', fail)
+        self._links = array('i', links)
+        starts = np.zeros(number_of_states + 1, dtype=np.int32)
+        np.cumsum([len(ids) for ids in terminals], out=starts[1:])
+        self._starts = array('i', starts.tobytes())
+        self._outputs = array('i', [pattern_id for ids in terminals for pattern_id in ids])
+        self._reports = array('i', [state if terminals[state] else links[state] for state in range(number_of_states)])
+        self._lengths = array('i', [len(pattern) for pattern in self._patterns])
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{len(self._patterns)}:{len(self._reports)}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        Number of states.
+        """
+        return len(self._reports)
+
+    @property
+    def patterns(self):
+        """
+        """
+        return self._patterns
+
+    @property
+    def fail(self):
+        """
+        """
+        return np.frombuffer(self._fail, dtype=np.int32)
+
+    @property
+    def dense(self):
+        """
+        True if transitions are the complete table, otherwise goto is sparse.
+        """
+        return len(self._transitions) > 0
+
+    @property
+    def nbytes(self):
+        """
+        Size of the automaton tables in bytes.
+        """
+        tables = (self._transitions, self._edge_starts, self._edge_symbols, self._edge_targets,
+                  self._fail, self._links, self._starts, self._outputs, self._reports, self._lengths)
+        return sum(table.itemsize * len(table) for table in tables) + self._alphabet.nbytes
+
+    def get_symbol_ids(self, text):
+        """
+        Returns list of symbol ids of the text, 0 for symbols out of the patterns' alphabet.
+        """
+        symbols = SuffixArray.get_symbols(text)
+        if len(self._alphabet) == 0:
+            return [0] * len(symbols)
+        ids = np.searchsorted(self._alphabet, symbols)
+        np.minimum(ids, len(self._alphabet) - 1, out=ids)
+        return np.where(self._alphabet[ids] == symbols, ids + 1, 0).tolist()
+
+    def scan(self, text, state=0, offset=0, how_many=0):
+        """
+        Runs the automaton over the text (chunk) from the state, offset is the text offset of the chunk.
+        Returns (matches, state), matches are (offset, pattern id) pairs in order of match ends
+        (longer patterns first for the same end), the state goes to the next chunk.
+        how_many stops the scan once that many matches are found (0 - all).
+        """
+        if not self.dense:
+            return self.scan_sparse(text, state, offset, how_many)
+        transitions = self._transitions
+        width = self._width
+        reports = self._reports
+        links = self._links
+        starts = self._starts
+        outputs = self._outputs
+        lengths = self._lengths
+        result = list()
+        for k, symbol in enumerate(self.get_symbol_ids(text), offset + 1):
+            state = transitions[state * width + symbol]
+            output = reports[state]
+            while output:
+                for pattern_id in outputs[starts[output]:starts[output + 1]]:
+                    result.append((k - lengths[pattern_id], pattern_id))
+                output = links[output]
+            if len(result) >= how_many > 0:
+                break
+        return result, state
+
+    def scan_sparse(self, text, state=0, offset=0, how_many=0):
+        """
+        See scan, goto is looked up in the sorted edges of the state, fail links are followed on misses.
+        """
+        edge_starts = self._edge_starts
+        edge_symbols = self._edge_symbols
+        edge_targets = self._edge_targets
+        fail = self._fail
+        reports = self._reports
+        links = self._links
+        starts = self._starts
+        outputs = self._outputs
+        lengths = self._lengths
+        bisect_left = bisect.bisect_left
+        result = list()
+        for k, symbol in enumerate(self.get_symbol_ids(text), offset + 1):
+            if not symbol:
+                state = 0
+                continue
+            while True:
+                lo = edge_starts[state]
+                hi = edge_starts[state + 1]
+                position = bisect_left(edge_symbols, symbol, lo, hi)
+                if position < hi and edge_symbols[position] == symbol:
+                    state = edge_targets[position]
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            output = reports[state]
+            while output:
+                for pattern_id in outputs[starts[output]:starts[output + 1]]:
+                    result.append((k - lengths[pattern_id], pattern_id))
+                output = links[output]
+            if len(result) >= how_many > 0:
+                break
+        return result, state
+
+    def search(self, text, how_many=0):
+        """
+        Returns list of (offset, pattern id) of all (overlapping) occurrences of all patterns
+        in order of match ends, how_many limits number of matches (0 - all).
+        """
+        if how_many <= 0:
+            result, _ = self.scan(text)
+            return result
+        # blocks, symbol ids are not computed past the last needed match
+        result = list()
+        state = 0
+        for offset in range(0, len(text), AhoCorasick.BLOCK_SIZE):
+            matches, state = self.scan(text[offset:offset + AhoCorasick.BLOCK_SIZE],
+                                       state,
+                                       offset,
+                                       how_many - len(result))
+            result.extend(matches)
+            if len(result) >= how_many:
+                break
+        return result[:how_many]
+
+    def search_stream(self, chunks):
+        """
+        Streaming search over an iterable of chunks (e.g. blocks read from a file),
+        the automaton state is carried between chunks, so matches spanning chunk borders are found.
+        Yields (offset, pattern id), offsets are in the whole stream.
+        """
+        state = 0
+        offset = 0
+        for chunk in chunks:
+            matches, state = self.scan(chunk, state, offset)
+            yield from matches
+            offset += len(chunk)
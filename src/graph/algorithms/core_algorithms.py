@@ -6,6 +6,7 @@
 import math
 from enum import IntEnum
 from functools import lru_cache
+import numpy as np
 from graph.core.base import Base
 
 
@@ -18,14 +19,16 @@ class Algorithms(Base):
         """
         MIN = 0
         MAX = 1
+        SUM = 2
 
     @staticmethod
     def execute_range_minmax_queries(array, queries, function=Functions.MIN):
         """
         Range Minimum Query (RMQ) implementation based on Sparse Table lookup.
         https://www.youtube.com/watch?v=uUatD9AudXo&list=PLDV1Zeh2NRsB6SWUrDFW2RmDotAfPbeHu&index=55
+        Tables are rebuilt on every call, see RangeQuery and BlockRangeQuery for repeated queries.
         """
-        assert function in set(item.value for item in Algorithms.Functions), f"Invalid function type {function}."
+        assert function in (Algorithms.Functions.MIN, Algorithms.Functions.MAX), f"Invalid function type {function}."
         n = len(array)  # N
 
         @lru_cache(maxsize=1024)
@@ -120,3 +123,576 @@ class Algorithms(Base):
                 result.append((max_value_query(query[0], query[1]),
                                max_index_query(query[0], query[1])))
         return result
+
+
+class RangeQuery(Base):
+    """
+    Range Minimum/Maximum Query (RMQ) over a static array, based on Sparse Table lookup.
+    Tables are built once, O(N log N) indices, queries are O(1) and vectorized.
+    Bounds are inclusive, the leftmost index wins on ties.
+    """
+
+    def __init__(self, array, function=Algorithms.Functions.MIN):
+        """
+        """
+        super().__init__()
+        assert function in (Algorithms.Functions.MIN, Algorithms.Functions.MAX), f"Invalid function type {function}."
+        self._array = np.array(array)  # own copy, frozen
+        assert self._array.ndim == 1 and len(self._array) > 0, "Invalid array."
+        self._function = Algorithms.Functions(function)
+        self._logs = RangeQuery.build_logs(len(self._array))
+        self._table = RangeQuery.build_sparse_table(self._array, self._logs, self._function)
+        for array in (self._array, self._logs, self._table):
+            array.flags.writeable = False
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._function.name}:{len(self._array)}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return len(self._array)
+
+    @property
+    def array(self):
+        """
+        """
+        return self._array
+
+    @property
+    def function(self):
+        """
+        """
+        return self._function
+
+    @property
+    def nbytes(self):
+        """
+        Memory occupied by the tables, in bytes.
+        """
+        return self._logs.nbytes + self._table.nbytes
+
+    @staticmethod
+    def build_logs(n):
+        """
+        Builds logs lut for floor(log(i)), 1 <= i <= N, index 0 unused.
+        """
+        logs = np.zeros(n + 1, dtype=np.int64)
+        for k in range(1, int(n).bit_length()):  # floor(log(i)) == k for 2^k <= i < 2^(k+1)
+            logs[1 << k:] = k
+        return logs
+
+    @staticmethod
+    def select(array, lhs, rhs, function):
+        """
+        Returns indices of the winners of pairwise comparisons, lhs wins on ties.
+        lhs indices are expected to be to the left of rhs ones.
+        """
+        if function == Algorithms.Functions.MIN:
+            return np.where(array[rhs] < array[lhs], rhs, lhs)
+        return np.where(array[rhs] > array[lhs], rhs, lhs)
+
+    @staticmethod
+    def build_sparse_table(array, logs, function):
+        """
+        Row p holds, for every position k, the index of min/max in [k, k + 2^p).
+        Rows are padded to the full length, padding is never used by queries.
+        """
+        n = len(array)
+        table = np.empty((int(logs[n]) + 1, n), dtype=np.int64)
+        table[0] = np.arange(n)
+        for p in range(1, len(table)):
+            half = 1 << (p - 1)
+            lhs = table[p - 1]
+            rhs = lhs.copy()
+            rhs[:n - half] = lhs[half:]
+            table[p] = RangeQuery.select(array, lhs, rhs, function)
+        return table
+
+    def validate_bounds(self, lb, rb):
+        """
+        """
+        lb = np.asarray(lb, dtype=np.int64)
+        rb = np.asarray(rb, dtype=np.int64)
+        assert lb.shape == rb.shape, "Invalid queries, size mismatch."
+        assert np.all((0 <= lb) & (lb <= rb) & (rb < len(self._array))), "Invalid queries, out of range."
+        return lb, rb
+
+    def query_indices(self, lb, rb):
+        """
+        Vectorized query, lb and rb are arrays (or scalars) of inclusive bounds,
+        returns array of indices of min/max.
+        """
+        lb, rb = self.validate_bounds(lb, rb)
+        p = self._logs[rb - lb + 1]
+        return RangeQuery.select(self._array,
+                                 self._table[p, lb],
+                                 self._table[p, rb - (1 << p) + 1],
+                                 self._function)
+
+    def query_index(self, lb, rb):
+        """
+        Scalar query with no array overhead, returns index of min/max.
+        """
+        p = (rb - lb + 1).bit_length() - 1
+        lhs = int(self._table[p, lb])
+        rhs = int(self._table[p, rb - (1 << p) + 1])
+        if self._function == Algorithms.Functions.MIN:
+            return rhs if self._array[rhs] < self._array[lhs] else lhs
+        return rhs if self._array[rhs] > self._array[lhs] else lhs
+
+    def query(self, lb, rb):
+        """
+        Vectorized query, returns arrays of values and indices of min/max.
+        """
+        indices = self.query_indices(lb, rb)
+        return self._array[indices], indices
+
+    def queries(self, queries):
+        """
+        Batch query, queries is an iterable of (lb, rb),
+        returns list of (value, index) pairs as execute_range_minmax_queries does.
+        """
+        queries = np.array(list(queries), dtype=np.int64).reshape(-1, 2)
+        values, indices = self.query(queries[:, 0], queries[:, 1])
+        return list(zip(values.tolist(), indices.tolist()))
+
+
+class BlockRangeQuery(RangeQuery):
+    """
+    Range Minimum/Maximum Query (RMQ) with O(N) memory, block decomposition in the spirit of
+    J. Fischer, V. Heun, 'Theoretical and Practical Improvements on the RMQ-Problem, with Applications
+    to LCA and LCE', CPM 2006.
+    The array is split into blocks of 64 elements, a sparse table is built over block
+    minima/maxima only, O(N/64 log N) indices. In-block queries are answered from per-position
+    bitmasks, one machine word per element: bit i of mask[r] is set if the element at (block start + i)
+    wins over every element after it up to r, so the answer for [l, r] within a block is
+    the lowest set bit of mask[r] at or above l.
+    A query spanning several blocks combines the suffix of the first block, the sparse table
+    over the inner blocks and the prefix of the last block. Queries are O(1) and vectorized.
+    """
+
+    BLOCK_SIZE = 64  # bits of mask
+
+    def __init__(self, array, function=Algorithms.Functions.MIN):
+        """
+        """
+        Base.__init__(self)
+        assert function in (Algorithms.Functions.MIN, Algorithms.Functions.MAX), f"Invalid function type {function}."
+        self._array = np.array(array)  # own copy, frozen
+        assert self._array.ndim == 1 and len(self._array) > 0, "Invalid array."
+        self._function = Algorithms.Functions(function)
+        self._masks = BlockRangeQuery.build_masks(self._array, self._function)
+        n = len(self._array)
+        starts = np.arange(0, n, BlockRangeQuery.BLOCK_SIZE, dtype=np.int64)
+        ends = np.minimum(starts + BlockRangeQuery.BLOCK_SIZE, n) - 1
+        self._blocks = self.query_in_block(starts, ends)  # index of min/max per block
+        self._logs = RangeQuery.build_logs(len(self._blocks))
+        self._table = RangeQuery.build_sparse_table(self._array[self._blocks], self._logs, self._function)
+        self._table = self._blocks[self._table]  # block table -> array indices
+        for array in (self._array, self._masks, self._blocks, self._logs, self._table):
+            array.flags.writeable = False
+
+    @property
+    def nbytes(self):
+        """
+        Memory occupied by the tables, in bytes.
+        """
+        return self._masks.nbytes + self._blocks.nbytes + self._logs.nbytes + self._table.nbytes
+
+    @staticmethod
+    def build_masks(array, function):
+        """
+        Bits are populated offset by offset, every step is vectorized over all blocks.
+        """
+        if array.dtype == np.bool_:
+            array = array.astype(np.int64)  # np.iinfo is not defined for bool
+        b = BlockRangeQuery.BLOCK_SIZE
+        n = len(array)
+        size = -(-n // b) * b  # padded to full blocks
+        if function == Algorithms.Functions.MIN:
+            padding = np.inf if np.issubdtype(array.dtype, np.floating) else np.iinfo(array.dtype).max
+        else:
+            padding = -np.inf if np.issubdtype(array.dtype, np.floating) else np.iinfo(array.dtype).min
+        blocks = np.full(size, padding, dtype=array.dtype)
+        blocks[:n] = array
+        blocks = blocks.reshape(-1, b)
+        masks = np.zeros(blocks.shape, dtype=np.uint64)
+        for i in range(b):
+            best = blocks[:, i].copy()  # min/max of (i, r]
+            wins = np.ones(len(blocks), dtype=np.bool_)
+            bit = np.uint64(1 << i)
+            masks[:, i] |= bit
+            for r in range(i + 1, b):
+                if function == Algorithms.Functions.MIN:
+                    wins &= blocks[:, i] <= blocks[:, r]
+                else:
+                    wins &= blocks[:, i] >= blocks[:, r]
+                if not wins.any():
+                    break
+                masks[wins, r] |= bit
+        return masks.ravel()[:n].copy()
+
+    def query_in_block(self, lb, rb):
+        """
+        lb and rb must be in the same block.
+        """
+        offsets = (lb % BlockRangeQuery.BLOCK_SIZE).astype(np.uint64)
+        masks = self._masks[rb] >> offsets
+        lowest = masks & (~masks + np.uint64(1))  # the lowest set bit
+        return lb + np.log2(lowest.astype(np.float64)).astype(np.int64)  # exact for powers of two
+
+    def query_index(self, lb, rb):
+        """
+        Scalar query, returns index of min/max.
+        """
+        return int(self.query_indices(lb, rb))
+
+    def query_indices(self, lb, rb):
+        """
+        Vectorized query, lb and rb are arrays (or scalars) of inclusive bounds,
+        returns array of indices of min/max.
+        """
+        b = BlockRangeQuery.BLOCK_SIZE
+        lb, rb = self.validate_bounds(lb, rb)
+        lb_block = lb // b
+        rb_block = rb // b
+        same = lb_block == rb_block
+        result = self.query_in_block(lb, np.where(same, rb, lb_block * b + b - 1))  # the first block suffix
+        rhs = self.query_in_block(np.where(same, lb, rb_block * b), rb)  # the last block prefix
+        # inner blocks
+        lbi = lb_block + 1
+        rbi = rb_block - 1
+        inner = lbi <= rbi
+        lbi = np.where(inner, lbi, 0)
+        rbi = np.where(inner, rbi, 0)
+        p = self._logs[rbi - lbi + 1]
+        middle = RangeQuery.select(self._array,
+                                   self._table[p, lbi],
+                                   self._table[p, rbi - (1 << p) + 1],
+                                   self._function)
+        result = np.where(inner, RangeQuery.select(self._array, result, middle, self._function), result)
+        result = np.where(same, result, RangeQuery.select(self._array, result, rhs, self._function))
+        return result
+
+
+class SegmentTree(Base):
+    """
+    Segment tree over an array with range add (lazy) and point assign updates,
+    answers range min/max/sum queries. Array-backed, the tree is a perfect binary tree
+    of 2 * S nodes (S is the smallest power of two >= N), node k has kids 2k and 2k + 1,
+    leaves are S ... S + N - 1.
+    Lazy additions are kept in internal nodes and never pushed down: a node holds the aggregate
+    of its subtree including lazy additions at or below it, ancestors' additions are applied
+    when the node is read. Updates and queries are batched, every tree level is one vectorized
+    step over the whole batch. Bounds are inclusive.
+    https://codeforces.com/blog/entry/18051
+    """
+
+    def __init__(self, array, function=Algorithms.Functions.MIN):
+        """
+        """
+        super().__init__()
+        assert function in set(item.value for item in Algorithms.Functions), f"Invalid function type {function}."
+        array = np.asarray(array)
+        assert array.ndim == 1 and len(array) > 0, "Invalid array."
+        if array.dtype == np.bool_:
+            array = array.astype(np.int64)
+        self._function = Algorithms.Functions(function)
+        self._n = len(array)
+        self._size = 1 << (self._n - 1).bit_length()  # S
+        self._tree = np.zeros(2 * self._size, dtype=array.dtype)  # padding leaves are never queried
+        self._lazy = np.zeros(2 * self._size, dtype=array.dtype)  # pending additions, read for internal nodes only
+        self._tree[self._size:self._size + self._n] = array
+        k = self._size // 2
+        while k >= 1:
+            self._tree[k:2 * k] = self.combine(self._tree[2 * k:4 * k:2], self._tree[2 * k + 1:4 * k:2])
+            k //= 2
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._function.name}:{self._n}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return self._n
+
+    @property
+    def function(self):
+        """
+        """
+        return self._function
+
+    @property
+    def dtype(self):
+        """
+        """
+        return self._tree.dtype
+
+    def get_identity(self):
+        """
+        Returns neutral element of the function.
+        """
+        if self._function == Algorithms.Functions.SUM:
+            return 0
+        floating = np.issubdtype(self._tree.dtype, np.floating)
+        if self._function == Algorithms.Functions.MIN:
+            return np.inf if floating else np.iinfo(self._tree.dtype).max
+        return -np.inf if floating else np.iinfo(self._tree.dtype).min
+
+    def combine(self, lhs, rhs):
+        """
+        """
+        if self._function == Algorithms.Functions.MIN:
+            return np.minimum(lhs, rhs)
+        if self._function == Algorithms.Functions.MAX:
+            return np.maximum(lhs, rhs)
+        return lhs + rhs
+
+    def collect_pending(self, nodes):
+        """
+        Sums up lazy additions of strict ancestors, nodes must be at the same level.
+        """
+        result = np.zeros(len(nodes), dtype=self._tree.dtype)
+        ancestors = nodes >> 1
+        while len(ancestors) and ancestors[0] > 0:
+            result += self._lazy[ancestors]
+            ancestors >>= 1
+        return result
+
+    def rebuild(self, leaves):
+        """
+        Recalculates ancestors of the leaves bottom-up.
+        """
+        nodes = np.unique(leaves >> 1)
+        width = 2  # number of leaves under a node
+        while len(nodes) and nodes[0] > 0:
+            self._tree[nodes] = self.combine(self._tree[2 * nodes], self._tree[2 * nodes + 1])
+            if self._function == Algorithms.Functions.SUM:
+                self._tree[nodes] += self._lazy[nodes] * width
+            else:
+                self._tree[nodes] += self._lazy[nodes]
+            nodes = np.unique(nodes >> 1)
+            width <<= 1
+
+    def validate_bounds(self, lb, rb):
+        """
+        """
+        lb = np.atleast_1d(np.asarray(lb, dtype=np.int64))
+        rb = np.atleast_1d(np.asarray(rb, dtype=np.int64))
+        assert lb.shape == rb.shape, "Invalid queries, size mismatch."
+        assert np.all((0 <= lb) & (lb <= rb) & (rb < self._n)), "Invalid queries, out of range."
+        return lb, rb
+
+    def query(self, lb, rb):
+        """
+        Vectorized range query, lb and rb are arrays (or scalars) of inclusive bounds,
+        returns array of min/max/sum values.
+        """
+        lb, rb = self.validate_bounds(lb, rb)
+        result = np.full(len(lb), self.get_identity(), dtype=self._tree.dtype)
+        lhs = lb + self._size
+        rhs = rb + 1 + self._size  # exclusive
+        width = 1
+        while True:
+            active = lhs < rhs
+            if not active.any():
+                break
+            for nodes, mask in ((lhs, active & (lhs & 1 == 1)), (rhs - 1, active & (rhs & 1 == 1))):
+                if mask.any():
+                    values = self._tree[nodes[mask]]
+                    pending = self.collect_pending(nodes[mask])
+                    if self._function == Algorithms.Functions.SUM:
+                        pending *= width
+                    result[mask] = self.combine(result[mask], values + pending)
+            lhs = (lhs + (lhs & 1)) >> 1
+            rhs = (rhs - (rhs & 1)) >> 1
+            width <<= 1
+        return result
+
+    def update(self, lb, rb, deltas):
+        """
+        Batch range add, adds deltas to all elements in [lb, rb].
+        """
+        lb, rb = self.validate_bounds(lb, rb)
+        deltas = np.broadcast_to(np.asarray(deltas, dtype=self._tree.dtype), lb.shape)
+        lhs = lb + self._size
+        rhs = rb + 1 + self._size  # exclusive
+        width = 1
+        while True:
+            active = lhs < rhs
+            if not active.any():
+                break
+            for nodes, mask in ((lhs, active & (lhs & 1 == 1)), (rhs - 1, active & (rhs & 1 == 1))):
+                if mask.any():
+                    np.add.at(self._tree, nodes[mask], deltas[mask] * width
+                              if self._function == Algorithms.Functions.SUM else deltas[mask])
+                    np.add.at(self._lazy, nodes[mask], deltas[mask])
+            lhs = (lhs + (lhs & 1)) >> 1
+            rhs = (rhs - (rhs & 1)) >> 1
+            width <<= 1
+        self.rebuild(np.concatenate((lb, rb)) + self._size)
+
+    def add(self, indices, deltas):
+        """
+        Batch point add.
+        """
+        self.update(indices, indices, deltas)
+
+    def assign(self, indices, values):
+        """
+        Batch point assign, for repeated indices the last value wins.
+        """
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        values = np.broadcast_to(np.asarray(values, dtype=self._tree.dtype), indices.shape)
+        self.validate_bounds(indices, indices)
+        _, lasts = np.unique(indices[::-1], return_index=True)
+        lasts = len(indices) - 1 - lasts
+        leaves = indices[lasts] + self._size
+        self._tree[leaves] = values[lasts] - self.collect_pending(leaves)
+        self.rebuild(leaves)
+
+    def get_values(self):
+        """
+        Returns the current array, lazy additions are applied top-down.
+        """
+        pending = np.zeros(2 * self._size, dtype=self._tree.dtype)
+        k = 1
+        while k < self._size:
+            pending[2 * k:4 * k] = np.repeat(pending[k:2 * k] + self._lazy[k:2 * k], 2)
+            k *= 2
+        leaves = slice(self._size, self._size + self._n)
+        return self._tree[leaves] + pending[leaves]
+
+
+class FenwickTree(Base):
+    """
+    Fenwick tree (Binary Indexed Tree) over an array with range add and range sum,
+    P. Fenwick, 'A New Data Structure for Cumulative Frequency Tables', 1994.
+    Two trees over the difference array D (D[i] = A[i] - A[i - 1]) are kept:
+        sum(A[1..i]) = (i + 1) * sum(D[1..i]) - sum(j * D[j], 1 <= j <= i).
+    Trees are 1-based internally, the interface is 0-based with inclusive bounds.
+    Updates and queries are batched, every step of the index walk is one vectorized
+    operation over the whole batch, O(log N) steps.
+    """
+
+    def __init__(self, array):
+        """
+        """
+        super().__init__()
+        array = np.asarray(array)
+        assert array.ndim == 1, "Invalid array."
+        if array.dtype == np.bool_:
+            array = array.astype(np.int64)
+        self._n = len(array)
+        differences = np.diff(array, prepend=array.dtype.type(0))
+        positions = np.arange(1, self._n + 1)
+        self._tree1 = FenwickTree.build(differences)
+        self._tree2 = FenwickTree.build(differences * positions.astype(array.dtype))
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._n}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return self._n
+
+    @staticmethod
+    def build(array):
+        """
+        O(N) construction, tree[i] = sum(A[i - lowbit(i) + 1 .. i]) from prefix sums.
+        """
+        n = len(array)
+        prefixes = np.zeros(n + 1, dtype=array.dtype)
+        np.cumsum(array, out=prefixes[1:])
+        positions = np.arange(n + 1)
+        return prefixes - prefixes[positions - (positions & -positions)]
+
+    @staticmethod
+    def accumulate(tree, indices):
+        """
+        Prefix sums tree[1..i] for every 1-based index i, 0 is an empty prefix.
+        """
+        result = np.zeros(len(indices), dtype=tree.dtype)
+        indices = indices.copy()
+        while True:
+            active = indices > 0
+            if not active.any():
+                break
+            result[active] += tree[indices[active]]
+            indices[active] -= indices[active] & -indices[active]
+        return result
+
+    @staticmethod
+    def scatter(tree, indices, deltas):
+        """
+        Adds deltas at every 1-based index i, repeated indices are accumulated.
+        """
+        n = len(tree) - 1
+        indices = indices.copy()
+        while True:
+            active = (indices > 0) & (indices <= n)
+            if not active.any():
+                break
+            np.add.at(tree, indices[active], deltas[active])
+            indices[active] += indices[active] & -indices[active]
+
+    def validate_bounds(self, lb, rb):
+        """
+        """
+        lb = np.atleast_1d(np.asarray(lb, dtype=np.int64))
+        rb = np.atleast_1d(np.asarray(rb, dtype=np.int64))
+        assert lb.shape == rb.shape, "Invalid queries, size mismatch."
+        assert np.all((0 <= lb) & (lb <= rb) & (rb < self._n)), "Invalid queries, out of range."
+        return lb, rb
+
+    def prefix_sum(self, indices):
+        """
+        Vectorized sum(A[0..i]), -1 is an empty prefix.
+        """
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64)) + 1  # 1-based
+        return ((indices + 1) * FenwickTree.accumulate(self._tree1, indices) -
+                FenwickTree.accumulate(self._tree2, indices))
+
+    def query(self, lb, rb):
+        """
+        Vectorized range sum, lb and rb are arrays (or scalars) of inclusive bounds.
+        """
+        lb, rb = self.validate_bounds(lb, rb)
+        return self.prefix_sum(rb) - self.prefix_sum(lb - 1)
+
+    def update(self, lb, rb, deltas):
+        """
+        Batch range add, adds deltas to all elements in [lb, rb].
+        """
+        lb, rb = self.validate_bounds(lb, rb)
+        deltas = np.broadcast_to(np.asarray(deltas, dtype=self._tree1.dtype), lb.shape)
+        indices = np.concatenate((lb + 1, rb + 2))  # 1-based, D[lb] += delta, D[rb + 1] -= delta
+        deltas = np.concatenate((deltas, -deltas))
+        FenwickTree.scatter(self._tree1, indices, deltas)
+        FenwickTree.scatter(self._tree2, indices, deltas * indices.astype(self._tree2.dtype))
+
+    def add(self, indices, deltas):
+        """
+        Batch point add.
+        """
+        self.update(indices, indices, deltas)
+
+    def get_values(self):
+        """
+        Returns the current array.
+        """
+        return np.diff(self.prefix_sum(np.arange(-1, self._n)))
@@ -0,0 +1,241 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Graph algorithms over Compressed Sparse Row (CSR) graphs """
+import heapq
+from collections import deque
+import numpy as np
+from graph.core.base import Base
+from graph.adt.disjoint_set import DisjointSet
+
+
+class CsrAlgorithms(Base):
+    """
+    Counterparts of GraphAlgorithms which run on CsrGraph.
+    Vertices are dense indices, traversal state lives in per-run arrays,
+    so the graph itself is never modified.
+    """
+
+    @staticmethod
+    def dfs(csr, start_vertex, action=None, visited=None):
+        """
+        visited - optional boolean array, might be shared between runs (connected components).
+        """
+        offsets = csr.offsets
+        targets = csr.targets
+        if visited is None:
+            visited = np.zeros(csr.number_of_vertices, dtype=np.bool_)
+        stack = list()
+        stack.append(start_vertex)  # push
+        while stack:
+            vertex = stack.pop()
+            if visited[vertex]:
+                continue
+            if action:
+                action(vertex)
+            visited[vertex] = True
+            yield vertex
+            adjacencies = targets[offsets[vertex]:offsets[vertex + 1]]
+            stack.extend(adjacencies[~visited[adjacencies]].tolist())  # push
+
+    @staticmethod
+    def bfs(csr, start_vertex, visited=None):
+        """
+        Vertices are marked when discovered, so each vertex is enqueued once.
+        """
+        offsets = csr.offsets
+        targets = csr.targets
+        if visited is None:
+            visited = np.zeros(csr.number_of_vertices, dtype=np.bool_)
+        if visited[start_vertex]:
+            return
+        visited[start_vertex] = True
+        queue = deque()
+        queue.append(start_vertex)  # enqueue
+        while queue:
+            vertex = queue.popleft()  # dequeue
+            yield vertex
+            adjacencies = targets[offsets[vertex]:offsets[vertex + 1]]
+            adjacencies = adjacencies[~visited[adjacencies]]
+            if len(adjacencies):
+                # parallel edges, keep the first occurrence only
+                _, firsts = np.unique(adjacencies, return_index=True)
+                adjacencies = adjacencies[np.sort(firsts)]
+                visited[adjacencies] = True
+                queue.extend(adjacencies.tolist())  # enqueue
+
+    @staticmethod
+    def bfs_direction_optimizing(csr, start_vertex, transpose=None, alpha=15, beta=18):
+        """
+        Direction-optimizing BFS, returns levels (-1 if not reachable) and parents (-1 if not reachable,
+        start vertex is its own parent) arrays.
+        S. Beamer, K. Asanovic, D. Patterson, 'Direction-Optimizing Breadth-First Search', SC 2012.
+        Top-down steps expand the frontier, bottom-up steps let every unvisited vertex look for
+        a parent in the frontier and stop at the first one found. Switches to bottom-up when
+        the frontier's edges exceed unexplored edges / alpha and back to top-down when
+        the frontier shrinks below N / beta vertices.
+        transpose - in-adjacencies (CsrGraph.transpose), built on demand for digraphs.
+        """
+        n = csr.number_of_vertices
+        levels = np.full(n, -1, dtype=np.int64)
+        parents = np.full(n, -1, dtype=np.int64)
+        levels[start_vertex] = 0
+        parents[start_vertex] = start_vertex
+        degrees = np.diff(csr.offsets)
+        frontier = np.array([start_vertex], dtype=np.int64)
+        edges_to_check = int(degrees.sum()) - int(degrees[start_vertex])  # m_u, edges of unexplored vertices
+        level = 0
+        bottom_up = False
+        while len(frontier):
+            frontier_edges = int(degrees[frontier].sum())  # m_f
+            if not bottom_up and frontier_edges > edges_to_check / alpha:
+                bottom_up = True
+            elif bottom_up and len(frontier) < n / beta:
+                bottom_up = False
+            if bottom_up:
+                if transpose is None:
+                    transpose = csr.transpose()
+                frontier = CsrAlgorithms.bfs_bottom_up_step(transpose, frontier, levels, parents, level)
+            else:
+                frontier = CsrAlgorithms.bfs_top_down_step(csr, frontier, levels, parents, level)
+            edges_to_check -= int(degrees[frontier].sum())
+            level += 1
+        return levels, parents
+
+    @staticmethod
+    def gather_adjacencies(csr, vertices):
+        """
+        Returns (sources, targets) of all out-edges of the vertices, in adjacency order.
+        """
+        starts = csr.offsets[vertices]
+        counts = csr.offsets[vertices + 1] - starts
+        total = int(counts.sum())
+        positions = np.arange(total, dtype=np.int64) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        return np.repeat(vertices, counts), csr.targets[positions]
+
+    @staticmethod
+    def bfs_top_down_step(csr, frontier, levels, parents, level):
+        """
+        Every frontier vertex claims its unvisited adjacencies.
+        """
+        sources, targets = CsrAlgorithms.gather_adjacencies(csr, frontier)
+        unvisited = levels[targets] == -1
+        sources, targets = sources[unvisited], targets[unvisited]
+        result, firsts = np.unique(targets, return_index=True)  # the first claim wins
+        levels[result] = level + 1
+        parents[result] = sources[firsts]
+        return result
+
+    @staticmethod
+    def bfs_bottom_up_step(transpose, frontier, levels, parents, level, rounds=4):
+        """
+        Every unvisited vertex looks for a parent among its in-adjacencies.
+        The first rounds probe one in-adjacency per vertex and drop vertices as soon as
+        a parent is found (early exit), the rest in-adjacencies are checked at once.
+        """
+        in_frontier = np.zeros(len(levels), dtype=np.bool_)
+        in_frontier[frontier] = True
+        vertices = np.flatnonzero(levels == -1)
+        starts = transpose.offsets[vertices]
+        ends = transpose.offsets[vertices + 1]
+        found_vertices = list()
+        found_parents = list()
+        for k in range(rounds):
+            active = starts + k < ends
+            vertices, starts, ends = vertices[active], starts[active], ends[active]
+            if not len(vertices):
+                break
+            candidates = transpose.targets[starts + k]
+            found = in_frontier[candidates]
+            found_vertices.append(vertices[found])
+            found_parents.append(candidates[found])
+            vertices, starts, ends = vertices[~found], starts[~found], ends[~found]
+        else:
+            starts = starts + rounds
+            active = starts < ends
+            vertices, starts = vertices[active], starts[active]
+            counts = ends[active] - starts
+            positions = (np.arange(int(counts.sum()), dtype=np.int64) +
+                         np.repeat(starts - (np.cumsum(counts) - counts), counts))
+            sources = np.repeat(vertices, counts)
+            candidates = transpose.targets[positions]
+            found = in_frontier[candidates]
+            sources, candidates = sources[found], candidates[found]
+            vertices, firsts = np.unique(sources, return_index=True)  # the first parent in adjacency order
+            found_vertices.append(vertices)
+            found_parents.append(candidates[firsts])
+        result = np.concatenate(found_vertices) if found_vertices else np.empty(0, dtype=np.int64)
+        levels[result] = level + 1
+        parents[result] = np.concatenate(found_parents) if found_parents else result
+        return np.sort(result)
+
+    @staticmethod
+    def calculate_shortest_distances_dijkstra(csr, src_vertex, dst_vertex=None):
+        """
+        Calculates the shortest distances to every vertex from the given vertex.
+        Returns distances (inf if not reachable), previous vertices (-1 if none) and
+        distance to the destination vertex if provided.
+        """
+        offsets = csr.offsets
+        targets = csr.targets
+        weights = csr.get_weights()
+        distances = np.full(csr.number_of_vertices, np.inf, dtype=np.float64)
+        distances[src_vertex] = 0
+        prev_vertices = np.full(csr.number_of_vertices, -1, dtype=np.int64)
+        settled = np.zeros(csr.number_of_vertices, dtype=np.bool_)
+        pqueue = list()  # priority queue
+        heapq.heappush(pqueue, (0.0, src_vertex))
+        while pqueue:
+            min_value, vertex = heapq.heappop(pqueue)
+            if settled[vertex] or distances[vertex] < min_value:  # stale entry
+                continue
+            settled[vertex] = True
+            if dst_vertex is not None and dst_vertex == vertex:
+                break
+            lo = offsets[vertex]
+            hi = offsets[vertex + 1]
+            adjacencies = targets[lo:hi]
+            candidates = min_value + weights[lo:hi]  # new distances
+            improved = candidates < distances[adjacencies]
+            for adjacence, distance in zip(adjacencies[improved].tolist(), candidates[improved].tolist()):
+                if distance < distances[adjacence]:  # parallel edges
+                    distances[adjacence] = distance
+                    prev_vertices[adjacence] = vertex
+                    heapq.heappush(pqueue, (distance, adjacence))
+        dst_distance = np.inf if dst_vertex is None else distances[dst_vertex]
+        return distances, prev_vertices, dst_distance
+
+    @staticmethod
+    def find_shortest_distance_dijkstra(csr, src_vertex, dst_vertex):
+        """
+        See calculate_shortest_distances_dijkstra.
+        """
+        _, prev_vertices, dst_distance =\
+            CsrAlgorithms.calculate_shortest_distances_dijkstra(csr, src_vertex, dst_vertex)
+        path = list()
+        if dst_distance != np.inf:  # check if start and end vertices disconnected
+            vertex = dst_vertex
+            while vertex != -1:
+                path.append(vertex)
+                vertex = prev_vertices[vertex]
+        return reversed(path), dst_distance
+
+    @staticmethod
+    def find_minimum_spanning_tree_kruskal(csr):
+        """
+        Kruskal's algorithm to find Minimum Spanning Tree (MSP) using Union Find technique.
+        Yields (u, v, weight) triples.
+        """
+        if csr.number_of_vertices == 0:
+            return
+        sources = csr.get_sources()
+        weights = csr.get_weights()
+        order = np.argsort(weights, kind='stable')
+        djs = DisjointSet(range(csr.number_of_vertices))
+        for u, v, weight in zip(sources[order].tolist(), csr.targets[order].tolist(), weights[order].tolist()):
+            if djs.find(u) != djs.find(v):
+                djs.union(u, v)
+                yield u, v, weight
+            if djs.count == 1:  # all vertices have been unified
+                break
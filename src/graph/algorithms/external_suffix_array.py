@@ -0,0 +1,226 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Parallel and out-of-core Suffix Array construction """
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from graph.core.base import Base
+from graph.algorithms.suffix_array import SuffixArray
+
+
+class ExternalSuffixArray(Base):
+    """
+    Suffix array construction for texts which do not fit in RAM, prefix doubling
+    with external sorting as in the doubling algorithm of
+      R. Dementiev, J. Karkkainen, J. Mehnert, P. Sanders,
+      'Better External Memory Suffix Array Construction', ACM JEA 12 (2008).
+    Every round suffixes are named by (rank[i], rank[i + h]) pairs packed into uint64 keys,
+    the first round names them by their first 64 bits of packed symbols instead.
+    Positions are split into chunks, every chunk is sorted by a worker process into
+    a run spilled to a memory-mapped temporary file, runs are merged block by block
+    and ranks are rewritten in place, so RAM is O(chunk_size * workers + number_of_runs * block_size)
+    and the text, ranks and runs stay on disk (page cache).
+    Rounds stop once all names are distinct, O(log(max LCP)) rounds.
+    Ranks are uint32 up to MAX_NARROW_LENGTH symbols, longer texts (multi-GB logs) get uint64 ranks
+    and their pairs are packed into 16 byte big-endian keys (S16) which sort as (rank[i], rank[i + h]).
+    """
+    MAX_NARROW_LENGTH = int(np.iinfo(np.uint32).max) - 1  # names 1 ... N fit uint32
+
+    @staticmethod
+    def build(text, path=None, chunk_size=1 << 22, workers=None, directory=None, block_size=1 << 16):
+        """
+        Builds suffix array with the virtual sentinel at rank 0 (N + 1 entries, int64)
+        as SuffixArray.build_suffix_array_sais does.
+        text - str, bytes, sequence of integers or os.PathLike of a binary file (read as bytes via mmap).
+        path - optional output file, the result is memory-mapped there, otherwise it is in RAM.
+        workers - number of processes, os.cpu_count() by default, 1 sorts runs in the calling process.
+        directory - where temporary files go, see tempfile.
+        """
+        assert chunk_size > 0 and block_size > 0, "Invalid chunk or block size."
+        working_directory = tempfile.mkdtemp(prefix='sa-', dir=directory)
+        try:
+            symbols_path, symbols_dtype, lut, abc_size, n = (
+                ExternalSuffixArray.prepare_symbols(text, working_directory, chunk_size))
+            rank_dtype = np.uint32 if n <= ExternalSuffixArray.MAX_NARROW_LENGTH else np.uint64
+            if path is None:
+                result = np.zeros(n + 1, dtype=np.int64)
+            else:
+                result = np.memmap(path, dtype=np.int64, mode='w+', shape=(n + 1,))
+            result[0] = n  # the sentinel
+            if n == 0:
+                return result
+            ranks_path = os.path.join(working_directory, 'ranks')
+            np.memmap(ranks_path, dtype=rank_dtype, mode='w+', shape=(n,)).flush()
+            width = max(1, (abc_size - 1).bit_length())
+            h = max(1, 64 // width)  # symbols per key in the first round
+            workers = workers or os.cpu_count() or 1
+            chunks = [(lo, min(n, lo + chunk_size)) for lo in range(0, n, chunk_size)]
+            executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(chunks) > 1 else None
+            try:
+                round_number = 0
+                while True:
+                    if round_number == 0:
+                        task = (ExternalSuffixArray.sort_symbols_run, symbols_path, symbols_dtype, lut, width, h)
+                    else:
+                        task = (ExternalSuffixArray.sort_ranks_run, ranks_path, rank_dtype, h)
+                    runs = list()
+                    for index, (lo, hi) in enumerate(chunks):
+                        arguments = (*task[1:], n, lo, hi, os.path.join(working_directory, f'run-{index}'))
+                        runs.append(task[0](*arguments) if executor is None else executor.submit(task[0], *arguments))
+                    key_dtype = ExternalSuffixArray.get_key_dtype(rank_dtype) if round_number else np.uint64
+                    runs = [ExternalSuffixArray.open_run(run if executor is None else run.result(), hi - lo, key_dtype)
+                            for run, (lo, hi) in zip(runs, chunks)]
+                    names = ExternalSuffixArray.merge_runs(runs, ranks_path, rank_dtype, n, result[1:], block_size)
+                    del runs
+                    if names == n:
+                        break
+                    h = h if round_number == 0 else 2 * h
+                    round_number += 1
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            if path is not None:
+                result.flush()
+            return result
+        finally:
+            shutil.rmtree(working_directory, ignore_errors=True)
+
+    @staticmethod
+    def prepare_symbols(text, directory, chunk_size):
+        """
+        Returns (symbols path, symbols dtype, lookup table or None, abc_size, N).
+        Files are ranked with a lookup table of byte ranks (one pass, block by block),
+        in-memory texts are ranked with SuffixArray.rank_alphabet and spilled to disk
+        so workers share them through mmap.
+        Symbol ranks are 1 ... K, 0 is the virtual sentinel.
+        """
+        if isinstance(text, os.PathLike):
+            symbols_path = os.fspath(text)
+            n = os.path.getsize(symbols_path)
+            present = np.zeros(256, dtype=np.bool_)
+            if n > 0:
+                symbols = np.memmap(symbols_path, dtype=np.uint8, mode='r')
+                for lo in range(0, n, chunk_size):
+                    present |= np.bincount(symbols[lo:lo + chunk_size], minlength=256) > 0
+                del symbols
+            lut = np.cumsum(present, dtype=np.uint32)  # byte -> rank
+            return symbols_path, np.uint8, lut, int(lut[-1]) + 1, n
+        ranks, abc_size = SuffixArray.rank_alphabet(text)
+        symbols_path = os.path.join(directory, 'symbols')
+        n = len(ranks)
+        if n > 0:
+            symbols = np.memmap(symbols_path, dtype=np.uint32, mode='w+', shape=(n,))
+            symbols[:] = ranks
+            symbols.flush()
+            del symbols
+        return symbols_path, np.uint32, None, abc_size, n
+
+    @staticmethod
+    def get_key_dtype(rank_dtype):
+        """
+        Keys of doubling rounds, (rank[i], rank[i + h]) pairs.
+        """
+        return np.uint64 if rank_dtype == np.uint32 else np.dtype('S16')
+
+    @staticmethod
+    def write_run(keys, lo, run_path):
+        """
+        Sorts chunk keys and spills (keys, positions) run to the files.
+        """
+        order = np.argsort(keys)
+        run_keys = np.memmap(f'{run_path}-keys', dtype=keys.dtype, mode='w+', shape=(len(keys),))
+        run_keys[:] = keys[order]
+        run_keys.flush()
+        positions = np.memmap(f'{run_path}-positions', dtype=np.int64, mode='w+', shape=(len(keys),))
+        positions[:] = order + lo
+        positions.flush()
+        return run_path
+
+    @staticmethod
+    def open_run(run_path, length, key_dtype=np.uint64):
+        """
+        """
+        return (np.memmap(f'{run_path}-keys', dtype=key_dtype, mode='r', shape=(length,)),
+                np.memmap(f'{run_path}-positions', dtype=np.int64, mode='r', shape=(length,)))
+
+    @staticmethod
+    def sort_symbols_run(symbols_path, symbols_dtype, lut, width, h, n, lo, hi, run_path):
+        """
+        First round, keys are h symbol ranks of width bits packed big-endian,
+        symbols beyond the text are the sentinel 0.
+        """
+        symbols = np.memmap(symbols_path, dtype=symbols_dtype, mode='r', shape=(n,))
+        window = np.zeros(hi - lo + h - 1, dtype=np.uint64)
+        part = symbols[lo:min(n, hi + h - 1)]
+        window[:len(part)] = lut[part] if lut is not None else part
+        del symbols
+        keys = np.zeros(hi - lo, dtype=np.uint64)
+        for k in range(h):
+            keys <<= np.uint64(width)
+            keys |= window[k:k + hi - lo]
+        return ExternalSuffixArray.write_run(keys, lo, run_path)
+
+    @staticmethod
+    def sort_ranks_run(ranks_path, rank_dtype, h, n, lo, hi, run_path):
+        """
+        Doubling round, keys are (rank[i], rank[i + h]) pairs, ranks beyond the text are 0.
+        """
+        ranks = np.memmap(ranks_path, dtype=rank_dtype, mode='r', shape=(n,))
+        tail = ranks[min(n, lo + h):min(n, hi + h)]
+        if rank_dtype == np.uint32:
+            keys = ranks[lo:hi].astype(np.uint64) << np.uint64(32)
+            keys[:len(tail)] |= tail
+        else:
+            pairs = np.zeros(hi - lo, dtype=[('rank', '>u8'), ('next', '>u8')])
+            pairs['rank'] = ranks[lo:hi]
+            pairs['next'][:len(tail)] = tail
+            keys = pairs.view(ExternalSuffixArray.get_key_dtype(rank_dtype))
+        del ranks
+        return ExternalSuffixArray.write_run(keys, lo, run_path)
+
+    @staticmethod
+    def merge_runs(runs, ranks_path, rank_dtype, n, suffixes, block_size):
+        """
+        Multiway merge of sorted runs, block by block: every step takes block_size keys
+        from every run, emits all keys not greater than the smallest of their last keys
+        (at least one block is consumed) and names them by dense ranks 1 ... D.
+        Sorted positions go to suffixes, names are scattered into ranks.
+        Returns number of distinct names D.
+        """
+        ranks = np.memmap(ranks_path, dtype=rank_dtype, mode='r+', shape=(n,))
+        heads = [0] * len(runs)
+        output = 0
+        name = 0
+        previous = None  # the last emitted key
+        while output < n:
+            active = [k for k, (keys, _) in enumerate(runs) if heads[k] < len(keys)]
+            threshold = min(runs[k][0][min(len(runs[k][0]), heads[k] + block_size) - 1] for k in active)
+            block_keys, block_positions = list(), list()
+            for k in active:
+                keys, positions = runs[k]
+                head = heads[k]
+                tail = head + int(np.searchsorted(keys[head:head + block_size], threshold, side='right'))
+                block_keys.append(keys[head:tail])
+                block_positions.append(positions[head:tail])
+                heads[k] = tail
+            block_keys = np.concatenate(block_keys)
+            order = np.argsort(block_keys, kind='stable')
+            block_keys = block_keys[order]
+            block_positions = np.concatenate(block_positions)[order].astype(np.int64)
+            boundaries = np.ones(len(block_keys), dtype=rank_dtype)
+            boundaries[1:] = block_keys[1:] != block_keys[:-1]
+            if previous is not None and block_keys[0] == previous:
+                boundaries[0] = 0
+            names = np.cumsum(boundaries, dtype=rank_dtype)
+            names += rank_dtype(name)
+            ranks[block_positions] = names
+            suffixes[output:output + len(block_keys)] = block_positions
+            output += len(block_keys)
+            name = int(names[-1])
+            previous = block_keys[-1]
+        ranks.flush()
+        return name
@@ -0,0 +1,189 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" FM-index """
+import numpy as np
+from graph.core.base import Base
+from graph.adt.bit_vector import BitVector
+from graph.adt.wavelet_matrix import WaveletMatrix
+from graph.algorithms.suffix_array import SuffixArray
+
+
+class FmIndex(Base):
+    """
+    FM-index, compressed full-text self-index built from the suffix array,
+    P. Ferragina, G. Manzini, 'Opportunistic Data Structures with Applications', FOCS 2000.
+    Keeps the Burrows-Wheeler transform (BWT) in a wavelet matrix (rank structure),
+    C array (number of symbols smaller than a symbol) and SA sampled at every
+    sample-th text offset, marked rows are kept in a bit vector.
+    Memory is about N (log(sigma) + 1) bits plus 32 N / sample bits, the text is not needed
+    for queries. count is backward search, O(m log(sigma)), locate walks LF-mapping
+    to the nearest sample, O(sample log(sigma)) per occurrence.
+    text might be str, bytes or a sequence of integers (tokens), patterns must be of the same kind.
+    """
+
+    def __init__(self, text, sample=32, suffixes=None):
+        """
+        suffixes - optional suffix array of the text (with the sentinel), built if not provided.
+        """
+        super().__init__()
+        assert sample > 0, "Invalid sample."
+        symbols = SuffixArray.get_symbols(text)
+        self._alphabet = np.unique(symbols)  # rank - 1 -> symbol
+        ranks, abc_size = SuffixArray.rank_alphabet(symbols)
+        if suffixes is None:
+            suffixes = SuffixArray.build_suffix_array_sais(ranks, abc_size)
+        suffixes = np.asarray(suffixes, dtype=np.int64)
+        assert len(suffixes) == len(ranks) + 1, "Invalid suffixes, size mismatch."
+        bwt = FmIndex.build_burrows_wheeler_transform(ranks, suffixes)
+        self._length = len(ranks)
+        self._sample = int(sample)
+        self._counts = np.zeros(abc_size + 1, dtype=np.int64)  # C array
+        np.cumsum(np.bincount(bwt, minlength=abc_size), out=self._counts[1:])
+        self._bwt = WaveletMatrix(bwt, abc_size)
+        del bwt
+        sampled = suffixes % self._sample == 0
+        self._sampled = BitVector(sampled)
+        self._samples = (suffixes[sampled] // self._sample).astype(np.uint32)  # in rows order
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._length}:{len(self._alphabet)}:{self._sample}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return self._length
+
+    @property
+    def sample(self):
+        """
+        """
+        return self._sample
+
+    @property
+    def nbytes(self):
+        """
+        """
+        return (self._bwt.nbytes + self._sampled.nbytes + self._samples.nbytes +
+                self._counts.nbytes + self._alphabet.nbytes)
+
+    @staticmethod
+    def build_burrows_wheeler_transform(ranks, suffixes):
+        """
+        BWT[i] = T[SA[i] - 1], the sentinel 0 for SA[i] = 0.
+        M. Burrows, D. Wheeler, 'A Block-sorting Lossless Data Compression Algorithm', 1994.
+        """
+        ranks = np.asarray(ranks)
+        suffixes = np.asarray(suffixes, dtype=np.int64)
+        result = np.zeros(len(suffixes), dtype=ranks.dtype if len(ranks) else np.int32)
+        rows = suffixes > 0
+        result[rows] = ranks[suffixes[rows] - 1]
+        return result
+
+    def get_ranks(self, pattern):
+        """
+        Returns ranks of pattern symbols or None if any of them does not occur in the text.
+        """
+        symbols = SuffixArray.get_symbols(pattern)
+        ranks = np.searchsorted(self._alphabet, symbols)
+        if np.any(ranks >= len(self._alphabet)) or np.any(self._alphabet[np.minimum(ranks, len(self._alphabet) - 1)]
+                                                          != symbols):
+            return None
+        return (ranks + 1).tolist()
+
+    def find(self, pattern):
+        """
+        Backward search, returns BWT rows interval [lb, rb) of suffixes starting with the pattern,
+        the empty pattern occurs at every offset 0 ... N.
+        """
+        ranks = self.get_ranks(pattern)
+        if ranks is None:
+            return 0, 0
+        lb, rb = 0, self._length + 1
+        for rank in reversed(ranks):
+            lb = int(self._counts[rank]) + self._bwt.rank(rank, lb)
+            rb = int(self._counts[rank]) + self._bwt.rank(rank, rb)
+            if lb >= rb:
+                return 0, 0
+        return lb, rb
+
+    def count(self, pattern):
+        """
+        Returns number of (overlapping) occurrences of the pattern.
+        """
+        lb, rb = self.find(pattern)
+        return rb - lb
+
+    def contains(self, pattern):
+        """
+        """
+        return self.count(pattern) > 0
+
+    def get_offset(self, row):
+        """
+        Returns text offset of the suffix at the row (SA[row]), LF-mapping walks back to a sampled row.
+        """
+        steps = 0
+        while not self._sampled[row]:
+            rank, occurrences = self._bwt.access_rank(row)
+            row = int(self._counts[rank]) + occurrences  # LF(row)
+            steps += 1
+        return int(self._samples[self._sampled.rank1(row)]) * self._sample + steps
+
+    def locate(self, pattern):
+        """
+        Returns sorted offsets of (overlapping) occurrences of the pattern.
+        """
+        lb, rb = self.find(pattern)
+        return np.sort(np.fromiter((self.get_offset(row) for row in range(lb, rb)), dtype=np.int64, count=rb - lb))
+
+    def count_all(self, patterns):
+        """
+        Batch count, returns array of numbers of occurrences.
+        """
+        return np.fromiter((self.count(pattern) for pattern in patterns), dtype=np.int64)
+
+    def locate_all(self, patterns):
+        """
+        Batch locate, returns list of arrays of offsets.
+        """
+        return [self.locate(pattern) for pattern in patterns]
+
+    def save(self, path):
+        """
+        Serializes the index into .npz file.
+        """
+        arrays = {f'bwt_{key}': value for key, value in self._bwt.to_arrays().items()}
+        length, sampled, directory = self._sampled.to_arrays()
+        np.savez(path,
+                 length=np.int64(self._length),
+                 sample=np.int64(self._sample),
+                 alphabet=self._alphabet,
+                 counts=self._counts,
+                 sampled=sampled,
+                 sampled_directory=directory,
+                 samples=self._samples,
+                 **arrays)
+
+    @staticmethod
+    def load(path):
+        """
+        Deserializes the index saved by save.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            result = FmIndex.__new__(FmIndex)
+            Base.__init__(result)
+            result._length = int(arrays['length'])
+            result._sample = int(arrays['sample'])
+            result._alphabet = arrays['alphabet']
+            result._counts = arrays['counts']
+            result._sampled = BitVector.from_arrays(result._length + 1, arrays['sampled'], arrays['sampled_directory'])
+            result._samples = arrays['samples']
+            result._bwt = WaveletMatrix.from_arrays({key[len('bwt_'):]: arrays[key]
+                                                     for key in arrays.files if key.startswith('bwt_')})
+        return result
@@ -0,0 +1,211 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Generalized Suffix Array """
+from collections import deque
+import numpy as np
+from graph.core.base import Base
+from graph.algorithms.suffix_array import SuffixArray
+from graph.algorithms.suffix_index import SuffixIndex
+
+
+class GeneralizedSuffixArray(Base):
+    """
+    Suffix array over many documents. Documents are concatenated with separators
+    which are out of the documents' alphabet: symbols are remapped to ranks D + 1 ... D + K,
+    document d is terminated by separator d + 1 (D is number of documents).
+    Separators are unique, so common prefixes never cross document boundaries,
+    no matter how many documents there are.
+    Document id and offset within the document are kept aligned with SA.
+    documents might be str, bytes or sequences of integers (tokens), patterns must be of the same kind.
+    """
+
+    def __init__(self, documents):
+        """
+        """
+        super().__init__()
+        self._documents = [GeneralizedSuffixArray.normalize(document) for document in documents]
+        symbols = [SuffixArray.get_symbols(document) for document in self._documents]
+        number_of_documents = len(self._documents)
+        lengths = np.fromiter((len(document) for document in symbols), dtype=np.int64, count=number_of_documents)
+        symbols = np.concatenate(symbols) if symbols else np.zeros(0, dtype=np.int64)
+        self._alphabet = np.unique(symbols)  # rank - D - 1 -> symbol
+        self._starts = np.zeros(number_of_documents + 1, dtype=np.int64)  # document -> offset in the concatenation
+        np.cumsum(lengths + 1, out=self._starts[1:])
+        sequence = np.zeros(self._starts[-1], dtype=np.int64)
+        separators = self._starts[1:] - 1
+        characters = np.ones(len(sequence), dtype=np.bool_)
+        characters[separators] = False
+        sequence[characters] = np.searchsorted(self._alphabet, symbols) + number_of_documents + 1
+        sequence[separators] = np.arange(1, number_of_documents + 1)
+        del symbols, characters
+        self._index = SuffixIndex(sequence)
+        suffixes = self._index.suffixes
+        position_documents = np.repeat(np.arange(number_of_documents, dtype=np.int32), lengths + 1)
+        self._document_ids = np.full(len(suffixes), -1, dtype=np.int32)  # -1 for the sentinel
+        self._document_ids[1:] = position_documents[suffixes[1:]]
+        self._offsets = np.zeros(len(suffixes), dtype=np.int64)
+        self._offsets[1:] = suffixes[1:] - self._starts[self._document_ids[1:]]
+        self._document_ids.flags.writeable = False
+        self._offsets.flags.writeable = False
+
+    @staticmethod
+    def normalize(document):
+        """
+        str and bytes are kept as is, other sequences become integer arrays (arrays are not copied),
+        documents are never turned into lists of Python integers.
+        """
+        if isinstance(document, (str, bytes)):
+            return document
+        if isinstance(document, (bytearray, memoryview)):
+            return bytes(document)
+        return SuffixArray.get_symbols(document)
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{len(self._documents)}:{len(self._index)}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return len(self._documents)
+
+    @property
+    def documents(self):
+        """
+        """
+        return self._documents
+
+    @property
+    def suffixes(self):
+        """
+        SA over the concatenation, the sentinel is at rank 0 and suffixes starting
+        with separators are at ranks 1 ... D.
+        """
+        return self._index.suffixes
+
+    @property
+    def lcp(self):
+        """
+        """
+        return self._index.lcp
+
+    @property
+    def document_ids(self):
+        """
+        Document of every suffix, aligned with SA.
+        """
+        return self._document_ids
+
+    @property
+    def offsets(self):
+        """
+        Offset within the document of every suffix, aligned with SA.
+        """
+        return self._offsets
+
+    def get_ranks(self, pattern):
+        """
+        Returns pattern in the concatenation alphabet or None if any of its symbols does not occur.
+        """
+        symbols = SuffixArray.get_symbols(pattern)
+        ranks = np.searchsorted(self._alphabet, symbols)
+        if np.any(ranks >= len(self._alphabet)) or np.any(self._alphabet[np.minimum(ranks, len(self._alphabet) - 1)]
+                                                          != symbols):
+            return None
+        return (ranks + len(self._documents) + 1).tolist()
+
+    def find(self, pattern):
+        """
+        Returns SA interval [lb, rb) of suffixes starting with the pattern.
+        """
+        ranks = self.get_ranks(pattern)
+        if not ranks:  # the empty pattern is not located in documents
+            return 0, 0
+        return self._index.find(ranks)
+
+    def count(self, pattern):
+        """
+        Returns number of (overlapping) occurrences of the pattern in all documents.
+        """
+        lb, rb = self.find(pattern)
+        return rb - lb
+
+    def locate(self, pattern):
+        """
+        Returns sorted list of (document, offset) pairs of occurrences of the pattern.
+        """
+        lb, rb = self.find(pattern)
+        order = np.lexsort((self._offsets[lb:rb], self._document_ids[lb:rb]))
+        return list(zip(self._document_ids[lb:rb][order].tolist(), self._offsets[lb:rb][order].tolist()))
+
+    def list_documents(self, pattern):
+        """
+        Document listing, returns sorted array of documents containing the pattern.
+        """
+        lb, rb = self.find(pattern)
+        return np.unique(self._document_ids[lb:rb])
+
+    def count_documents(self, pattern):
+        """
+        Returns (documents, numbers of occurrences) arrays of documents containing the pattern.
+        """
+        lb, rb = self.find(pattern)
+        return np.unique(self._document_ids[lb:rb], return_counts=True)
+
+    def find_longest_common_substring(self, k=None):
+        """
+        Finds the longest substring which occurs in at least k documents (all documents by default).
+        Sliding window over SA: for every rank j the window [i, j] is shrunk while it still covers
+        k documents, the common prefix of the window is the minimum of LCP over it (monotonic deque).
+        The best window is then widened to the whole LCP interval of the substring.
+        Returns (length, occurrences), occurrences are sorted (document, offset) pairs of all occurrences.
+        """
+        number_of_documents = len(self._documents)
+        k = number_of_documents if k is None else k
+        assert 0 < k <= max(1, number_of_documents), "Invalid argument 'k'."
+        if number_of_documents == 0:
+            return 0, list()
+        if k == 1:
+            document = max(range(number_of_documents), key=lambda d: len(self._documents[d]))
+            length = len(self._documents[document])
+            return (length, self.locate(self._documents[document])) if length > 0 else (0, list())
+        lcp = self._index.lcp.tolist()
+        document_ids = self._document_ids.tolist()
+        counts = [0] * number_of_documents
+        distinct = 0
+        window = deque()  # LCP ranks in the window, increasing values
+        best_length, best_window = 0, None
+        lhs = number_of_documents + 1  # suffixes starting with separators are skipped
+        for rhs in range(lhs, len(lcp)):
+            document = document_ids[rhs]
+            counts[document] += 1
+            if counts[document] == 1:
+                distinct += 1
+            if rhs > lhs:
+                while window and lcp[window[-1]] >= lcp[rhs - 1]:
+                    window.pop()
+                window.append(rhs - 1)
+            while counts[document_ids[lhs]] > 1 or distinct > k:  # shrink, keeps at least k documents
+                counts[document_ids[lhs]] -= 1
+                if counts[document_ids[lhs]] == 0:
+                    distinct -= 1
+                lhs += 1
+                while window and window[0] < lhs:
+                    window.popleft()
+            if distinct >= k and lcp[window[0]] > best_length:
+                best_length, best_window = lcp[window[0]], (lhs, rhs + 1)
+        if best_window is None:
+            return 0, list()
+        lb, rb = best_window
+        while lb > 0 and lcp[lb - 1] >= best_length:
+            lb -= 1
+        while rb < len(lcp) and lcp[rb - 1] >= best_length:
+            rb += 1
+        order = np.lexsort((self._offsets[lb:rb], self._document_ids[lb:rb]))
+        return best_length, list(zip(self._document_ids[lb:rb][order].tolist(),
+                                     self._offsets[lb:rb][order].tolist()))
@@ -4,7 +4,7 @@
 #
 """ Graph algorithms """
 import heapq
-from collections import defaultdict
+from collections import defaultdict, deque
 from operator import itemgetter
 from graph.core.flags import Flags
 from graph.core.colors import Colors
@@ -20,16 +20,11 @@ class GraphAlgorithms(Base):
     @staticmethod
     def collect_predecessors(vertex, graph):
         """
+        O(in-degree), answered from the graph's in-adjacency index.
         """
         assert vertex is not None, "Invalid argument 'vertex'"
         assert vertex.id in graph.vertices, f"Missing vertex: {vertex}"
-        result = list()
-        edges = graph.edges.values()
-        for edge in edges:
-            vertex_u = edge.endpoints[0]
-            vertex_v = edge.endpoints[1]
-            if vertex_v.id == vertex.id:
-                result.append(DomainHelper.AdjValue(vertex_u, edge))
+        result = graph.get_predecessors(vertex)
         return set(result)
 
     @staticmethod
@@ -44,18 +39,15 @@ class GraphAlgorithms(Base):
     @staticmethod
     def collect_incidents(vertex, graph):
         """
+        O(degree), outgoing edges from adjacencies and incoming ones from the in-adjacency index.
         """
         assert vertex is not None, "Invalid argument 'vertex'"
         assert vertex.id in graph.vertices, f"Missing vertex: {vertex}"
         result = list()
-        edges = graph.edges.values()
-        for edge in edges:
-            vertex_u = edge.endpoints[0]
-            vertex_v = edge.endpoints[1]
-            if vertex_u.id == vertex.id:
-                result.append(DomainHelper.AdjValue(vertex_u, edge))
-            if vertex_v.id == vertex.id:
-                result.append(DomainHelper.AdjValue(vertex_v, edge))
+        for adjacence in vertex.adjacencies:  # U -> V
+            result.append(DomainHelper.AdjValue(vertex, adjacence.edge))
+        for adjacence in graph.get_predecessors(vertex):  # U <- V
+            result.append(DomainHelper.AdjValue(vertex, adjacence.edge))
         return set(result)
 
     @staticmethod
@@ -95,17 +87,19 @@ class GraphAlgorithms(Base):
     @staticmethod
     def bfs(start_vertex, *args, **kwargs):
         """
+        Vertices are marked when discovered, so each vertex is enqueued once.
         """
-        queue = list()
+        if (start_vertex.flags & Flags.VISITED) == Flags.VISITED:
+            return
+        start_vertex.flags = Flags.modify_flags(start_vertex.flags, Flags.VISITED, Flags.CLEAR)
+        queue = deque()
         queue.append(start_vertex)  # enqueue
         while queue:
-            vertex = queue.pop(0)  # deque
-            if (vertex.flags & Flags.VISITED) == Flags.VISITED:
-                continue
-            vertex.flags = Flags.modify_flags(vertex.flags, Flags.VISITED, Flags.CLEAR)
+            vertex = queue.popleft()  # dequeue
             yield vertex
             for adjacence in vertex.adjacencies:
                 if (adjacence.vertex.flags & Flags.VISITED) != Flags.VISITED:
+                    adjacence.vertex.flags = Flags.modify_flags(adjacence.vertex.flags, Flags.VISITED, Flags.CLEAR)
                     queue.append(adjacence.vertex)  # enqueue
 
     @staticmethod
@@ -261,29 +255,27 @@ class GraphAlgorithms(Base):
                 for kid in node.kids:
                     dfs(kid)
                     nodes.append(node)
+        Node flags are not touched, kids are walked with per-node iterators.
         """
-        nodes = list()   # array of visiting nodes, 2 * N - 1
-        depths = list()  # array of depths of nodes, 2 * N - 1
-        stack = [tree]   # push root
-        lasts = dict()
-        depth = 0
-        index = 0
+        nodes = [tree]   # array of visiting nodes, 2 * N - 1
+        depths = [0]     # array of depths of nodes, 2 * N - 1
+        lasts = {tree: 0}
+        path = [tree]              # root ... current node
+        stack = [iter(tree.kids)]  # mimics recursion, kids to visit per node on the path
         while stack:
-            tree = stack[-1]  # peek
-            tree.flags |= Flags.VISITED
-            nodes.append(tree)
-            depths.append(depth)
-            lasts[tree] = index
-            index += 1
-            prev_stack_len = len(stack)
-            for kid in tree.kids:
-                if (kid.flags & Flags.VISITED) != Flags.VISITED:
-                    stack.append(kid)  # push
-                    depth += 1
-                    break  # important, mimics left most recursion
-            if len(stack) == prev_stack_len:
+            kid = next(stack[-1], None)
+            if kid is not None:
+                path.append(kid)  # push
+                stack.append(iter(kid.kids))
+            else:
                 stack.pop()  # nodes are removed from stack when there are no more kids to visit
-                depth -= 1
+                path.pop()
+                if not path:
+                    break
+            tree = path[-1]  # peek
+            lasts[tree] = len(nodes)
+            nodes.append(tree)
+            depths.append(len(path) - 1)
         return nodes, depths, lasts
 
     @staticmethod
@@ -292,6 +284,7 @@ class GraphAlgorithms(Base):
         Calculates the Lowest Common Ancestor (LCA) of two nodes in a tree.
         Implementation is: Eulerian tour and Range Minimum Query (RMQ).
         LCA of the node is the node itself.
+        O(N) per call, see LcaIndex for repeated queries over the same tree.
         """
         # Eulerian tour
         nodes, depths, lasts = GraphAlgorithms.calculate_euler_tour(tree)
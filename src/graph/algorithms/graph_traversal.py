@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Graph traversal engine """
+import numpy as np
+from graph.core.base import Base
+from graph.adt.csr_graph import CsrGraph
+from graph.algorithms.csr_algorithms import CsrAlgorithms
+
+
+class GraphTraversal(Base):
+    """
+    Traversal engine over a read-only snapshot of the graph.
+    Vertices are numbered densely (graph.vertices order) and visited/color state
+    lives in per-run arrays indexed by that number, vertex flags are never touched.
+    Neither graph nor engine is modified by traversals, so one engine might serve
+    any number of concurrent traversals (threads) with no reset pass between them.
+    The snapshot must be rebuilt if the graph changes.
+    """
+
+    def __init__(self, graph):
+        """
+        """
+        super().__init__()
+        self._graph = graph
+        self._vertices = tuple(graph.vertices.values())  # dense number -> vertex
+        self._csr = CsrGraph.from_graph(graph)
+        self._indices = {vertex.id: k for k, vertex in enumerate(self._vertices)}  # vertex id -> dense number
+        self._transpose = None  # in-adjacencies, populated on demand
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._csr}"
+
+    __str__ = __repr__
+
+    @property
+    def graph(self):
+        """
+        """
+        return self._graph
+
+    @property
+    def csr(self):
+        """
+        """
+        return self._csr
+
+    @property
+    def vertices(self):
+        """
+        """
+        return self._vertices
+
+    def index_of(self, vertex):
+        """
+        """
+        return self._indices[vertex.id]
+
+    def create_state(self):
+        """
+        Returns fresh per-run visited state, it might be shared between runs,
+        for example to collect connected components.
+        """
+        return np.zeros(len(self._vertices), dtype=np.bool_)
+
+    def dfs(self, start_vertex, action=None, visited=None):
+        """
+        See GraphAlgorithms.dfs.
+        """
+        vertices = self._vertices
+        for k in CsrAlgorithms.dfs(self._csr,
+                                   self._indices[start_vertex.id],
+                                   action=(lambda index: action(vertices[index])) if action else None,
+                                   visited=visited):
+            yield vertices[k]
+
+    def dfs_postorder(self, start_vertex, visited=None):
+        """
+        See GraphAlgorithms.dfs_postorder.
+        """
+        offsets = self._csr.offsets
+        targets = self._csr.targets
+        if visited is None:
+            visited = self.create_state()
+        stack = list()
+        stack.append(self._indices[start_vertex.id])  # push
+        while stack:
+            vertex = stack.pop()
+            if visited[vertex]:
+                continue
+            visited[vertex] = True
+            adjacencies = targets[offsets[vertex]:offsets[vertex + 1]]
+            stack.extend(adjacencies[~visited[adjacencies]].tolist())  # push
+            yield self._vertices[vertex]
+
+    def bfs(self, start_vertex, visited=None):
+        """
+        See GraphAlgorithms.bfs.
+        """
+        vertices = self._vertices
+        for k in CsrAlgorithms.bfs(self._csr, self._indices[start_vertex.id], visited=visited):
+            yield vertices[k]
+
+    def bfs_direction_optimizing(self, start_vertex):
+        """
+        See CsrAlgorithms.bfs_direction_optimizing, levels and parents are indexed by dense number.
+        """
+        if self._transpose is None:
+            self._transpose = self._csr.transpose()
+        return CsrAlgorithms.bfs_direction_optimizing(self._csr,
+                                                      self._indices[start_vertex.id],
+                                                      transpose=self._transpose)
+
+    def accept(self, start_vertex, visitor, *args, **kwargs):
+        """
+        Preorder visiting, the same order as Vertex.accept but without touching vertex flags.
+        """
+        offsets = self._csr.offsets
+        targets = self._csr.targets
+        vertices = self._vertices
+        visited = self.create_state()
+        vertex = self._indices[start_vertex.id]
+        visited[vertex] = True
+        visitor.visit(vertices[vertex], *args, **kwargs)
+        stack = [iter(targets[offsets[vertex]:offsets[vertex + 1]].tolist())]  # mimics recursion
+        while stack:
+            for vertex in stack[-1]:
+                if not visited[vertex]:
+                    visited[vertex] = True
+                    visitor.visit(vertices[vertex], *args, **kwargs)
+                    stack.append(iter(targets[offsets[vertex]:offsets[vertex + 1]].tolist()))  # push
+                    break
+            else:
+                stack.pop()
+
+    def calculate_shortest_distances_dijkstra(self, src_vertex, dst_vertex=None):
+        """
+        See GraphAlgorithms.calculate_shortest_distances_dijkstra, reached vertices only.
+        """
+        vertices = self._vertices
+        distances, prev_vertices, dst_distance =\
+            CsrAlgorithms.calculate_shortest_distances_dijkstra(self._csr,
+                                                                self._indices[src_vertex.id],
+                                                                (self._indices[dst_vertex.id]
+                                                                 if dst_vertex is not None else None))
+        reached = np.flatnonzero(distances != np.inf).tolist()
+        distances = {vertices[k]: distances[k].item() for k in reached}
+        prev_vertices = {vertices[k]: vertices[prev_vertices[k]] for k in reached if prev_vertices[k] != -1}
+        return distances, prev_vertices, dst_distance
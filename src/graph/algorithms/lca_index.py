@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Lowest Common Ancestor (LCA) index """
+import numpy as np
+from graph.core.base import Base
+from graph.algorithms.core_algorithms import Algorithms, RangeQuery
+from graph.algorithms.graph_algorithms import GraphAlgorithms
+
+
+class LcaIndex(Base):
+    """
+    Lowest Common Ancestor (LCA) index over a tree, built once and queried many times.
+    Implementation is: Eulerian tour and Range Minimum Query (RMQ) over depths
+    of the tour, RMQ is answered by RangeQuery (sparse table).
+    Build is O(N log N), query is O(1), batch queries are vectorized.
+    Nodes are numbered densely in preorder (order of the first visit), root is 0.
+    The index must be rebuilt if the tree changes.
+    """
+
+    def __init__(self, tree):
+        """
+        """
+        super().__init__()
+        self._root = tree
+        nodes, depths, _ = GraphAlgorithms.calculate_euler_tour(tree)
+        self._nodes = list()    # dense number -> node
+        self._indices = dict()  # node -> dense number
+        tour = np.empty(len(nodes), dtype=np.int64)  # tour of dense numbers, 2 * N - 1
+        for k, node in enumerate(nodes):
+            index = self._indices.get(node)
+            if index is None:
+                index = self._indices[node] = len(self._nodes)
+                self._nodes.append(node)
+            tour[k] = index
+        self._tour = tour
+        _, self._firsts = np.unique(tour, return_index=True)  # dense number -> first tour position
+        self._depths = np.empty(len(self._nodes), dtype=np.int64)
+        self._depths[tour] = depths
+        self._rmq = RangeQuery(depths, Algorithms.Functions.MIN)  # over depths of the tour
+        for array in (self._tour, self._firsts, self._depths):
+            array.flags.writeable = False
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._root.id}:{len(self._nodes)}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return len(self._nodes)
+
+    @property
+    def root(self):
+        """
+        """
+        return self._root
+
+    @property
+    def nodes(self):
+        """
+        """
+        return tuple(self._nodes)
+
+    @property
+    def depths(self):
+        """
+        Depths of nodes indexed by dense number.
+        """
+        return self._depths
+
+    def index_of(self, node):
+        """
+        """
+        return self._indices[node]
+
+    def depth_of(self, node):
+        """
+        """
+        return int(self._depths[self._indices[node]])
+
+    def query_indices(self, lhs, rhs):
+        """
+        Vectorized query, lhs and rhs are arrays (or scalars) of dense numbers,
+        returns array of dense numbers of LCAs.
+        """
+        lhs = self._firsts[np.asarray(lhs, dtype=np.int64)]
+        rhs = self._firsts[np.asarray(rhs, dtype=np.int64)]
+        return self._tour[self._rmq.query_indices(np.minimum(lhs, rhs), np.maximum(lhs, rhs))]
+
+    def query(self, tree1, tree2):
+        """
+        Returns LCA node of two nodes, LCA of the node is the node itself.
+        """
+        index = self.query_indices(self._indices[tree1], self._indices[tree2])
+        return self._nodes[int(index)]
+
+    def queries(self, pairs):
+        """
+        Batch query, pairs is an iterable of (node, node), returns list of LCA nodes.
+        """
+        indices = self._indices
+        pairs = np.array([(indices[tree1], indices[tree2]) for tree1, tree2 in pairs], dtype=np.int64).reshape(-1, 2)
+        return [self._nodes[k] for k in self.query_indices(pairs[:, 0], pairs[:, 1]).tolist()]
+
+    def distance(self, tree1, tree2):
+        """
+        Number of edges on the path between two nodes.
+        """
+        lhs = self._indices[tree1]
+        rhs = self._indices[tree2]
+        lca = self.query_indices(lhs, rhs)
+        return int(self._depths[lhs] + self._depths[rhs] - 2 * self._depths[lca])
@@ -3,7 +3,8 @@
 # UI Lab Inc. Arthur Amshukov
 #
 """ Suffix Array """
-from enum import Enum
+from array import array
+import numpy as np
 from graph.core.base import Base
 
 
@@ -32,360 +33,233 @@ class SuffixArray(Base):
     def build_suffix_array_induced_sorting(text):
         """
         Suffix Array Induced-Sorting (SA-IS) algorithm implementation.
-        This is Python implementation of C++ code (see algorithms project)
           I. 'Linear Suffix Array Construction by Almost Pure Induced-Sorting' Nong, G., Zhang, S. and Chan, W.
               Data Compression Conference, 2009
           II. and on awesome explanation https://zork.net/~st/jottings/sais.html (thanks!)
+        text might be str of any code points, bytes or a sequence of integers (tokens),
+        the alphabet is remapped to dense ranks, see rank_alphabet and build_suffix_array_sais.
         """ # noqa
-        class SuffixType(str, Enum):
-            """
-            """
-            U = '?',
-            S = 'S',
-            L = 'L'
+        ranks, abc_size = SuffixArray.rank_alphabet(text)
+        return SuffixArray.build_suffix_array_sais(ranks, abc_size).tolist()
 
-        def classify_suffixes(string):
-            """
-            Builds S/L-type map (classifies suffixes)
-            t: array [0 ... n] of booleans to represent the S-type and L-type vector,
-            original paper has [0 ... n - 1] but in our case we have n + 1 elements, + 1 for virtual sentinel
-            ...
-            SA-IS divides suffixes into two groups: S-type suffixes and L-type suffixes.
-            S-type suffixes are smaller (in the sorting sense) than the suffix to their right
-            (and so must appear closer to the start of the finished suffix array) and L-type suffixes
-            are larger than the suffix to their right (and so appear closer to the end).
-            """ # noqa
-            result = [SuffixType.U] * len(string)
-            # the last suffix suf(S, n −1) (after the last character) consisting of
-            # only the single character $ or 0 (the sentinel) is defined as S-type.
-            result[-1] = SuffixType.S
-            if len(string) > 1:
-                # the suffix containing only the last character (the last before virtual sentinel)
-                # must necessarily be larger than the empty suffix, so it is L-type.
-                result[-2] = SuffixType.L
-                # properties:
-                #  (i)  S[i] is S-type if (i.1)  S[i] < S[i + 1] or (i.2)  S[i] = S[i + 1] and suf(S, i + 1) is S-type
-                #  (ii) S[i] is L-type if (ii.1) S[i] > S[i + 1] or (ii.2) S[i] = S[i + 1] and suf(S, i + 1) is L-type
-                for k in range(len(string) - 2, -1, -1):  # right to left
-                    if string[k] > string[k + 1]:
-                        result[k] = SuffixType.L
-                    elif string[k] == string[k + 1] and result[k + 1] == SuffixType.L:
-                        result[k] = SuffixType.L
-                    else:
-                        result[k] = SuffixType.S
-            return result
-
-        def classification_to_string(classification):
-            """
-            """
-            part1 = ''.join(str(e.value) for e in classification)
-            part2 = ''.join('^' if is_left_most_s_char(k, classification)
-                            else ' ' for k in range(len(classification)))
-            return f"\n{part1}\n{part2}"
-
-        def is_left_most_s_char(index, classification):
-            """
-            True if the char at index = i is a left-most S-type (LMS)
-            if i == 0 -> true
-            from the paper:
-                00 Index: 00 01 02 03 04 05 06 07 08 09 10 11 12 13 14 15 16
-                01 S:      m  m  i  i  s  s  i  i  s  s  i  i  p  p  i  i  $
-                02 t:      L  L  S  S  L  L  S  S  L  L  S  S  L  L  L  L  S
-                03 LMS:          *           *           *                 *
-                                                                           |
-                                                                     always true
-            ...
-            Let’s say that some particular character in our input string is an S-character
-            if an S-type suffix starts at that location (and likewise for an L character).
-            A left-most S character (or LMS character for short), is just an S character
-            that has an L character to its immediate left. The first character in the string can
-            never be an LMS character (because there’s no character to the immediate left).
-            ...
-            cabbage
-            LSLLSLLS
-             ^  ^  ^
-            caaaabbage
-            LSSSSLLSLLS
-             ^     ^  ^
-            mmiissiissiippii
-            LLSSLLSSLLSSLLLLS
-              ^   ^   ^     ^
-            """ # noqa
-            return (index > 0 and
-                    classification[index] == SuffixType.S and
-                    classification[index - 1] == SuffixType.L)
-
-        def lms_substrings_are_equal(string,
-                                     classification,
-                                     index_a,  # first string start offset/index
-                                     index_b):  # second string start offset/index
-            """
-            An "LMS substring" is a portion of the input string starting at one LMS character and
-            continuing up to (but not including) the next LMS character.
-            In the string cabbage examined above, there are two LMS substrings: abb and age.
-            ...
-            Definition 2.2. (LMS-substring) A LMS-substring is (i) a substring S[i..j] with both S[i] and S[j]
-            being LMS characters, and there is no other LMS character in the substring,
-            for i != j; or (ii) the sentinel itself.
-            ...
-            """ # noqa
-            result = False
-            string_len = len(string)
-            if index_a < string_len - 1 and index_b < string_len - 1:  # -1 exclude sentinel
-                k = 0  # if progressed
-                while True:
-                    a_is_lms = is_left_most_s_char(k + index_a, classification)
-                    b_is_lms = is_left_most_s_char(k + index_b, classification)
-                    # found start of the next LMS substrings ...
-                    if k > 0 and a_is_lms and b_is_lms:
-                        result = True
-                        break
-                    if a_is_lms != b_is_lms:  # LMS mismatch
-                        break
-                    if string[k + index_a] != string[k + index_b]:  # content mismatch
-                        break
-                    k += 1  # advance to the next element
-            return result
-
-        class Bucket(object):
-            """
-            """
-            def __init__(self):
-                """
-                """
-                self.size = 0
-                self.head = 0
-                self.tail = 0
-                self.char = 0
-
-            def __repr__(self):
-                """
-                """
-                return f"({self.size},{self.head},{self.tail},{self.char})"
-            __str__ = __repr__
-
-        def build_buckets(string, abc_size):
-            """
-            """
-            result = [Bucket() for _ in range(abc_size)]
-            # collect stats
-            for k in string:
-                result[k].size += 1
-                result[k].char = chr(k)
-            # calculate heads
-            offset = 0
-            for bucket in result:
-                if bucket.size > 0:
-                    bucket.head = offset
-                    offset += bucket.size
-            # calculate tails
-            offset = 0
-            for bucket in result:
-                if bucket.size > 0:
-                    offset += bucket.size
-                    bucket.tail = offset - 1
-            return result
+    @staticmethod
+    def get_symbols(text):
+        """
+        Returns symbols of the text as an integer array: code points of str,
+        bytes of bytes-like objects, integers of sequences (tokens) as is.
+        """ # noqa
+        if isinstance(text, str):
+            return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        if isinstance(text, (bytes, bytearray, memoryview)):
+            return np.frombuffer(text, dtype=np.uint8)
+        result = np.asarray(text)
+        if result.dtype == object or result.dtype == np.bool_:
+            result = np.asarray(text, dtype=np.int64)
+        assert result.ndim == 1 and (len(result) == 0 or np.issubdtype(result.dtype, np.integer)),\
+            "Invalid text, expected str, bytes or sequence of integers."
+        return result
 
-        def get_bucket_heads(buckets):
-            """
-            """
-            return [bucket.head for bucket in buckets]
+    @staticmethod
+    def rank_alphabet(text, lut_size=1 << 16):
+        """
+        Remaps symbols of the text to dense ranks 1 ... K keeping their order,
+        0 is reserved for the virtual sentinel. Returns (int32 ranks, abc_size = K + 1),
+        so bucket arrays are as small as the number of distinct symbols.
+        Narrow alphabets are ranked with a lookup table, wide ones (e.g. interned identifiers) with sorting.
+        """ # noqa
+        symbols = SuffixArray.get_symbols(text)
+        if len(symbols) == 0:
+            return np.zeros(0, dtype=np.int32), 1
+        lo = symbols.min()
+        span = int(symbols.max()) - int(lo) + 1
+        if span <= max(lut_size, len(symbols)):
+            symbols = (symbols - lo).astype(np.int64)
+            present = np.bincount(symbols, minlength=span) > 0
+            lut = np.cumsum(present, dtype=np.int32)  # symbol -> rank
+            return lut[symbols], int(lut[-1]) + 1
+        alphabet, ranks = np.unique(symbols, return_inverse=True)
+        return (ranks + 1).astype(np.int32), len(alphabet) + 1
 
-        def get_bucket_tails(buckets):
-            """
-            """
-            return [bucket.tail for bucket in buckets]
+    @staticmethod
+    def build_suffix_array_sais(sequence, abc_size):
+        """
+        Builds suffix array of the sequence of integers 1 <= x < abc_size with SA-IS,
+        the virtual sentinel (empty suffix) 0 is appended, so the result has N + 1 entries.
+        Runs on typed buffers: the string and the suffix array are int32 arrays, S/L types
+        are bit-packed. The suffix array buffer is the only workspace, the reduced string
+        and the suffix array of every recursion level live in its parts (memoryviews) as
+        in the reference implementation. Memory is 2 int32 arrays plus N/8 bytes of types
+        per level and bucket arrays, scans which do not depend on each other are vectorized.
+        Returns array('i').
+        """ # noqa
+        n = len(sequence) + 1
+        assert n < np.iinfo(np.int32).max, "Invalid sequence, too long."
+        string = array('i', bytes(4 * n))
+        string_view = np.frombuffer(string, dtype=np.int32)
+        string_view[:-1] = sequence  # the last one is the virtual sentinel 0
+        assert n == 1 or (string_view[:-1].min() > 0 and string_view.max() < abc_size), "Invalid sequence, alphabet."
+        suffixes = array('i', bytes(4 * n))
+        SuffixArray.induce_sort(memoryview(string), memoryview(suffixes), abc_size)
+        return suffixes
 
-        def suffix_array_to_string(suffixes,  # suffix array
-                                   position=None):
-            """
-            """
-            assert position < len(suffixes) if position is not None else True
-            part1 = ' '.join(f'{e:02d}' for e in suffixes)
-            part2 = ''
-            if position is not None:
-                part2 = ' '.join('^^' if e == position else '  ' for e in range(len(suffixes)))
-            return f"\n{part1}\n{part2}"
+    @staticmethod
+    def classify_suffixes(string):
+        """
+        Builds S/L-type map (classifies suffixes), True is S-type.
+        SA-IS divides suffixes into two groups: S-type suffixes and L-type suffixes.
+        S-type suffixes are smaller (in the sorting sense) than the suffix to their right
+        (and so must appear closer to the start of the finished suffix array) and L-type suffixes
+        are larger than the suffix to their right (and so appear closer to the end).
+        properties:
+         (i)  S[i] is S-type if (i.1)  S[i] < S[i + 1] or (i.2)  S[i] = S[i + 1] and suf(S, i + 1) is S-type
+         (ii) S[i] is L-type if (ii.1) S[i] > S[i + 1] or (ii.2) S[i] = S[i + 1] and suf(S, i + 1) is L-type
+        Equal runs take the type of the first position to the right where characters differ,
+        the sentinel is S-type.
+        """ # noqa
+        n = len(string)
+        decided = np.ones(n, dtype=np.bool_)  # type is defined by the next character
+        decided[:-1] = string[:-1] != string[1:]
+        types = np.ones(n, dtype=np.bool_)
+        types[:-1] = string[:-1] < string[1:]
+        nexts = np.where(decided, np.arange(n, dtype=np.int32), np.int32(n))
+        nexts = np.minimum.accumulate(nexts[::-1])[::-1]
+        return types[nexts]
 
-        def place_lms_suffixes(string,
-                               classification,
-                               buckets,
-                               show=False):
-            """
-            Puts all LMS suffixes into their appropriate bucket (at the end)
+    @staticmethod
+    def place_suffixes(string, suffixes, positions, ends):
+        """
+        Puts suffixes into the ends of their buckets, keeping their relative order
             05 Bucket: $    i                         m       p       s
-            06 SA:     {16} {-1 -1 -1 -1 -1 10 06 02} {-1 -1} {-1 -1} {-1 -1 -1 -1}
-                                             |  |  | first insertion
-                                             |  | second insertion
-                                             | third insertion
-            """ # noqa
-            result = [-1] * len(string)  # LMS suffixes
-            tails = get_bucket_tails(buckets)
-            for k in range(len(string) - 1):  # -1 for excluding virtual sentinel
-                if not is_left_most_s_char(k, classification):
-                    continue  # not start of LMX suffix
-                bucket_index = string[k]
-                result[tails[bucket_index]] = k
-                tails[bucket_index] -= 1  # move tail index backward to insert the next element
-                if show:                  # in front of the last inserted element
-                    print(suffix_array_to_string(result))
-            result[0] = len(string) - 1  # set the single sentinel LMS-substring, -1 for excluding virtual sentinel
-            if show:
-                print(suffix_array_to_string(result))
-            return result
-
-        def induce_sort_l_type_suffixes(string,
-                                        suffixes,  # L-type suffixes
-                                        classification,
-                                        buckets,
-                                        show=False):
-            """
-            Places L-type suffixes into correct positions (left-to-right).
-            """ # noqa
-            heads = get_bucket_heads(buckets)
-            for k in range(len(suffixes)):
-                if suffixes[k] == -1:
-                    continue  # skip non initialized entries
-                j = suffixes[k]  # current suffix ...
-                if j == 0:
-                    continue  # this entry for the suffix which is the entire string - no suffix to the left of it
-                # get the index of the suffix that begins to the left of the suffix this entry points to
-                j -= 1  # -1 is left of the current position
-                if classification[j] != SuffixType.L:
-                    continue  # considering only L-type suffixes
-                bucket_index = string[j]
-                suffixes[heads[bucket_index]] = j
-                heads[bucket_index] += 1  # move head index forward where to insert the next element
-                if show:
-                    print(suffix_array_to_string(suffixes, k))
-
-        def induce_sort_s_type_suffixes(string,
-                                        suffixes,  # S-type suffixes
-                                        classification,
-                                        sort_buckets,
-                                        show=False):
-            """
-            Places S-type suffixes into positions (right-to-left).
-            """ # noqa
-            tails = get_bucket_tails(sort_buckets)
-            for k in range(len(suffixes) - 1, -1, -1):  # backwards
-                j = suffixes[k]  # current suffix ...
-                if j == 0:
-                    continue  # this entry for the suffix which is the entire string - no suffix to the left of it
-                # get the index of the suffix that begins to the left of the suffix this entry points to
-                j -= 1  # -1 is left of the current position
-                if classification[j] != SuffixType.S:
-                    continue  # considering only S-type suffixes
-                bucket_index = string[j]
-                suffixes[tails[bucket_index]] = j
-                tails[bucket_index] -= 1  # move tail index backward where to insert the next element
-                if show:
-                    print(suffix_array_to_string(suffixes, k))
-
-        def reduce_string(string,
-                          suffixes,  # suffix array
-                          classification,
-                          show=False):
-            """
-            Reduces S to S1.
-            Name each LMS-substring in S by its bucket index to get a new shortened string S1.
-            Get lexicographical names of all (sorted) LMS-substrings and create S1.
-            """ # noqa
-            lms_names = [-1] * len(string)  # indices are treated as names
-            curr_name = 0
-            lms_names[suffixes[0]] = curr_name  # empty suffix
-            last_lms_suffix_offset = suffixes[0]
-            if show:
-                print(suffix_array_to_string(lms_names))
-            for k in range(1, len(suffixes)):  # from 1 as we already considered empty suffix
-                lms_suffix_offset = suffixes[k]
-                if not is_left_most_s_char(lms_suffix_offset, classification):
-                    continue
-                if not lms_substrings_are_equal(string,
-                                                classification,
-                                                last_lms_suffix_offset,
-                                                lms_suffix_offset):
-                    curr_name += 1
-                last_lms_suffix_offset = lms_suffix_offset
-                lms_names[lms_suffix_offset] = curr_name
-                if show:
-                    print(suffix_array_to_string(lms_names))
-            reduced_string_lms_suffix_offsets = list()
-            reduced_string = list()  # S1
-            reduced_string_abc_size = curr_name + 1
-            for k, lms_name in enumerate(lms_names):
-                if lms_name == -1:
-                    continue
-                reduced_string_lms_suffix_offsets.append(k)
-                reduced_string.append(lms_name)
-            return reduced_string, reduced_string_abc_size, reduced_string_lms_suffix_offsets
+            06 SA:     {16} {-1 -1 -1 -1 -1 02 06 10} {-1 -1} {-1 -1} {-1 -1 -1 -1}
+        """ # noqa
+        chars = string[positions]
+        order = np.argsort(chars, kind='stable')
+        positions = positions[order]
+        chars = chars[order]
+        targets = ends[chars] - (np.searchsorted(chars, chars, side='right') - np.arange(len(chars)))
+        suffixes[targets] = positions
 
-        def assemble_suffix_array(string, abc_size):
-            """
-            Assembles suffix array either directly or recursively calling implementation for complex strings.
-            """ # noqa
-            string_len = len(string)
-            if abc_size == string_len:
-                # make suffix array directly with bucket sort
-                result = [-1] * (string_len + 1)  # includes virtual sentinel (empty suffix)
-                result[0] = string_len
-                for k in range(string_len):
-                    j = string[k]
-                    result[j + 1] = k
-            else:
-                # ... get a suffix array for S1 by calling SA-IS(S1)
-                string.append(0)  # append virtual sentinel (empty suffix)
-                result = build_suffix_array_induced_sorting(string, abc_size)
-            return result
+    @staticmethod
+    def induce_sort_l_type_suffixes(string, suffixes, types, starts):
+        """
+        Places L-type suffixes into correct positions (left-to-right).
+        """ # noqa
+        heads = array('i', starts.astype(np.int32).tobytes())
+        for k in range(len(suffixes)):
+            # get the index of the suffix that begins to the left of the suffix this entry points to
+            j = suffixes[k] - 1
+            if j >= 0 and not (types[j >> 3] >> (j & 7)) & 1:  # considering only L-type suffixes
+                char = string[j]
+                suffixes[heads[char]] = j
+                heads[char] += 1  # move head index forward where to insert the next element
 
-        def finalize_suffix_array(string,
-                                  classification,
-                                  buckets,
-                                  suffix_array,
-                                  reduced_string_offsets,
-                                  show=False):
-            """
-            """
-            suffixes = [-1] * len(string)  # suffix for every char and sentinel (empty suffix)
-            tails = get_bucket_tails(buckets)
-            for k in range(len(suffix_array) - 1, 1, -1):  # backwards
-                string_index = reduced_string_offsets[suffix_array[k]]
-                bucket_index = string[string_index]
-                suffixes[tails[bucket_index]] = string_index  # remapping
-                tails[bucket_index] -= 1
-                if show:
-                    print(suffix_array_to_string(suffixes))
-            suffixes[0] = len(string) - 1  # -1 for excluding virtual sentinel
-            if show:
-                print(suffix_array_to_string(suffixes))
-            return suffixes
+    @staticmethod
+    def induce_sort_s_type_suffixes(string, suffixes, types, ends):
+        """
+        Places S-type suffixes into positions (right-to-left).
+        """ # noqa
+        tails = array('i', ends.astype(np.int32).tobytes())
+        for k in range(len(suffixes) - 1, -1, -1):  # backwards
+            j = suffixes[k] - 1
+            if j >= 0 and (types[j >> 3] >> (j & 7)) & 1:  # considering only S-type suffixes
+                char = string[j]
+                tails[char] -= 1  # move tail index backward where to insert the next element
+                suffixes[tails[char]] = j
 
-        def build_suffix_array_induced_sorting(string, abc_size):
-            """
-            Builds suffix array with SA-IS algorithm.
-            Might be called recursively.
-            """ # noqa
-            classification = classify_suffixes(string)
-            buckets = build_buckets(string, abc_size)
-            suffixes = place_lms_suffixes(string, classification, buckets)
-            induce_sort_l_type_suffixes(string, suffixes, classification, buckets)
-            induce_sort_s_type_suffixes(string, suffixes, classification, buckets)
-            (reduced_string,
-             reduced_string_abc_size,
-             reduced_string_offsets) = reduce_string(string, suffixes, classification)
-            suffix_array = assemble_suffix_array(reduced_string, reduced_string_abc_size)
-            suffix_array = finalize_suffix_array(string,
-                                                 classification,
-                                                 buckets,
-                                                 suffix_array,
-                                                 reduced_string_offsets)
-            induce_sort_l_type_suffixes(string, suffix_array, classification, buckets)
-            induce_sort_s_type_suffixes(string, suffix_array, classification, buckets)
-            return suffix_array
+    @staticmethod
+    def name_lms_substrings(text, sa, lms, n1, steps=32):
+        """
+        Names sorted LMS-substrings (sa[0:n1]), equal LMS-substrings get the same name.
+        Names are put into sa[n1 + offset / 2], LMS characters are at least 2 apart.
+        Definition 2.2. (LMS-substring) A LMS-substring is (i) a substring S[i..j] with both S[i] and S[j]
+        being LMS characters, and there is no other LMS character in the substring,
+        for i != j; or (ii) the sentinel itself.
+        Neighbours are compared pairwise: equal substrings have equal lengths and characters,
+        types follow from characters. The first steps characters are compared for all pairs at once,
+        the rest (long substrings) one pair at a time.
+        Returns number of names.
+        """ # noqa
+        offsets = np.flatnonzero(lms)  # LMS characters in text order, the sentinel is the last one
+        lengths = np.zeros(len(offsets), dtype=np.int32)  # substring lengths minus one, the sentinel is 0
+        lengths[:-1] = offsets[1:] - offsets[:-1]
+        del offsets
+        current = sa[1:n1]  # views, sa[0:n1] is not modified until names are assigned
+        previous = sa[:n1 - 1]
+        ranks = np.searchsorted(np.flatnonzero(lms), sa[:n1])
+        lengths = lengths[ranks]
+        del ranks
+        equal = lengths[1:] == lengths[:-1]
+        pending = np.flatnonzero(equal)  # pairs not decided yet
+        for d in range(steps):
+            if not len(pending):
+                break
+            mismatch = text[current[pending] + d] != text[previous[pending] + d]
+            equal[pending[mismatch]] = False
+            pending = pending[~mismatch & (lengths[1:][pending] > d)]
+        for k in pending.tolist():
+            a = current[k]
+            b = previous[k]
+            length = lengths[k + 1] + 1
+            equal[k] = np.array_equal(text[a:a + length], text[b:b + length])
+        names = np.zeros(n1, dtype=np.int32)
+        np.cumsum(~equal, out=names[1:])
+        sa[n1 + (sa[:n1] >> 1)] = names
+        return int(names[-1]) + 1
 
-        sequence = [ord(ch) for ch in text]
-        sequence.append(0)  # includes virtual sentinel (empty suffix)
-        return build_suffix_array_induced_sorting(sequence, abc_size=256)
+    @staticmethod
+    def induce_sort(string, suffixes, abc_size):
+        """
+        Builds suffix array with SA-IS algorithm, might be called recursively.
+        string and suffixes are int32 memoryviews of the same length N,
+        string ends with the sentinel 0 which is unique.
+        """ # noqa
+        n = len(string)
+        text = np.frombuffer(string, dtype=np.int32)
+        sa = np.frombuffer(suffixes, dtype=np.int32)
+        if n == 1:
+            sa[0] = 0
+            return
+        stypes = SuffixArray.classify_suffixes(text)
+        # left-most S character (LMS) is an S character that has an L character to its immediate left
+        lms = np.zeros(n, dtype=np.bool_)
+        lms[1:] = stypes[1:] & ~stypes[:-1]
+        types = np.packbits(stypes, bitorder='little').tobytes()
+        del stypes
+        counts = np.bincount(text, minlength=abc_size)
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        del counts
+        # stage 1: sort LMS-substrings
+        sa.fill(-1)
+        SuffixArray.place_suffixes(text, sa, np.flatnonzero(lms), ends)
+        SuffixArray.induce_sort_l_type_suffixes(string, suffixes, types, starts)
+        SuffixArray.induce_sort_s_type_suffixes(string, suffixes, types, ends)
+        sorted_lms = sa[lms[sa]]  # compact sorted LMS-substrings into the first n1 items
+        n1 = len(sorted_lms)
+        sa[:n1] = sorted_lms
+        del sorted_lms
+        sa[n1:] = -1
+        name = SuffixArray.name_lms_substrings(text, sa, lms, n1)
+        names = sa[n1:]
+        sa[n - n1:] = names[names >= 0]  # the reduced string S1 goes to the tail
+        # stage 2: sort LMS-suffixes, solve S1 recursively if names are not unique
+        reduced_string = suffixes[n - n1:]
+        reduced_suffixes = suffixes[:n1]
+        s1 = sa[n - n1:]
+        sa1 = sa[:n1]
+        if name < n1:
+            SuffixArray.induce_sort(reduced_string, reduced_suffixes, name)
+        else:
+            sa1[s1] = np.arange(n1, dtype=np.int32)
+        # stage 3: induce SA from the sorted LMS-suffixes
+        s1[:] = np.flatnonzero(lms)  # S1 index -> LMS offset
+        del lms
+        sorted_lms = s1[sa1]
+        sa.fill(-1)
+        SuffixArray.place_suffixes(text, sa, sorted_lms, ends)
+        del sorted_lms
+        SuffixArray.induce_sort_l_type_suffixes(string, suffixes, types, starts)
+        SuffixArray.induce_sort_s_type_suffixes(string, suffixes, types, ends)
 
     @staticmethod
     def collect_suffixes(string, suffixes):
@@ -401,7 +275,7 @@ class SuffixArray(Base):
         "Linear-time longest-common-prefix computation in suffix arrays and its applications",
         Proc 12th Annual Conference on Combinatorial Pattern Matching, Springer, LNCS 2089 (2001) 181-192.
         """ # noqa
-        string = string + '\0'  # includes virtual sentinel (empty suffix)
+        string_len = len(string)  # suffixes include virtual sentinel (empty suffix)
         n = len(suffixes)
         lcp = [0] * n
         rank = [0] * n
@@ -413,13 +287,67 @@ class SuffixArray(Base):
                 k = 0
                 continue
             j = suffixes[rank[i] + 1]
-            while i + k < n and j + k < n and string[i + k] == string[j + k]:
+            while i + k < string_len and j + k < string_len and string[i + k] == string[j + k]:
                 k += 1
             lcp[rank[i]] = k
             if k > 0:
                 k -= 1
         return lcp
 
+    @staticmethod
+    def build_longest_common_prefixes_array(text, suffixes):
+        """
+        Vectorized LCP construction, LCP[i] = lcp(SA[i], SA[i + 1]) and LCP[N] = 0
+        as build_longest_common_prefixes does. Kasai's scan is sequential, instead suffixes
+        are named by their prefixes of length h = k, 2k, 4k ... in SA order (2h-prefixes differ
+        if h-prefixes at i or at i + h differ, the first level packs k symbols into 64 bits)
+        until all names are distinct, then LCP of all adjacent pairs is found at once by binary
+        lifting over the levels and the last k - 1 symbols are compared one by one.
+        O(N log(max LCP)) work, every step is a NumPy gather or compare.
+        text might be str, bytes or a sequence of integers, suffixes include the virtual sentinel.
+        Returns int32 array.
+        """ # noqa
+        ranks, abc_size = SuffixArray.rank_alphabet(text)
+        n = len(ranks)
+        assert n < np.iinfo(np.int32).max, "Invalid text, too long."
+        suffixes = np.asarray(suffixes, dtype=np.int64)
+        assert len(suffixes) == n + 1, "Invalid suffixes, size mismatch."
+        symbols = np.zeros(n + 1, dtype=np.uint64)  # the sentinel 0 is at N
+        symbols[:n] = ranks
+        del ranks
+        width = max(1, (abc_size - 1).bit_length())
+        k = max(1, 64 // width)
+        keys = np.zeros(n + 1, dtype=np.uint64)
+        for j in range(min(k, n + 1)):
+            keys <<= np.uint64(width)
+            keys[:n + 1 - j] |= symbols[j:]
+        keys = keys[suffixes]  # non-decreasing
+        boundaries = np.zeros(n + 1, dtype=np.bool_)  # prefixes at i - 1 and i differ
+        np.not_equal(keys[1:], keys[:-1], out=boundaries[1:])
+        del keys
+        levels = list()  # (h, names of h-prefixes by offset)
+        h = k
+        while not boundaries[1:].all():
+            names = np.empty(n + 1, dtype=np.int32)
+            names[suffixes] = np.cumsum(boundaries, dtype=np.int32)
+            levels.append((h, names))
+            seconds = names[np.minimum(suffixes + h, n)]
+            boundaries[1:] |= seconds[1:] != seconds[:-1]
+            h *= 2
+        del boundaries
+        lhs, rhs = suffixes[:-1], suffixes[1:]
+        lcp = np.zeros(n + 1, dtype=np.int64)
+        for h, names in reversed(levels):
+            lcp[:n] += h * (names[lhs + lcp[:n]] == names[rhs + lcp[:n]])
+        del levels
+        pairs = np.arange(n)
+        for _ in range(k - 1):
+            pairs = pairs[symbols[lhs[pairs] + lcp[pairs]] == symbols[rhs[pairs] + lcp[pairs]]]
+            if len(pairs) == 0:
+                break
+            lcp[pairs] += 1
+        return lcp.astype(np.int32)
+
     @staticmethod
     def find_longest_repeated_substring(string, algorithm='sa-is'):
         """
@@ -429,9 +357,8 @@ class SuffixArray(Base):
             sa = SuffixArray.build_suffix_array(string)
         else:
             sa = SuffixArray.build_suffix_array_induced_sorting(string)
-        lcp = SuffixArray.build_longest_common_prefixes(string, sa)
-        lrs_start, lrs_length = 0, 0
-        for k in range(len(lcp)):
-            if lcp[k] > lrs_length:
-                lrs_start, lrs_length = sa[k], lcp[k]
-        return lrs_start, lrs_length
+        lcp = SuffixArray.build_longest_common_prefixes_array(string, sa)
+        k = int(np.argmax(lcp))  # the first one in SA order
+        if lcp[k] == 0:
+            return 0, 0
+        return int(sa[k]), int(lcp[k])
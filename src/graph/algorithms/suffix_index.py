@@ -0,0 +1,270 @@
+#! /usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Suffix Array based text index """
+import heapq
+import numpy as np
+from graph.core.base import Base
+from graph.algorithms.core_algorithms import Algorithms, RangeQuery
+from graph.algorithms.suffix_array import SuffixArray
+
+
+class SuffixIndex(Base):
+    """
+    Full-text index over a text: suffix array (SA), longest common prefixes (LCP)
+    and Range Minimum Query (RMQ) over LCP, built once and queried many times.
+    Patterns are found with binary search over SA using LCP of any two suffixes (RMQ),
+    so characters matched once are never compared again, O(m + log n) per pattern.
+      U. Manber, G. Myers, 'Suffix arrays: A new method for on-line string searches',
+      SIAM Journal on Computing 22 (1993) 935-948.
+    text might be str, bytes or a sequence of integers (tokens), patterns must be of the same kind.
+    SA includes the virtual sentinel (empty suffix) at rank 0, LCP[i] = lcp(SA[i], SA[i + 1]).
+    """
+
+    def __init__(self, text):
+        """
+        """
+        super().__init__()
+        self._text = SuffixIndex.normalize(text)
+        ranks, abc_size = SuffixArray.rank_alphabet(self._text)
+        self._suffixes = np.frombuffer(SuffixArray.build_suffix_array_sais(ranks, abc_size), dtype=np.int32)
+        del ranks
+        self._lcp = SuffixArray.build_longest_common_prefixes_array(self._text, self._suffixes)
+        self._ranks = np.empty(len(self._suffixes), dtype=np.int32)  # inverse SA
+        self._ranks[self._suffixes] = np.arange(len(self._suffixes), dtype=np.int32)
+        self._rmq = RangeQuery(self._lcp, Algorithms.Functions.MIN)
+        self._lcp.flags.writeable = False
+        self._ranks.flags.writeable = False
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{len(self._text)}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return len(self._text)
+
+    @property
+    def text(self):
+        """
+        """
+        return self._text
+
+    @property
+    def suffixes(self):
+        """
+        """
+        return self._suffixes
+
+    @property
+    def lcp(self):
+        """
+        """
+        return self._lcp
+
+    @property
+    def ranks(self):
+        """
+        Inverse SA, rank of the suffix at every offset 0 ... N.
+        """
+        return self._ranks
+
+    @staticmethod
+    def normalize(text):
+        """
+        str and bytes are kept as is, other sequences become lists of integers.
+        """
+        if isinstance(text, (str, bytes)):
+            return text
+        if isinstance(text, (bytearray, memoryview)):
+            return bytes(text)
+        if isinstance(text, np.ndarray):
+            return text.tolist()
+        return list(text)
+
+    def get_lcp(self, lhs, rhs):
+        """
+        Returns longest common prefix of suffixes at ranks lhs < rhs.
+        """
+        return int(self._lcp[self._rmq.query_index(lhs, rhs - 1)])
+
+    def extend_match(self, pattern, rank, k):
+        """
+        Returns longest common prefix of the pattern and the suffix at rank,
+        the first k characters are known to match.
+        """
+        text = self._text
+        m = len(pattern)
+        offset = int(self._suffixes[rank])
+        end = min(m, len(text) - offset)
+        if text[offset + k:offset + end] == pattern[k:end]:
+            return end
+        while k < end and text[offset + k] == pattern[k]:
+            k += 1
+        return k
+
+    def search_bound(self, pattern, upper):
+        """
+        Binary search with mlr acceleration, returns the first rank whose suffix is greater
+        than or equal to the pattern (lower bound) or greater than every suffix starting
+        with the pattern (upper bound).
+        Invariant: suffix at lhs goes before the bound, suffix at rhs does not,
+        l and r are their longest common prefixes with the pattern.
+        """
+        text = self._text
+        suffixes = self._suffixes
+        m = len(pattern)
+        n = len(suffixes)
+        lhs, rhs = 0, n  # the sentinel (empty suffix) goes before any bound, n is virtual
+        l = r = 0
+        while rhs - lhs > 1:
+            mid = (lhs + rhs) // 2
+            if l >= r:
+                x = self.get_lcp(lhs, mid)
+                if x > l:
+                    lhs = mid  # mid compares as lhs does
+                    continue
+                if x < l:
+                    rhs, r = mid, x
+                    continue
+                k = self.extend_match(pattern, mid, l)
+            else:
+                x = self.get_lcp(mid, rhs)  # r > 0, so rhs is not virtual
+                if x > r:
+                    rhs = mid  # mid compares as rhs does
+                    continue
+                if x < r:
+                    lhs, l = mid, x
+                    continue
+                k = self.extend_match(pattern, mid, r)
+            offset = int(suffixes[mid])
+            if k == m:
+                goes_before = upper  # the suffix starts with the pattern
+            elif offset + k == len(text):
+                goes_before = True  # the suffix is a proper prefix of the pattern
+            else:
+                goes_before = text[offset + k] < pattern[k]
+            if goes_before:
+                lhs, l = mid, k
+            else:
+                rhs, r = mid, k
+        return rhs
+
+    def find(self, pattern):
+        """
+        Returns SA interval [lb, rb) of suffixes starting with the pattern,
+        the empty pattern occurs at every offset 0 ... N as str.count does.
+        """
+        pattern = SuffixIndex.normalize(pattern)
+        if len(pattern) == 0:
+            return 0, len(self._suffixes)
+        lb = self.search_bound(pattern, False)
+        rb = self.search_bound(pattern, True)
+        return lb, max(lb, rb)
+
+    def count(self, pattern):
+        """
+        Returns number of (overlapping) occurrences of the pattern.
+        """
+        lb, rb = self.find(pattern)
+        return rb - lb
+
+    def contains(self, pattern):
+        """
+        """
+        return self.count(pattern) > 0
+
+    def locate(self, pattern):
+        """
+        Returns sorted offsets of (overlapping) occurrences of the pattern.
+        """
+        lb, rb = self.find(pattern)
+        return np.sort(self._suffixes[lb:rb])
+
+    def count_all(self, patterns):
+        """
+        Batch count, returns array of numbers of occurrences.
+        """
+        return np.fromiter((self.count(pattern) for pattern in patterns), dtype=np.int64)
+
+    def contains_all(self, patterns):
+        """
+        Batch contains, returns boolean array.
+        """
+        return self.count_all(patterns) > 0
+
+    def locate_all(self, patterns):
+        """
+        Batch locate, returns list of arrays of offsets.
+        """
+        return [self.locate(pattern) for pattern in patterns]
+
+    def get_longest_common_extension(self, lhs, rhs):
+        """
+        Longest common extension, length of the longest common prefix of suffixes
+        at text offsets lhs and rhs, O(1) with RMQ over LCP.
+        """
+        if lhs == rhs:
+            return len(self._text) - lhs
+        lhs, rhs = sorted((int(self._ranks[lhs]), int(self._ranks[rhs])))
+        return self.get_lcp(lhs, rhs)
+
+    def get_longest_common_extensions(self, lhs, rhs):
+        """
+        Vectorized get_longest_common_extension, lhs and rhs are arrays of text offsets.
+        """
+        lhs = np.asarray(lhs, dtype=np.int64)
+        rhs = np.asarray(rhs, dtype=np.int64)
+        lb = np.minimum(self._ranks[lhs], self._ranks[rhs])
+        rb = np.maximum(self._ranks[lhs], self._ranks[rhs])
+        same = lb == rb
+        result = np.asarray(len(self._text) - lhs, dtype=np.int64)
+        if not np.all(same):
+            result = np.where(same, result, self._lcp[self._rmq.query_indices(lb, np.maximum(lb, rb - 1))])
+        return result
+
+    def count_distinct_substrings(self):
+        """
+        Number of distinct non-empty substrings, every suffix adds its prefixes
+        which are not prefixes of the previous suffix in SA order, N (N + 1) / 2 - sum(LCP).
+        """
+        n = len(self._text)
+        return n * (n + 1) // 2 - int(self._lcp.sum(dtype=np.int64))
+
+    def collect_lcp_intervals(self, min_length=1):
+        """
+        Enumerates LCP intervals (internal nodes of the suffix tree) bottom-up with a stack,
+          M. Abouelhoda, S. Kurtz, E. Ohlebusch, 'Replacing suffix trees with enhanced suffix arrays',
+          Journal of Discrete Algorithms 2 (2004) 53-86.
+        Yields (length, lb, rb) of intervals [lb, rb) of at least two suffixes sharing exactly
+        length >= min_length first symbols, every right-maximal repeat is one interval.
+        """
+        lcp = self._lcp.tolist()
+        stack = [(0, 0)]  # (length, lb)
+        for rank in range(1, len(lcp) + 1):
+            length = lcp[rank - 1] if rank < len(lcp) else 0  # lcp of suffixes at rank - 1 and rank
+            lb = rank - 1
+            while length < stack[-1][0]:
+                top_length, lb = stack.pop()
+                if top_length >= min_length:
+                    yield top_length, lb, rank
+            if length > stack[-1][0]:
+                stack.append((length, lb))
+
+    def find_top_repeated_substrings(self, k, min_length=1):
+        """
+        Returns up to k most frequent repeated substrings of at least min_length symbols
+        as (offset, length, count) triples, the most frequent first, longer first among equally
+        frequent ones. Only the longest substring of every group of substrings occurring at the same
+        offsets (right-maximal repeat) is reported, so results are not prefixes of each other
+        with the same count. offset is the leftmost occurrence.
+        """
+        assert k >= 0 and min_length > 0, "Invalid arguments."
+        intervals = self.collect_lcp_intervals(min_length)
+        top = heapq.nlargest(k, intervals, key=lambda interval: (interval[2] - interval[1], interval[0], -interval[1]))
+        return [(int(self._suffixes[lb:rb].min()), length, rb - lb) for length, lb, rb in top]
@@ -3,6 +3,8 @@
 # UI Lab Inc. Arthur Amshukov
 #
 """ Text algorithms """
+import mmap
+from enum import IntEnum
 from functools import lru_cache
 from graph.core.base import Base
 
@@ -11,38 +13,54 @@ class TextAlgorithms(Base):
     """
     """
 
+    class Engines(IntEnum):
+        """
+        Single pattern search engines, see search_text.
+        """
+        AUTO = 0
+        KMP = 1
+        HORSPOOL = 2
+        TWO_WAY = 3
+        Z = 4
+
+    HORSPOOL_MIN_DISTINCT_SYMBOLS = 4  # shifts are about min(m, sigma), too short on small alphabets
+    TWO_WAY_MIN_LENGTH = 8  # long patterns on small alphabets, linear worst case
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def calculate_longest_prefix_suffix_array(pattern0):
+        """
+        Calculates the Longest (Proper) Prefix Suffix (LSP) array of lengths.
+        tp - top pointer, tracks LPS entries
+        bp - bottom pointer, iterates over pattern
+        """
+        lps0 = [0] * len(pattern0)
+        tp = 0
+        for bp in range(1, len(pattern0)):  # starts from 1 because lps[0] = 0, always
+            # phase 1: calibrate start index - roll tp back to 0 or to a match
+            while tp and pattern0[tp] != pattern0[bp]:
+                tp = lps0[tp - 1]
+            # phase 2: while symbols match (tp == bp) move both kids
+            if pattern0[tp] == pattern0[bp]:
+                tp += 1  # bp advanced implicitly by loop
+                lps0[bp] = tp
+            # phase 3: mimics - move bp until matches the first symbol at tp
+            #   bp += 1
+            #   lps0[tp] = 0
+        return lps0
+
     @staticmethod
     def search_text_kmp(text, pattern, how_many=0):
         """
         Knuth Morris Pratt (KMP) algorithm string matching.
         https://binary-baba.medium.com/string-matching-kmp-algorithm-27c182efa387
+        One pattern per pass, see AhoCorasick for many patterns in a single pass.
         """
-        @lru_cache
-        def calculate_longest_prefix_suffix_array(pattern0):
-            """
-            Calculates the Longest (Proper) Prefix Suffix (LSP) array of lengths.
-            tp - top pointer, tracks LPS entries
-            bp - bottom pointer, iterates over pattern
-            """
-            lps0 = [0] * len(pattern0)
-            tp = 0
-            for bp in range(1, len(pattern0)):  # starts from 1 because lps[0] = 0, always
-                # phase 1: calibrate start index - roll tp back to 0 or to a match
-                while tp and pattern0[tp] != pattern0[bp]:
-                    tp = lps0[tp - 1]
-                # phase 2: while symbols match (tp == bp) move both kids
-                if pattern0[tp] == pattern0[bp]:
-                    tp += 1  # bp advanced implicitly by loop
-                    lps0[bp] = tp
-                # phase 3: mimics - move bp until matches the first symbol at tp
-                #   bp += 1
-                #   lps0[tp] = 0
-            return lps0
-
         assert text, "Text is empty."
         assert pattern, "Pattern is empty."
         result = list()  # list of found indices
-        lps = calculate_longest_prefix_suffix_array(pattern)
+        key = pattern if isinstance(pattern, (str, bytes)) else tuple(pattern)  # hashable, cached
+        lps = TextAlgorithms.calculate_longest_prefix_suffix_array(key)
         pattern_k = 0
         for text_k, ch in enumerate(text):
             # phase 1: calibrate index - rollback pattern's index
@@ -60,3 +78,243 @@ class TextAlgorithms(Base):
             # phase 3: mimics - move on until text_k matches the first pattern's symbol at pattern_k
             #   text_k += 1
         return result
+
+    @staticmethod
+    def read_chunks(source, chunk_size=1 << 20):
+        """
+        Yields chunks of str, bytes-like objects, mmap, file objects (binary or text)
+        or iterables of chunks, memory is O(chunk_size).
+        """
+        if isinstance(source, (str, bytes, bytearray, memoryview, mmap.mmap)):
+            for lo in range(0, len(source), chunk_size):
+                chunk = source[lo:lo + chunk_size]
+                yield bytes(chunk) if isinstance(chunk, (bytearray, memoryview)) else chunk
+        elif hasattr(source, 'read'):
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            yield from source
+
+    @staticmethod
+    def search_stream_kmp(source, pattern, how_many=0, chunk_size=1 << 20):
+        """
+        Streaming KMP over a file object, mmap, str/bytes or an iterable of chunks (see read_chunks),
+        yields offsets of (overlapping) matches lazily. The pattern state (matched prefix length)
+        is carried between chunks, so matches spanning chunk borders are found and memory is
+        O(chunk_size + len(pattern)). bytes patterns are matched against binary sources without decoding.
+        In state 0 no partial match is pending, so the scan jumps to the next full match with
+        the built-in find and continues symbol by symbol from len(pattern) - 1 symbols before
+        the end of the chunk, KMP steps run only there (find is not called again in the tail,
+        so a chunk costs O(n + m)) and while a partial match is pending.
+        """
+        assert pattern, "Pattern is empty."
+        key = pattern if isinstance(pattern, (str, bytes)) else tuple(pattern)  # hashable, cached
+        lps = TextAlgorithms.calculate_longest_prefix_suffix_array(key)
+        m = len(pattern)
+        found = 0
+        offset = 0  # of the chunk
+        pattern_k = 0
+        for chunk in TextAlgorithms.read_chunks(source, chunk_size):
+            assert isinstance(chunk, str) == isinstance(pattern, str), "Invalid chunk, pattern type mismatch."
+            n = len(chunk)
+            text_k = 0
+            while text_k < n:
+                if pattern_k == 0 and text_k < n - m + 1:  # the tail cannot hold a full match, no find there
+                    index = chunk.find(pattern, text_k)
+                    if index >= 0:
+                        yield offset + index
+                        found += 1
+                        if found == how_many:
+                            return
+                        pattern_k = lps[m - 1]
+                        text_k = index + m
+                    else:
+                        text_k = n - m + 1  # no match starts before, a partial one might start in the tail
+                    continue
+                ch = chunk[text_k]
+                # phase 1: calibrate index - rollback pattern's index
+                while pattern_k and pattern[pattern_k] != ch:
+                    pattern_k = lps[pattern_k - 1]
+                # phase 2: while symbols match move both kids
+                if pattern[pattern_k] == ch:
+                    if pattern_k == m - 1:  # if end of pattern
+                        yield offset + text_k - pattern_k
+                        found += 1
+                        if found == how_many:
+                            return
+                        pattern_k = lps[pattern_k]
+                    else:
+                        pattern_k += 1
+                text_k += 1
+            offset += n
+
+    @staticmethod
+    def select_engine(text, pattern):
+        """
+        Chooses engine by pattern length and alphabet: Horspool skips most of the text when
+        the pattern has many distinct symbols, Two-Way keeps long patterns on small alphabets
+        (DNA, binary, periodic) linear, Z-algorithm serves the rest (short patterns on small alphabets).
+        """
+        if len(set(pattern)) >= TextAlgorithms.HORSPOOL_MIN_DISTINCT_SYMBOLS:
+            return TextAlgorithms.Engines.HORSPOOL
+        if len(pattern) >= TextAlgorithms.TWO_WAY_MIN_LENGTH:
+            return TextAlgorithms.Engines.TWO_WAY
+        return TextAlgorithms.Engines.Z
+
+    @staticmethod
+    def search_text(text, pattern, how_many=0, engine=Engines.AUTO):
+        """
+        Returns offsets of (overlapping) occurrences of the pattern, how_many limits
+        number of matches (0 - all). text and pattern are str, bytes or sequences (tokens).
+        """
+        assert pattern, "Pattern is empty."
+        if engine == TextAlgorithms.Engines.AUTO:
+            engine = TextAlgorithms.select_engine(text, pattern)
+        engines = {TextAlgorithms.Engines.KMP: TextAlgorithms.search_text_kmp,
+                   TextAlgorithms.Engines.HORSPOOL: TextAlgorithms.search_text_horspool,
+                   TextAlgorithms.Engines.TWO_WAY: TextAlgorithms.search_text_two_way,
+                   TextAlgorithms.Engines.Z: TextAlgorithms.search_text_z}
+        assert engine in engines, f"Invalid engine {engine}."
+        if not text:
+            return list()
+        return engines[engine](text, pattern, how_many)
+
+    @staticmethod
+    def search_text_horspool(text, pattern, how_many=0):
+        """
+        Boyer-Moore-Horspool algorithm, the window is shifted by the bad character rule
+        of its last symbol, so about n / min(m, sigma) windows are visited.
+          R. N. Horspool, 'Practical fast searching in strings', Software: Practice and Experience 10 (1980).
+        """
+        assert pattern, "Pattern is empty."
+        result = list()
+        m = len(pattern)
+        shifts = {ch: m - 1 - k for k, ch in enumerate(pattern[:-1])}  # the last occurrence wins
+        last = pattern[-1]
+        text_k = 0
+        end = len(text) - m
+        while text_k <= end:
+            ch = text[text_k + m - 1]
+            if ch == last and text[text_k:text_k + m] == pattern:
+                result.append(text_k)
+                if len(result) == how_many:
+                    break
+            text_k += shifts.get(ch, m)
+        return result
+
+    @staticmethod
+    def calculate_maximal_suffix(pattern, reverse):
+        """
+        Maximal suffix of the pattern for the order (reversed order), returns (start - 1, its period).
+          M. Crochemore, T. Lecroq, C. Charras, 'Handbook of Exact String Matching Algorithms', 2004.
+        """
+        ms, j, k, p = -1, 0, 1, 1
+        while j + k < len(pattern):
+            a = pattern[j + k]
+            b = pattern[ms + k]
+            if a == b:
+                if k != p:
+                    k += 1
+                else:
+                    j += p
+                    k = 1
+            elif (a > b) if reverse else (a < b):
+                j += k
+                k = 1
+                p = j - ms
+            else:
+                ms = j
+                j = ms + 1
+                k = p = 1
+        return ms, p
+
+    @staticmethod
+    def search_text_two_way(text, pattern, how_many=0):
+        """
+        Crochemore-Perrin Two-Way algorithm, the pattern is split at a critical factorization,
+        the right part is matched left to right and then the left part right to left,
+        linear time in the worst case and constant extra space.
+          M. Crochemore, D. Perrin, 'Two-way string-matching', Journal of the ACM 38 (1991) 651-675.
+        """
+        assert pattern, "Pattern is empty."
+        result = list()
+        m = len(pattern)
+        n = len(text)
+        i, p = TextAlgorithms.calculate_maximal_suffix(pattern, False)
+        j, q = TextAlgorithms.calculate_maximal_suffix(pattern, True)
+        ell, period = (i, p) if i > j else (j, q)
+        periodic = pattern[:ell + 1] == pattern[period:period + ell + 1]
+        if not periodic:
+            period = max(ell + 1, m - ell - 1) + 1
+        memory = -1  # prefix of the pattern known to match, periodic patterns only
+        text_k = 0
+        while text_k <= n - m:
+            k = max(ell, memory) + 1
+            if k < m and pattern[k] == text[text_k + k]:
+                if text[text_k + k:text_k + m] == pattern[k:]:  # compares the rest at once
+                    k = m
+                else:
+                    while pattern[k] == text[text_k + k]:
+                        k += 1
+            if k < m:
+                text_k += k - ell
+                memory = -1
+                continue
+            k = ell
+            while k > memory and pattern[k] == text[text_k + k]:
+                k -= 1
+            if k <= memory:
+                result.append(text_k)
+                if len(result) == how_many:
+                    break
+            text_k += period
+            memory = m - period - 1 if periodic else -1
+        return result
+
+    @staticmethod
+    def calculate_z_array(string):
+        """
+        Z[k] is the length of the longest common prefix of the string and its suffix at k, Z[0] = len.
+          D. Gusfield, 'Algorithms on Strings, Trees, and Sequences', 1997.
+        """
+        n = len(string)
+        z = [0] * n
+        if n:
+            z[0] = n
+        lb = rb = 0  # the rightmost Z-box [lb, rb)
+        for k in range(1, n):
+            if k < rb:
+                z[k] = min(rb - k, z[k - lb])
+            while k + z[k] < n and string[z[k]] == string[k + z[k]]:
+                z[k] += 1
+            if k + z[k] > rb:
+                lb, rb = k, k + z[k]
+        return z
+
+    @staticmethod
+    def search_text_z(text, pattern, how_many=0):
+        """
+        Z-algorithm matching, Z-boxes of the pattern are extended over the text,
+        Z[k] of the text is the longest common prefix of the pattern and the text at k
+        (capped at m), matches are k with Z[k] = m, O(n + m).
+        """
+        assert pattern, "Pattern is empty."
+        result = list()
+        m = len(pattern)
+        n = len(text)
+        z_pattern = TextAlgorithms.calculate_z_array(pattern)
+        lb = rb = 0  # the rightmost Z-box [lb, rb) in the text, text[lb:rb] == pattern[:rb - lb]
+        for text_k in range(n - m + 1):
+            length = min(rb - text_k, z_pattern[text_k - lb]) if text_k < rb else 0
+            if text_k + length >= rb:
+                while length < m and text_k + length < n and pattern[length] == text[text_k + length]:
+                    length += 1
+                lb, rb = text_k, text_k + length
+            if length == m:
+                result.append(text_k)
+                if len(result) == how_many:
+                    break
+        return result
@@ -15,17 +15,41 @@ class Text(Base):
     """
     """
 
+    NormalizationCacheSize = 1 << 16  # number of cached normalized strings and sort keys, LRU eviction
+
+    @staticmethod
+    @functools.lru_cache(maxsize=NormalizationCacheSize)
+    def get_normalized(text, case_insensitive=False, normalization_form='NFKC'):
+        """
+        Returns normalized (and case folded) text, cached, the hot keys of an index
+        are normalized once instead of on every comparison.
+        """
+        assert text is not None
+        result = normalize(normalization_form, text)
+        if case_insensitive:
+            result = normalize(normalization_form, result.casefold())
+        return result
+
+    @staticmethod
+    @functools.lru_cache(maxsize=NormalizationCacheSize)
+    def get_sort_key(text, case_insensitive=False, normalization_form='NFKC'):
+        """
+        Returns binary collation key of the text, cached: UTF-8 of the normalized text,
+        bytes order is the code point order, so keys are compared as plain bytes.
+        Precompute it once per stored key, see Index.BTreeBranch.
+        """
+        return Text.get_normalized(text, case_insensitive, normalization_form).encode('utf-8', 'surrogatepass')
+
     @staticmethod
     def equal(lhs, rhs, case_insensitive=False, normalization_form='NFKC'):
         """
         """
         assert lhs is not None
         assert rhs is not None
-        nfc = functools.partial(normalize, normalization_form)
-        if case_insensitive:
-            return nfc(lhs).casefold() == nfc(rhs).casefold()
-        else:
-            return nfc(lhs) == nfc(rhs)
+        if lhs == rhs:
+            return True
+        return (Text.get_normalized(lhs, case_insensitive, normalization_form) ==
+                Text.get_normalized(rhs, case_insensitive, normalization_form))
 
     @staticmethod
     def compare(lhs, rhs, case_insensitive=False, normalization_form='NFKC'):
@@ -33,15 +57,11 @@ class Text(Base):
         """
         assert lhs is not None
         assert rhs is not None
-        nfc = functools.partial(normalize, normalization_form)
-        if case_insensitive:
-            lhs, rhs = nfc(lhs).casefold(), nfc(rhs).casefold()
-        result = 0
-        if nfc(lhs) < nfc(rhs):
-            result = -1
-        elif nfc(lhs) > nfc(rhs):
-            result = 1
-        return result
+        if lhs == rhs:
+            return 0
+        lhs = Text.get_normalized(lhs, case_insensitive, normalization_form)
+        rhs = Text.get_normalized(rhs, case_insensitive, normalization_form)
+        return (lhs > rhs) - (lhs < rhs)
 
     class PyUnicodeObject(ctypes.Structure):
         """
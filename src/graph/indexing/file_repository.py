@@ -0,0 +1,65 @@
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" File Repository """
+import os
+from graph.indexing.repository import Repository
+from graph.indexing.readonly_file_repository import FileReadOnlyRepository
+
+
+class FileRepository(FileReadOnlyRepository, Repository):
+    """
+    Repository over a file, writes are positional (os.pwrite), the file is created if missing
+    and grows in extents of whole pages, so appending nodes does not resize the file on every write.
+    """
+    ExtentSize = 1 << 20
+
+    def __init__(self, path, page_size, extent_size=ExtentSize):
+        """
+        """
+        super().__init__(path, page_size)
+        self._extent_size = FileRepository.calculate_extent_size(page_size, extent_size)
+
+    @property
+    def extent_size(self):
+        """
+        """
+        return self._extent_size
+
+    @staticmethod
+    def calculate_extent_size(page_size, extent_size):
+        """
+        Rounds the extent size up to whole pages.
+        """
+        return max(1, (extent_size + page_size - 1) // page_size) * page_size
+
+    def open(self):
+        """
+        """
+        return os.open(self._path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+
+    def grow(self, size):
+        """
+        Extends the file to the extent boundary covering the size.
+        """
+        size = (size + self._extent_size - 1) // self._extent_size * self._extent_size
+        os.ftruncate(self._fd, size)
+        self._size = size
+
+    def flush(self):
+        """
+        """
+        os.fsync(self._fd)
+
+    def write(self, offset, buffer):
+        """
+        Writes specific buffer at the offset.
+        """
+        if offset + len(buffer) > self._size:
+            self.grow(offset + len(buffer))
+        if hasattr(os, 'pwrite'):
+            os.pwrite(self._fd, buffer, offset)
+        else:
+            with self._lock:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                os.write(self._fd, buffer)
@@ -2,13 +2,23 @@
 # UI Lab Inc. Arthur Amshukov
 #
 """  B-Tree based Index implementation """
-import math
+import bisect
+import heapq
+import os
+import pickle
+import queue
 import struct
+import tempfile
+import threading
 from collections import namedtuple
 from functools import lru_cache
+from graph.core.base import Base
 from graph.core.text import Text
 from graph.adt.tree import Tree
 from graph.core.entity import Entity
+from graph.indexing.node_cache import NodeCache
+from graph.indexing.node_codec import NodeCodec
+from graph.indexing.slotted_node_codec import SlottedNodeCodec
 
 
 class Index(Entity):
@@ -21,28 +31,45 @@ class Index(Entity):
     HeaderSize = 64  # bytes
     TreeHeader = 'AA 1.0.0'  # tree/record header
     TreeHeaderSize = 28  # bytes
+    TreeHeaderBytes = TreeHeader.encode('utf-8')
+    SlottedTreeHeader = 'AA 2.0.0'  # slotted page tree/record header, see SlottedNodeCodec
+    FreeHeader = 'AA free'  # free node record header
+    OverflowHeader = 'AA ovf'  # overflow page header
     KeySize = 36  # bytes
     ValueSize = 56  # bytes
     PtrSize = 4  # bytes, integer
     Kvp = namedtuple('Kvp', 'key value')
-    Counter = 0
+    Overflow = SlottedNodeCodec.Overflow  # reference to a value in the overflow page chain
+    CacheSize = 1024  # number of cached unpinned nodes
+    PinnedLevels = 2  # the root and upper levels stay in the node cache
+    ReadAhead = 4  # number of leaves read ahead by cursors
+    FillFactor = 0.9  # occupancy of nodes built by bulk load
+    RunSize = 1 << 16  # number of key:value pairs sorted in memory by bulk load
+    WriteBlockSize = 64  # number of nodes written at once by bulk load
 
     def __init__(self,
                  repository,
                  fanout=M,
                  id=0,
                  label='',
-                 version='1.0'):
+                 version='1.0',
+                 cache_size=CacheSize,
+                 page_size=None):
         """
+        page_size - slotted page layout with variable-length keys and values (SlottedNodeCodec),
+        fanout follows from the page size, otherwise nodes have fixed size slots (NodeCodec).
         """
         super().__init__(id, version)
         self._label = label
         self._repository = repository
-        self._fanout = fanout
+        self.set_codec(fanout, page_size)
         self._root = None
         self._height = 0
         self._number_of_branches = 0
         self._number_of_leaves = 0
+        self._free_id = 0  # head of the free list, freed node slots are chained through their records
+        self._last_id = 0  # the last allocated node id, ids are dense within the index (repository)
+        self._cache = NodeCache(cache_size)
 
     def __repr__(self):
         """
@@ -114,12 +141,78 @@ class Index(Entity):
         """
         return self._number_of_branches + self._number_of_leaves
 
+    @property
+    def cache(self):
+        """
+        """
+        return self._cache
+
+    @property
+    def repository(self):
+        """
+        """
+        return self._repository
+
+    @property
+    def free_id(self):
+        """
+        """
+        return self._free_id
+
+    @property
+    def last_id(self):
+        """
+        """
+        return self._last_id
+
+    @property
+    def page_size(self):
+        """
+        """
+        return self._page_size
+
+    @property
+    def codec(self):
+        """
+        """
+        return self._codec
+
+    def set_codec(self, fanout, page_size):
+        """
+        """
+        self._page_size = page_size
+        if page_size:
+            self._codec = Index.get_slotted_codec(page_size)
+            self._fanout = self._codec.fanout
+        else:
+            self._codec = Index.get_codec(fanout)
+            self._fanout = fanout
+
     @staticmethod
-    def get_next_id():
+    @lru_cache
+    def get_codec(fanout, key_size=KeySize, value_size=ValueSize):
         """
+        Returns precompiled node codec, one per (fanout, key size, value size).
         """
-        Index.Counter += 1
-        return Index.Counter
+        return NodeCodec(fanout,
+                         Index.TreeHeaderBytes,
+                         Index.TreeHeaderSize,
+                         key_size,
+                         value_size,
+                         Index.BTreeBranch.calculate_size(fanout))
+
+    @staticmethod
+    @lru_cache
+    def get_slotted_codec(page_size):
+        """
+        """
+        return SlottedNodeCodec(page_size, Index.SlottedTreeHeader.encode('utf-8'))
+
+    def get_next_id(self):
+        """
+        """
+        self._last_id += 1
+        return self._last_id
 
     class BTreeBranch(Tree):
         """
@@ -134,6 +227,7 @@ class Index(Entity):
             super().__init__(id, version)
             self._fanout = fanout
             self._keys = [None] * fanout  # list of keys
+            self._sort_keys = [None] * fanout  # binary collation keys of keys, see Text.get_sort_key
             self._keys_count = 0  # occupancy, number of keys currently stored
             self._kids = [None] * (fanout + 1)  # list of kids
             self._kid_ids = [0] * (fanout + 1)  # list of kid ids for i/o
@@ -176,11 +270,30 @@ class Index(Entity):
             """
             return self._keys
 
+        @property
+        def fanout(self):
+            """
+            """
+            return self._fanout
+
+        @property
+        def sort_keys(self):
+            """
+            """
+            return self._sort_keys
+
+        @property
+        def keys_count(self):
+            """
+            """
+            return self._keys_count
+
         def set_key(self, key, position):
             """
             """
             assert position < len(self._keys), "Invalid position."
             self._keys[position] = key
+            self._sort_keys[position] = None if key is None else Text.get_sort_key(key)
             self._keys_count = sum(k is not None for k in self._keys)
 
         def remove_key(self, position):
@@ -188,6 +301,7 @@ class Index(Entity):
             """
             assert position < len(self._keys), "Invalid position."
             self._keys[position] = None
+            self._sort_keys[position] = None
             self._keys_count = sum(k is not None for k in self._keys)
 
         def search_key(self, key, lo=0, hi=None):
@@ -201,17 +315,17 @@ class Index(Entity):
                     _hi = len(_keys) - 1
                 while _lo <= _hi:
                     mid = (_hi + _lo) // 2
-                    cmp = Text.compare(_key, _keys[mid])
-                    if cmp > 0:
+                    assert _keys[mid] is not None, "Invalid key."
+                    if _key > _keys[mid]:  # binary collation keys, plain bytes comparison
                         _lo = mid + 1
-                    elif cmp < 0:
+                    elif _key < _keys[mid]:
                         _hi = mid - 1
                     else:
                         result = mid
                         break
                 return result
 
-            return binary_search(key, self._keys, lo, hi)
+            return binary_search(Text.get_sort_key(key), self._sort_keys, lo, hi)
 
         def search_key_position(self, key, lo=0, hi=None, desc=False):
             """
@@ -224,16 +338,16 @@ class Index(Entity):
                 while _lo < _hi:
                     mid = (_hi + _lo) // 2
                     if _keys[mid] is None:
-                        cmp = -1 if desc else 1  # None is always less/bigger than key
+                        less = desc  # None is always less/bigger than key
                     else:
-                        cmp = Text.compare(_key, _keys[mid])
-                    if cmp < 0:
+                        less = _key < _keys[mid]  # binary collation keys, plain bytes comparison
+                    if less:
                         _hi = mid
                     else:
                         _lo = mid + 1
                 return _lo
 
-            return locate(key, self._keys, lo, hi)
+            return locate(Text.get_sort_key(key), self._sort_keys, lo, hi)
 
         def insert_key(self, key, lo=0, hi=None):
             """
@@ -246,7 +360,9 @@ class Index(Entity):
             assert position < hi, "Invalid position calculated."
             for k in range(hi - 1, position, -1):
                 self._keys[k] = self._keys[k - 1]
+                self._sort_keys[k] = self._sort_keys[k - 1]
             self._keys[position] = key
+            self._sort_keys[position] = Text.get_sort_key(key)
             self._keys_count = sum(k is not None for k in self._keys)
             return self._keys, position
 
@@ -265,6 +381,14 @@ class Index(Entity):
             self._kids[position] = kid
             self._kid_ids[position] = kid.id
 
+        def set_kid_id(self, id, position):
+            """
+            Links the kid by id only, the kid object is not referenced (see Index node cache).
+            """
+            assert position < len(self._kid_ids), "Invalid position."
+            self._kids[position] = None
+            self._kid_ids[position] = id
+
         def remove_kid(self, position):
             """
             """
@@ -272,6 +396,19 @@ class Index(Entity):
             self._kids[position] = None
             self._kid_ids[position] = 0
 
+        def assign(self, keys, kid_ids):
+            """
+            Replaces keys and kid ids, the rest of slots are cleared.
+            """
+            assert len(keys) <= self._fanout, "Invalid keys. Size mismatch."
+            assert len(kid_ids) == len(keys) + 1, "Invalid kids. Size mismatch."
+            padding = self._fanout - len(keys)
+            self._keys = list(keys) + [None] * padding
+            self._sort_keys = [Text.get_sort_key(key) for key in keys] + [None] * padding
+            self._keys_count = len(keys)
+            self._kids = [None] * (self._fanout + 1)
+            self._kid_ids = list(kid_ids) + [0] * padding
+
         @property
         def kid_ids(self):
             """
@@ -292,11 +429,12 @@ class Index(Entity):
         @lru_cache
         def calculate_size(fanout):
             """
+            Size of the node slot, branches and leaves share it so node id maps to a fixed offset.
             """
             result = Index.TreeHeaderSize
             result += fanout * Index.KeySize
             result += (fanout + 1) * Index.PtrSize
-            return result
+            return max(result, Index.BTreeLeaf.calculate_leaf_size(fanout))
 
         @staticmethod
         def get_count_pack_template():
@@ -324,102 +462,24 @@ class Index(Entity):
             assert struct.calcsize(string_template) == string_size, "Invalid pack template. Size mismatch."
             return string_template
 
-        @staticmethod
-        def get_header_pack_template(header, header_size):
-            """
-            """
-            count_template = Index.BTreeBranch.get_count_pack_template()
-            count_template_size = struct.calcsize(count_template)
-            header_template = f"{Index.BTreeBranch.get_string_pack_template(header, header_size - 2 * count_template_size)}"
-            header_template += f"2{count_template}"
-            assert struct.calcsize(header_template) == Index.TreeHeaderSize
-            return header_template
-
-        @staticmethod
-        def calculate_buffer_size(header, header_size, fanout, keys, key_size):
-            """
-            """
-            header_template = Index.BTreeBranch.get_header_pack_template(header, header_size)
-            core_template = f"{header_template}{fanout + 1}I"
-            keys_template = ""
-            for key in keys:
-                key = '' if not key else key
-                keys_template += Index.BTreeBranch.get_string_pack_template(key, key_size)
-            return struct.calcsize(core_template) + struct.calcsize(keys_template)
-
-        def serialize(self):
+        def serialize(self, codec=None):
             """
             TreeHeader | P(0) | ... | P(i-1) | P(i) | Kn | K(0) | ... | K(i-1)
             TreeHeader: ... | Fanout | KeysCount
             P - kid pointer id, K - key.
+            See NodeCodec, codec might be SlottedNodeCodec as well.
             """
-            buffer_size = Index.BTreeBranch.calculate_buffer_size(Index.TreeHeader,
-                                                                  Index.TreeHeaderSize,
-                                                                  self._fanout,
-                                                                  self._keys,
-                                                                  Index.KeySize)
-            offset = 0
-            buffer = bytearray(buffer_size)
-            header_template = f"{Index.Endianness}" \
-                              f"{Index.BTreeBranch.get_header_pack_template(Index.TreeHeader, Index.TreeHeaderSize)}"
-            header_bytes = bytes(Index.TreeHeader, 'utf-8')
-            struct.pack_into(header_template,
-                             buffer,
-                             offset,
-                             len(header_bytes),
-                             header_bytes,
-                             self._fanout,
-                             self._keys_count)
-            offset = struct.calcsize(header_template)
-            kids_count = self._fanout + 1
-            kids_template = f"{kids_count}I"
-            struct.pack_into(kids_template, buffer, offset, *self._kid_ids)
-            offset += struct.calcsize(kids_template)
-            for key in self._keys:
-                key = '' if not key else key
-                key_template = f"{Index.Endianness}{Index.BTreeBranch.get_string_pack_template(key, Index.KeySize)}"
-                key_template_size = struct.calcsize(key_template)
-                assert key_template_size == Index.KeySize
-                key_bytes = bytes(key, 'utf-8')
-                struct.pack_into(key_template, buffer, offset, len(key_bytes), key_bytes)
-                offset += key_template_size
-            padding_size = Index.BTreeBranch.calculate_size(self._fanout) - len(buffer)
-            buffer.extend(b'\x00' * padding_size)
-            return buffer
+            codec = codec or Index.get_codec(self._fanout)
+            return codec.pack_branch(self._keys_count, self._kid_ids, self._keys)
 
         @staticmethod
-        def deserialize(buffer):
-            """
-            """
-            offset = 0
-            header_template = f"{Index.Endianness}" \
-                              f"{Index.BTreeBranch.get_header_pack_template(Index.TreeHeader, Index.TreeHeaderSize)}"
-            _, header, fanout, keys_count, *tail = struct.unpack_from(header_template, buffer, 0)
-            header = header.decode('utf-8').strip()
-            assert Text.equal(header, Index.TreeHeader), "Invalid header. Content mismatch."
-            offset += struct.calcsize(header_template)
-            kids_count = fanout + 1
-            kids_template = f"{Index.Endianness}{kids_count}I"
-            kids = struct.unpack_from(kids_template, buffer, offset)
-            kids = list(kids)
-            assert len(kids) == kids_count, "Invalid kids. Size mismatch."
-            offset += struct.calcsize(kids_template)
-            count_template = f"{Index.Endianness}{Index.BTreeBranch.get_count_pack_template()}"
-            count_size = struct.calcsize(count_template)
-            keys = list()
-            for _ in range(keys_count):
-                key_bytes_len, *tail = struct.unpack_from(count_template, buffer, offset)
-                offset += count_size
-                key_template = f"{Index.Endianness}" \
-                               f"{Index.BTreeBranch.get_string_pack_template(None, Index.KeySize, key_bytes_len)}"
-                key_template = key_template[2:]
-                key_size = struct.calcsize(key_template)
-                key, *tail = struct.unpack_from(key_template, buffer, offset)
-                key = key.decode('utf-8').strip()
-                keys.append(key)
-                offset += key_size
-            assert len(keys) == keys_count, "Invalid keys. Size mismatch."
-            return header, keys_count, keys, kids
+        def deserialize(buffer, codec=None):
+            """
+            """
+            codec = codec or Index.get_codec(NodeCodec.get_counts(buffer, Index.TreeHeaderSize)[0])
+            header, keys_count, keys, kids = codec.unpack_branch(buffer)
+            assert header == codec.header, "Invalid header. Content mismatch."
+            return header.decode('utf-8'), keys_count, keys, kids
 
     class BTreeLeaf(BTreeBranch):
         """
@@ -490,6 +550,18 @@ class Index(Entity):
             assert position < len(self._values), "Invalid position."
             self._values[position] = None
 
+        def assign(self, keys, values):
+            """
+            Replaces keys and values, the rest of slots are cleared.
+            """
+            assert len(keys) <= self._fanout, "Invalid keys. Size mismatch."
+            assert len(values) == len(keys), "Invalid values. Size mismatch."
+            padding = self._fanout - len(keys)
+            self._keys = list(keys) + [None] * padding
+            self._sort_keys = [Text.get_sort_key(key) for key in keys] + [None] * padding
+            self._keys_count = len(keys)
+            self._values = list(values) + [None] * padding
+
         def insert_key_value(self, key, value, lo=0, hi=None):
             """
             Inserts key:value based on a key to the right of the found position (handles duplicates).
@@ -501,8 +573,10 @@ class Index(Entity):
             assert position < hi, "Invalid position calculated."
             for k in range(hi - 1, position, -1):
                 self._keys[k] = self._keys[k - 1]
+                self._sort_keys[k] = self._sort_keys[k - 1]
                 self._values[k] = self._values[k - 1]
             self._keys[position] = key
+            self._sort_keys[position] = Text.get_sort_key(key)
             self._values[position] = value
             self._keys_count = sum(k is not None for k in self._keys)
             return self._keys, self._values, position
@@ -567,7 +641,7 @@ class Index(Entity):
 
         @staticmethod
         @lru_cache
-        def calculate_size(fanout):
+        def calculate_leaf_size(fanout):
             """
             """
             result = Index.TreeHeaderSize
@@ -577,197 +651,520 @@ class Index(Entity):
             return result
 
         @staticmethod
-        def get_header_pack_template(header, header_size):
-            """
-            """
-            count_template = Index.BTreeBranch.get_count_pack_template()
-            count_template_size = struct.calcsize(count_template)
-            header_template =\
-                f"{Index.BTreeBranch.get_string_pack_template(header, header_size - 4 * count_template_size)}"
-            header_template += f"4{count_template}"
-            assert struct.calcsize(header_template) == Index.TreeHeaderSize
-            return header_template
-
-        @staticmethod
-        def calculate_leaf_buffer_size(header, header_size, keys, key_size, values, value_size):
+        def calculate_size(fanout):
             """
+            See BTreeBranch.calculate_size.
             """
-            header_template = Index.BTreeLeaf.get_header_pack_template(header, header_size)
-            keys_template = ""
-            for key in keys:
-                key = '' if not key else key
-                keys_template += Index.BTreeBranch.get_string_pack_template(key, key_size)
-            values_template = ""
-            for value in values:
-                value = '' if not value else value
-                values_template += Index.BTreeBranch.get_string_pack_template(value, value_size)
-            return struct.calcsize(header_template) + struct.calcsize(keys_template) + struct.calcsize(values_template)
+            return Index.BTreeBranch.calculate_size(fanout)
 
-        def serialize(self):
+        def serialize(self, codec=None):
             """
             TreeHeader | KVPn | KVP(0) | ... | KVP(i-1)
             TreeHeader: ... | Prev | Next | Fanout | KeysCount | ...
             P - data pointer id (overflow page), KVP - key:value pair.
+            See NodeCodec, codec might be SlottedNodeCodec as well.
             """
-            buffer_size = Index.BTreeLeaf.calculate_leaf_buffer_size(Index.TreeHeader,
-                                                                     Index.TreeHeaderSize,
-                                                                     self._keys,
-                                                                     Index.KeySize,
-                                                                     self._values,
-                                                                     Index.ValueSize)
-            offset = 0
-            buffer = bytearray(buffer_size)
-            header_template = f"{Index.Endianness}" \
-                              f"{Index.BTreeLeaf.get_header_pack_template(Index.TreeHeader, Index.TreeHeaderSize)}"
-            header_bytes = bytes(Index.TreeHeader, 'utf-8')
-            struct.pack_into(header_template,
-                             buffer,
-                             offset,
-                             len(header_bytes),
-                             header_bytes,
-                             self._prev_id,
-                             self._next_id,
-                             self._fanout,
-                             self._keys_count)
-            offset = struct.calcsize(header_template)
-            for kvp in zip(self._keys, self._values):
-                key, value = kvp
-                key = '' if not key else key
-                key_template = f"{Index.Endianness}" \
-                               f"{Index.BTreeBranch.get_string_pack_template(key, Index.KeySize)}"
-                key_template_size = struct.calcsize(key_template)
-                assert key_template_size == Index.KeySize
-                key_bytes = bytes(key, 'utf-8')
-                struct.pack_into(key_template, buffer, offset, len(key_bytes), key_bytes)
-                offset += key_template_size
-                value = '' if not value else value
-                value_template = f"{Index.Endianness}{Index.BTreeBranch.get_string_pack_template(value, Index.ValueSize)}"
-                value_template_size = struct.calcsize(value_template)
-                assert value_template_size == Index.ValueSize
-                value_bytes = bytes(value, 'utf-8')
-                struct.pack_into(value_template, buffer, offset, len(value_bytes), value_bytes)
-                offset += value_template_size
-            padding_size = Index.BTreeLeaf.calculate_size(self._fanout) - len(buffer)
-            buffer.extend(b'\x00' * padding_size)
-            return buffer
+            codec = codec or Index.get_codec(self._fanout)
+            return codec.pack_leaf(self._prev_id,
+                                   self._next_id,
+                                   self._keys_count,
+                                   self._keys,
+                                   self._values)
 
         @staticmethod
-        def deserialize(buffer):
-            """
-            """
-            offset = 0
-            header_template = f"{Index.Endianness}" \
-                              f"{Index.BTreeLeaf.get_header_pack_template(Index.TreeHeader, Index.TreeHeaderSize)}"
-            _, header, prev_id, next_id, fanout, keys_count, *tail = struct.unpack_from(header_template, buffer, 0)
-            header = header.decode('utf-8').strip()
-            assert Text.equal(header, Index.TreeHeader), "Invalid header. Content mismatch."
-            values_count = keys_count
-            offset += struct.calcsize(header_template)
-            count_template = f"{Index.Endianness}{Index.BTreeBranch.get_count_pack_template()}"
-            count_size = struct.calcsize(count_template)
-            keys = list()
-            values = list()
-            for _ in range(keys_count):
-                key_bytes_len, *tail = struct.unpack_from(count_template, buffer, offset)
-                offset += count_size
-                key_template = f"{Index.Endianness}" \
-                               f"{Index.BTreeBranch.get_string_pack_template(None, Index.KeySize, key_bytes_len)}"
-                key_template = key_template[2:]
-                key_size = struct.calcsize(key_template)
-                key, *tail = struct.unpack_from(key_template, buffer, offset)
-                key = key.decode('utf-8').strip()
-                keys.append(key)
-                offset += key_size
-                value_bytes_len, *tail = struct.unpack_from(count_template, buffer, offset)
-                offset += count_size
-                value_template = f"{Index.Endianness}" \
-                                 f"{Index.BTreeBranch.get_string_pack_template(None, Index.ValueSize, value_bytes_len)}"
-                value_template = value_template[2:]
-                value_size = struct.calcsize(value_template)
-                value, *tail = struct.unpack_from(value_template, buffer, offset)
-                value = value.decode('utf-8').strip()
-                values.append(value)
-                offset += value_size
-            assert len(keys) == keys_count, "Invalid keys. Size mismatch."
-            assert len(values) == values_count, "Invalid values. Size mismatch."
-            return header, keys_count, keys, values, prev_id, next_id
+        def deserialize(buffer, codec=None):
+            """
+            """
+            codec = codec or Index.get_codec(NodeCodec.get_counts(buffer, Index.TreeHeaderSize)[0])
+            header, keys_count, keys, values, prev_id, next_id = codec.unpack_leaf(buffer)
+            assert header == codec.header, "Invalid header. Content mismatch."
+            return header.decode('utf-8'), keys_count, keys, values, prev_id, next_id
 
     def search(self, key):
         """
+        Point search, descends from the root by kid ids through the node cache.
+        Returns (leaf, value, position) or (None, None, -1) if the key is not found.
+        """
+        assert key is not None, "Key must be non None."
+        if not self._root:
+            return None, None, -1
+        tree = self._root
+        sort_key = Text.get_sort_key(key)
+        for level in range(self._height):
+            position = bisect.bisect_right(tree.sort_keys, sort_key, 0, tree.keys_count)
+            tree = self.load_tree(tree.kid_ids[position], leaf=level + 1 == self._height, level=level + 1)
+        position = tree.search_key(key, hi=tree.keys_count - 1)
+        if position < 0:
+            return None, None, -1
+        return tree, self.resolve_value(tree.values[position]), position
+
+    def multi_search(self, keys):
+        """
+        Batch point search, probe keys are sorted and descend together, so every node
+        on shared paths is visited once per batch. Returns list of values (None if not found)
+        in order of keys.
+        """
+        result = [None] * len(keys)
+        if not self._root or not keys:
+            return result
+        probes = sorted((Text.get_sort_key(key), k) for k, key in enumerate(keys))
+        stack = [(self._root, 0, 0, len(probes))]  # (tree, level, probes range)
+        while stack:
+            tree, level, lo, hi = stack.pop()
+            count = tree.keys_count
+            sort_keys = tree.sort_keys
+            if level == self._height:
+                for sort_key, k in probes[lo:hi]:
+                    position = bisect.bisect_left(sort_keys, sort_key, 0, count)
+                    if position < count and sort_keys[position] == sort_key:
+                        result[k] = self.resolve_value(tree.values[position])
+                continue
+            leaf = level + 1 == self._height
+            while lo < hi:
+                position = bisect.bisect_right(sort_keys, probes[lo][0], 0, count)
+                if position < count:  # probes going to the same kid
+                    end = bisect.bisect_left(probes, (sort_keys[position],), lo, hi)
+                else:
+                    end = hi
+                stack.append((self.load_tree(tree.kid_ids[position], leaf=leaf, level=level + 1), level + 1, lo, end))
+                lo = end
+        return result
+
+    def find_leaf(self, sort_key=None, upper=False):
+        """
+        Descends to the leaf where the lower bound (the first key >= sort_key) or
+        the upper bound (the first key > sort_key) is, None goes to the first leaf (the last one if upper).
+        Returns (leaf, position of the bound in the leaf), position might be keys count.
+        """
+        if not self._root:
+            return None, 0
+        tree = self._root
+        search = bisect.bisect_right if upper else bisect.bisect_left
+        for level in range(self._height):
+            if sort_key is None:
+                position = tree.keys_count if upper else 0
+            else:
+                position = search(tree.sort_keys, sort_key, 0, tree.keys_count)
+            tree = self.load_tree(tree.kid_ids[position], leaf=level + 1 == self._height, level=level + 1)
+        if sort_key is None:
+            return tree, tree.keys_count if upper else 0
+        return tree, search(tree.sort_keys, sort_key, 0, tree.keys_count)
+
+    def cursor(self, key=None, reverse=False, readahead=ReadAhead):
+        """
+        Returns cursor at the first key >= key (the last key <= key if reverse),
+        key None starts from the first (last) key.
+        """
+        leaf, position = self.find_leaf(None if key is None else Text.get_sort_key(key), upper=reverse)
+        return Index.Cursor(self, leaf, position - 1 if reverse else position, reverse, readahead)
+
+    def range(self, lo=None, hi=None, reverse=False, readahead=ReadAhead):
+        """
+        Yields key:value pairs (Kvp) with lo <= key < hi in key order (descending if reverse),
+        None bounds are open.
+        """
+        lo_key = None if lo is None else Text.get_sort_key(lo)
+        hi_key = None if hi is None else Text.get_sort_key(hi)
+        if reverse:
+            leaf, position = self.find_leaf(hi_key, upper=hi_key is None)
+            cursor = Index.Cursor(self, leaf, position - 1, True, readahead)
+        else:
+            cursor = self.cursor(lo, readahead=readahead)
+        with cursor:
+            for kvp in cursor:
+                sort_key = Text.get_sort_key(kvp.key)
+                if (lo_key is not None and sort_key < lo_key) if reverse else \
+                        (hi_key is not None and sort_key >= hi_key):
+                    break
+                yield kvp
+
+    def prefix(self, prefix, reverse=False, readahead=ReadAhead):
+        """
+        Yields key:value pairs (Kvp) of keys starting with the prefix (normalized keys, see Text.get_sort_key).
+        """
+        prefix_key = Text.get_sort_key(prefix)
+        if reverse:
+            # the last key with the prefix precedes the smallest byte string greater than all of them
+            successor = prefix_key.rstrip(b'\xff')
+            successor = successor[:-1] + bytes([successor[-1] + 1]) if successor else None
+            leaf, position = self.find_leaf(successor, upper=successor is None)
+            cursor = Index.Cursor(self, leaf, position - 1, True, readahead)
+        else:
+            cursor = self.cursor(prefix, readahead=readahead)
+        with cursor:
+            for kvp in cursor:
+                if not Text.get_sort_key(kvp.key).startswith(prefix_key):
+                    break
+                yield kvp
+
+    class Cursor(Base):
         """
-        tree = None
-        value = None
-        position = 0
-        return tree, value, position
+        Streams key:value pairs (Kvp) lazily along the leaf chain (next_id/prev_id links).
+        With readahead > 0 a background thread reads and deserializes up to readahead leaves ahead
+        of the consumer (bypassing the node cache, so scans do not evict hot nodes) once
+        the cursor leaves its first leaf. Close the cursor (or use it as a context manager)
+        when it is abandoned before the end.
+        """
+
+        def __init__(self, index, leaf, position, reverse=False, readahead=0):
+            """
+            """
+            super().__init__()
+            self._index = index
+            self._leaf = leaf
+            self._position = position
+            self._reverse = reverse
+            self._readahead = readahead
+            self._queue = None  # leaves read ahead, None at the end of the chain
+            self._thread = None
+            self._stop = threading.Event()
+            self._error = None
+
+        def __repr__(self):
+            """
+            """
+            return f"{type(self).__name__}:{self._leaf}:{self._position}:{self._reverse}"
+
+        __str__ = __repr__
+
+        def __iter__(self):
+            """
+            """
+            return self
+
+        def __next__(self):
+            """
+            """
+            while self._leaf is not None:
+                position = self._position
+                if 0 <= position < self._leaf.keys_count:
+                    self._position += -1 if self._reverse else 1
+                    value = self._index.resolve_value(self._leaf.values[position])
+                    return Index.Kvp(self._leaf.keys[position], value)
+                self._leaf = self.next_leaf()
+                if self._leaf is not None:
+                    self._position = self._leaf.keys_count - 1 if self._reverse else 0
+            raise StopIteration
+
+        def __enter__(self):
+            """
+            """
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            """
+            """
+            self.close()
+
+        def get_next_id(self, leaf):
+            """
+            """
+            return leaf.prev_id if self._reverse else leaf.next_id
+
+        def next_leaf(self):
+            """
+            """
+            id = self.get_next_id(self._leaf)
+            if not id:
+                return None
+            if self._readahead <= 0:
+                return self._index.load_tree(id, leaf=True)
+            if self._thread is None:
+                self._queue = queue.Queue(maxsize=self._readahead)
+                self._thread = threading.Thread(target=self.read_ahead, args=(id,), daemon=True)
+                self._thread.start()
+            result = self._queue.get()
+            if self._error is not None:
+                raise self._error
+            return result
+
+        def read_ahead(self, id):
+            """
+            Producer, walks the leaf chain and fills the queue, None marks the end.
+            """
+            leaf = None
+            try:
+                while id and not self._stop.is_set():
+                    leaf = self._index.read_tree(id, leaf=True)
+                    self.put(leaf)
+                    id = self.get_next_id(leaf)
+            except Exception as ex:
+                self._error = ex
+            self.put(None)
+
+        def put(self, leaf):
+            """
+            """
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(leaf, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+        def close(self):
+            """
+            """
+            self._stop.set()
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+            self._leaf = None
 
     def create_branch(self):
-        result = Index.BTreeBranch(Index.get_next_id(), self._fanout)
+        result = Index.BTreeBranch(self.allocate_id(), self._fanout)
         self._number_of_branches += 1
         return result
 
     def create_leaf(self):
-        result = Index.BTreeLeaf(Index.get_next_id(), self._fanout)
+        result = Index.BTreeLeaf(self.allocate_id(), self._fanout)
         self._number_of_leaves += 1
         return result
 
+    def allocate_id(self, persist=True):
+        """
+        Reuses the head of the free list, a new id otherwise.
+        persist - saves the index header (free list, LastId), bulk load saves it once at the end.
+        """
+        result = self._free_id
+        if result:
+            buffer = self._repository.read(self.calculate_offset(result), Index.TreeHeaderSize)
+            _, header, self._free_id = struct.unpack_from(Index.get_free_pack_template(), buffer, 0)
+            assert Text.equal(header.decode('utf-8').strip(), Index.FreeHeader), "Invalid free node. Content mismatch."
+        else:
+            result = self.get_next_id()
+        if persist:
+            self.save_header()  # reopened indexes do not reuse allocated ids
+        return result
+
+    def free_tree(self, tree):
+        """
+        Drops the node and pushes its slot to the free list.
+        """
+        self._cache.invalidate(tree.id)
+        if isinstance(tree, Index.BTreeLeaf):
+            self._number_of_leaves -= 1
+        else:
+            self._number_of_branches -= 1
+        self.free_page(tree.id)
+
+    def free_page(self, id):
+        """
+        Pushes the slot to the free list (persisted, the record keeps the next free id).
+        """
+        buffer = bytearray(Index.TreeHeaderSize)
+        header_bytes = bytes(Index.FreeHeader, 'utf-8')
+        struct.pack_into(Index.get_free_pack_template(), buffer, 0, len(header_bytes), header_bytes, self._free_id)
+        self._repository.write(self.calculate_offset(id), buffer)
+        self._free_id = id
+        self.save_header()
+
+    @staticmethod
+    @lru_cache
+    def get_overflow_pack_template():
+        """
+        OverflowHeader | NextId | Size | bytes
+        """
+        count_template = Index.BTreeBranch.get_count_pack_template()
+        overflow_template = f"{Index.Endianness}" \
+                            f"{Index.BTreeBranch.get_string_pack_template(Index.OverflowHeader, 12)}" \
+                            f"2{count_template}"
+        return overflow_template
+
+    def store_value(self, value, pages=None):
+        """
+        Moves the value which is too long to be inline to the overflow page chain,
+        returns Overflow reference, otherwise the value as is.
+        pages - list collecting (id, buffer) of the chain for the caller to write (bulk load),
+        otherwise pages are written at once.
+        """
+        if self._codec.is_inline(value):
+            return value
+        data = value.encode('utf-8')
+        template = Index.get_overflow_pack_template()
+        chunk_size = self._codec.size - struct.calcsize(template)
+        ids = [self.allocate_id(persist=pages is None) for _ in range(0, len(data), chunk_size)]
+        header_bytes = bytes(Index.OverflowHeader, 'utf-8')
+        for k, id in enumerate(ids):
+            chunk = data[k * chunk_size:(k + 1) * chunk_size]
+            buffer = bytearray(self._codec.size)
+            next_id = ids[k + 1] if k + 1 < len(ids) else 0
+            struct.pack_into(template, buffer, 0, len(header_bytes), header_bytes, next_id, len(chunk))
+            buffer[struct.calcsize(template):struct.calcsize(template) + len(chunk)] = chunk
+            if pages is not None:
+                pages.append((id, buffer))
+            else:
+                self._repository.write(self.calculate_offset(id), buffer)
+        return Index.Overflow(ids[0], len(data))
+
+    def resolve_value(self, value):
+        """
+        Reads the value of Overflow reference, other values are returned as is.
+        """
+        if not isinstance(value, Index.Overflow):
+            return value
+        template = Index.get_overflow_pack_template()
+        header_size = struct.calcsize(template)
+        result = bytearray()
+        id = value.id
+        while id:
+            buffer = self._repository.read(self.calculate_offset(id), self._codec.size)
+            _, header, id, size = struct.unpack_from(template, buffer, 0)
+            assert header.rstrip(b'\x00') == bytes(Index.OverflowHeader, 'utf-8'), "Invalid overflow page."
+            result.extend(buffer[header_size:header_size + size])
+        assert len(result) == value.length, "Invalid overflow chain, size mismatch."
+        return result.decode('utf-8')
+
+    def free_value(self, value):
+        """
+        Frees pages of the overflow page chain of the value.
+        """
+        if not isinstance(value, Index.Overflow):
+            return
+        template = Index.get_overflow_pack_template()
+        id = value.id
+        while id:
+            buffer = self._repository.read(self.calculate_offset(id), struct.calcsize(template))
+            _, _, next_id, _ = struct.unpack_from(template, buffer, 0)
+            self.free_page(id)
+            id = next_id
+
+    @staticmethod
+    @lru_cache
+    def get_free_pack_template():
+        """
+        FreeHeader | NextFreeId
+        """
+        count_template = Index.BTreeBranch.get_count_pack_template()
+        free_template = f"{Index.Endianness}" \
+                        f"{Index.BTreeBranch.get_string_pack_template(Index.FreeHeader, Index.TreeHeaderSize - 4)}" \
+                        f"{count_template}"
+        assert struct.calcsize(free_template) == Index.TreeHeaderSize
+        return free_template
+
+    @staticmethod
+    @lru_cache
+    def get_index_header_pack_template():
+        """
+        Header | Fanout | RootId | Height | FreeId | Branches | Leaves | LastId | PageSize
+        PageSize is 0 for fixed size slots, see NodeCodec and SlottedNodeCodec.
+        """
+        count_template = Index.BTreeBranch.get_count_pack_template()
+        header_template = f"{Index.Endianness}" \
+                          f"{Index.BTreeBranch.get_string_pack_template(Index.Header, 32)}" \
+                          f"8{count_template}"
+        assert struct.calcsize(header_template) <= Index.HeaderSize
+        return header_template
+
+    def save_header(self):
+        """
+        """
+        buffer = bytearray(Index.HeaderSize)
+        header_bytes = bytes(Index.Header, 'utf-8')
+        struct.pack_into(Index.get_index_header_pack_template(),
+                         buffer,
+                         0,
+                         len(header_bytes),
+                         header_bytes,
+                         self._fanout,
+                         self._root.id if self._root else 0,
+                         self._height,
+                         self._free_id,
+                         self._number_of_branches,
+                         self._number_of_leaves,
+                         self._last_id,
+                         self._page_size or 0)
+        self._repository.write(0, buffer)
+
+    def load_header(self):
+        """
+        Restores the index (root, height, free list) saved by save_header.
+        """
+        buffer = self._repository.read(0, Index.HeaderSize)
+        (_, header, fanout, root_id, self._height, self._free_id,
+         self._number_of_branches, self._number_of_leaves, self._last_id, page_size) =\
+            struct.unpack_from(Index.get_index_header_pack_template(), buffer, 0)
+        assert Text.equal(header.decode('utf-8').strip(), Index.Header), "Invalid header. Content mismatch."
+        self.set_codec(fanout, page_size or None)
+        self._cache.clear()
+        self.calculate_offset.cache_clear()
+        self._root = None
+        self.set_root(self.read_tree(root_id, leaf=self._height == 0) if root_id else None)
+
+    def set_root(self, root):
+        """
+        Replaces the root, the root is pinned in the node cache.
+        """
+        if self._root is not None:
+            self._cache.unpin(self._root.id)
+        self._root = root
+        if root is not None:
+            self._cache.pin(root.id, root)
+
     def insert(self, key, value, replace=True):
         """
+        Inserts key:value, replaces value of the existing key if replace, otherwise adds duplicate.
+        Full nodes are split on the way down, so the leaf always has room.
         """
+        assert key is not None, "Key must be non None."
+        assert self._codec.accepts(key), "Invalid key, too long."
         if not self._root:
-            self._root = self.create_leaf()
+            self.set_root(self.create_leaf())
             self.save_tree(self._root)
+            self.save_header()
+        value = self.store_value(value)
         root = self._root
-        if root.full():
+        if self._codec.is_full(root, self._height == 0):
             new_root = self.create_branch()
-            new_root.set_kid(root, 0)
-            self._root = new_root
+            new_root.set_kid_id(root.id, 0)
+            self.set_root(new_root)
+            if self._height == 0:
+                self.split_leaf(new_root, root)
+            else:
+                self.split_branch(new_root, root)
             self._height += 1
-            self.split_branch(new_root, root)
-            self.insert_non_full(new_root, key, value)
-        else:
-            self.insert_non_full(root, key, value)
+            self.save_header()
+        self.insert_non_full(self._root, key, value, replace=replace)
 
-    def insert_non_full(self, tree, key, value, level=0):
+    def insert_non_full(self, tree, key, value, level=0, replace=True):
         """
         """
-        leaf = level == self._height  # self.kids is empty
+        leaf = level == self._height
         if leaf:
-            tree.insert_key_value(key, value)
+            position = tree.search_key(key, hi=tree.keys_count - 1) if replace else -1
+            if position >= 0:
+                self.free_value(tree.values[position])
+                tree.set_value(value, position)
+            else:
+                tree.insert_key_value(key, value)
             self.save_tree(tree)
         else:
-            position = tree.search_key(key) + 1
-            kid = self.load_tree(tree.kids[position].id, leaf)
-            if tree.full():
-                if leaf:
+            position = tree.search_key_position(key, hi=tree.keys_count)
+            kid_leaf = level + 1 == self._height
+            kid = self.load_tree(tree.kid_ids[position], leaf=kid_leaf, level=level + 1)
+            if self._codec.is_full(kid, kid_leaf):
+                if kid_leaf:
                     _, kid, new_kid = self.split_leaf(tree, kid)
                 else:
                     _, kid, new_kid = self.split_branch(tree, kid)
                 cmp = Text.compare(key, tree.keys[position])
-                if cmp > 0:  # which of the kids to proceed with - old or new one
-                    tree = new_kid
-                else:
-                    tree = kid
-            self.insert_non_full(tree, key, value, level + 1)
+                if cmp >= 0:  # which of the kids to proceed with - old or new one, equal keys go right
+                    kid = new_kid
+            self.insert_non_full(kid, key, value, level + 1, replace=replace)
 
     def split_branch(self, papa, kid):
         """
+        The key at the split position is pushed up.
         """
-        keys_mid = int(math.floor(self._fanout / 2))
-        kids_mid = int(math.floor((self._fanout + 1) / 2))
+        mid = self._codec.get_split_position(kid, leaf=False)
+        count = kid.keys_count
+        keys = kid.keys[:count]
+        kid_ids = kid.kid_ids[:count + 1]
         new_kid = self.create_branch()
-        for i, k in enumerate(range(keys_mid + 1, self._fanout)):  # +1 push up mid-key
-            new_kid.set_key(kid.keys[k], i)
-        for i, k in enumerate(range(kids_mid, self._fanout + 1)):
-            new_kid.set_kid(kid.kids[k], i)
-        mid_key = kid.keys[keys_mid]
-        mid_key_position = papa.search_key_position(mid_key)
-        for k in range(keys_mid, self._fanout):
-            kid.remove_key(k)
-        for k in range(kids_mid, self._fanout + 1):
-            kid.remove_kid(k)
-        papa.insert_key(mid_key, mid_key_position)
-        papa.shift_kids_right(mid_key_position)
-        papa.set_kid(new_kid, mid_key_position)
+        new_kid.assign(keys[mid + 1:], kid_ids[mid + 1:])
+        kid.assign(keys[:mid], kid_ids[:mid + 1])
+        position = papa.kid_ids.index(kid.id)
+        self.insert_separator(papa, keys[mid], position, new_kid)
         self.save_tree(papa)
         self.save_tree(kid)
         self.save_tree(new_kid)
@@ -775,77 +1172,493 @@ class Index(Entity):
 
     def split_leaf(self, papa, kid):
         """
+        Keys from the split position go to the new leaf, the separator is copied up.
         """
-        keys_mid = int(math.floor(self._fanout / 2))
+        mid = self._codec.get_split_position(kid, leaf=True)
+        count = kid.keys_count
+        keys = kid.keys[:count]
+        values = kid.values[:count]
         new_kid = self.create_leaf()
-        for i, k in enumerate(range(keys_mid, self._fanout)):  # copy up mid-key, preserve mid-key
-            new_kid.set_key(kid.keys[k], i)
-            new_kid.set_value(kid.values[k], i)
-        mid_key = kid.keys[keys_mid]
-        mid_key_position = papa.search_key_position(mid_key)
-        for k in range(keys_mid, self._fanout):
-            kid.remove_key(k)
-            kid.remove_value(k)
-        papa.insert_key(mid_key, mid_key_position)
-        papa.shift_kids_right(mid_key_position)
-        papa.set_kid(new_kid, mid_key_position)
-        if kid.next:
+        new_kid.assign(keys[mid:], values[mid:])
+        kid.assign(keys[:mid], values[:mid])
+        position = papa.kid_ids.index(kid.id)
+        self.insert_separator(papa, self.get_separator(keys[mid - 1], keys[mid]), position, new_kid)
+        if kid.next_id:
             next_leaf = self.load_tree(kid.next_id, leaf=True)
             next_leaf.prev_id = new_kid.id
             self.save_tree(next_leaf)
-        new_kid.prev = kid
         new_kid.prev_id = kid.id
-        new_kid.next = kid.next
         new_kid.next_id = kid.next_id
-        kid.next = new_kid
         kid.next_id = new_kid.id
         self.save_tree(papa)
         self.save_tree(kid)
         self.save_tree(new_kid)
         return papa, kid, new_kid
 
-    def load(self, kvps):
+    def get_separator(self, lhs, rhs):
+        """
+        Returns separator of adjacent leaves, lhs is the last key of the left leaf and rhs is the first key
+        of the right one. Slotted pages use the shortest prefix of rhs greater than lhs (suffix truncation),
+        fixed size slots gain nothing from it and keep rhs.
+        """
+        if not self._page_size:
+            return rhs
+        lhs_key = Text.get_sort_key(lhs)
+        rhs_key = Text.get_sort_key(rhs)
+        if lhs_key >= rhs_key:  # duplicates
+            return rhs
+        lhs = Text.get_normalized(lhs)
+        normalized = Text.get_normalized(rhs)
+        length = len(os.path.commonprefix([lhs, normalized]))
+        for k in range(length + 1, len(normalized)):
+            separator = normalized[:k]
+            if lhs_key < Text.get_sort_key(separator) <= rhs_key:
+                return separator
+        return rhs
+
+    @staticmethod
+    def insert_separator(papa, key, position, new_kid):
+        """
+        Inserts the separator key at position and the new kid to its right (after the split kid).
         """
-        Bulk insert.
+        count = papa.keys_count
+        for k in range(min(count, papa.fanout - 1), position, -1):
+            papa.set_key(papa.keys[k - 1], k)
+        papa.set_key(key, position)
+        papa.shift_kids_right(position)
+        papa.set_kid_id(new_kid.id, position + 1)
+
+    def load(self, kvps, fill_factor=FillFactor, presorted=False, run_size=RunSize, directory=None):
         """
-        pass
+        Bulk insert into the empty index, bottom-up: leaves are packed to the fill factor
+        in key order, then branch levels are built over them level by level.
+        Every node (overflow page) is written exactly once, blocks of WriteBlockSize nodes at once,
+        the node cache is bypassed. Ids come from the free list first, with the empty one ids are ascending
+        and so are offsets of writes: a leaf is followed by overflow pages of its values.
+        kvps - iterable of (key, value), unsorted input goes through sort_kvps (external sort),
+        presorted input is streamed as is, duplicates keep their input order.
+        """
+        assert not self._root, "Index must be empty."
+        assert 0 < fill_factor <= 1, "Invalid fill factor."
+        if not presorted:
+            kvps = Index.sort_kvps(kvps, run_size, directory)
+
+        def get_weight(kvp):
+            key, value = kvp
+            if not self._codec.is_inline(value):
+                value = Index.Overflow(0, 0)
+            return self._codec.get_entry_weight(key, value, leaf=True)
+
+        def write_leaf():
+            writer.write(leaf)
+            for id, buffer in pages:
+                writer.write_page(id, buffer)
+            pages.clear()
+
+        writer = Index.BlockWriter(self)
+        # leaves, a leaf is written when the next one is known (next_id), then overflow pages of its values
+        nodes = list()  # (separator, id) of the current level
+        leaf = None
+        pages = list()  # (id, buffer) of overflow pages of the current leaf
+        size, min_size, capacity = self._codec.get_load_budget(fill_factor, leaf=True)
+        for chunk in Index.pack(kvps, size, min_size, capacity, get_weight):
+            assert all(self._codec.accepts(key) for key, _ in chunk), "Invalid key, too long."
+            new_leaf = Index.BTreeLeaf(self.allocate_id(persist=False), self._fanout)
+            if leaf is not None:
+                leaf.next_id = new_leaf.id
+                new_leaf.prev_id = leaf.id
+                write_leaf()
+            new_leaf.assign([key for key, _ in chunk], [self.store_value(value, pages) for _, value in chunk])
+            separator = new_leaf.keys[0]
+            if leaf is not None:
+                assert leaf.sort_keys[leaf.keys_count - 1] <= new_leaf.sort_keys[0], "Invalid order of keys."
+                separator = self.get_separator(leaf.keys[leaf.keys_count - 1], separator)
+            leaf = new_leaf
+            nodes.append((separator, leaf.id))
+            self._number_of_leaves += 1
+        if leaf is None:
+            return
+        write_leaf()
+        root = leaf
+        # branches
+        size, min_size, capacity = self._codec.get_load_budget(fill_factor, leaf=False)
+        while len(nodes) > 1:
+            level = list()
+            for chunk in Index.pack(nodes,
+                                    size,
+                                    min_size,
+                                    capacity,
+                                    lambda node: self._codec.get_entry_weight(node[0], None, leaf=False)):
+                root = Index.BTreeBranch(self.allocate_id(persist=False), self._fanout)
+                root.assign([key for key, _ in chunk[1:]], [id for _, id in chunk])
+                writer.write(root)
+                level.append((chunk[0][0], root.id))
+                self._number_of_branches += 1
+            nodes = level
+            self._height += 1
+        writer.flush()
+        self.set_root(root)
+        self.save_header()
+
+    @staticmethod
+    def pack(items, size, min_size, capacity, weight=None):
+        """
+        Splits the stream into chunks of the size (total weight of items, 1 per item by default),
+        the last chunk below min_size is merged with the previous one or both are split evenly
+        if they do not fit the capacity.
+        """
+        previous, previous_total = None, 0
+        chunk, total = list(), 0
+        for item in items:
+            item_weight = 1 if weight is None else weight(item)
+            if chunk and total + item_weight > size:
+                if previous is not None:
+                    yield previous
+                previous, previous_total = chunk, total
+                chunk, total = list(), 0
+            chunk.append(item)
+            total += item_weight
+        if chunk and previous is not None and total < min_size:
+            chunk = previous + chunk
+            previous = None
+            if previous_total + total > capacity:
+                if weight is None:
+                    middle = len(chunk) // 2
+                else:
+                    middle, half = 0, (previous_total + total) / 2
+                    while half > 0:
+                        half -= weight(chunk[middle])
+                        middle += 1
+                    middle = max(1, min(middle, len(chunk) - 1))
+                previous, chunk = chunk[:middle], chunk[middle:]
+        if previous is not None:
+            yield previous
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def sort_kvps(kvps, run_size=RunSize, directory=None):
+        """
+        External merge sort of (key, value) pairs by binary collation keys (see Text.get_sort_key),
+        stable. Runs of run_size pairs are sorted in memory and spilled to temporary files
+        (see tempfile), then merged lazily.
+        """
+        def get_sort_key(kvp):
+            return Text.get_sort_key(kvp[0])
+
+        def read_run(path):
+            with open(path, 'rb') as stream:
+                while True:
+                    try:
+                        yield from pickle.load(stream)
+                    except EOFError:
+                        break
+
+        assert run_size > 0, "Invalid run size."
+        with tempfile.TemporaryDirectory(prefix='index-', dir=directory) as working_directory:
+            runs = list()
+            run = list()
+            for kvp in kvps:
+                run.append(kvp)
+                if len(run) == run_size:
+                    run.sort(key=get_sort_key)
+                    runs.append(os.path.join(working_directory, f'run-{len(runs)}'))
+                    with open(runs[-1], 'wb') as stream:
+                        for k in range(0, len(run), Index.WriteBlockSize):
+                            pickle.dump(run[k:k + Index.WriteBlockSize], stream, protocol=pickle.HIGHEST_PROTOCOL)
+                    run = list()
+            run.sort(key=get_sort_key)
+            if not runs:
+                yield from run
+                return
+            yield from heapq.merge(*(read_run(path) for path in runs), run, key=get_sort_key)
+
+    class BlockWriter(Base):
+        """
+        Coalesces writes of nodes with consecutive ids into sequential block writes.
+        """
+
+        def __init__(self, index):
+            """
+            """
+            super().__init__()
+            self._index = index
+            self._offset = 0
+            self._buffer = bytearray()
+            self._count = 0
+
+        def __repr__(self):
+            """
+            """
+            return f"{type(self).__name__}:{self._offset}:{self._count}"
+
+        __str__ = __repr__
+
+        def write(self, tree):
+            """
+            """
+            self.write_page(tree.id, tree.serialize(self._index.codec))
+
+        def write_page(self, id, buffer):
+            """
+            """
+            offset = self._index.calculate_offset(id)
+            if self._count and offset != self._offset + len(self._buffer):
+                self.flush()
+            if not self._count:
+                self._offset = offset
+            self._buffer.extend(buffer)
+            self._count += 1
+            if self._count == Index.WriteBlockSize:
+                self.flush()
+
+        def flush(self):
+            """
+            """
+            if self._count:
+                self._index.repository.write(self._offset, self._buffer)
+            self._buffer = bytearray()
+            self._count = 0
 
     def delete(self, key):
         """
+        Deletes the key (one of duplicates), returns True if the key was found.
+        Underflown nodes borrow from a sibling or are merged with it bottom-up,
+        freed nodes go to the free list and their slots are reused by create_branch/create_leaf.
+        """
+        assert key is not None, "Key must be non None."
+        if not self._root:
+            return False
+        found = self.find_path(Text.get_sort_key(key))
+        if found is None:
+            return False
+        path, leaf, position = found
+        count = leaf.keys_count
+        self.free_value(leaf.values[position])
+        leaf.assign(leaf.keys[:position] + leaf.keys[position + 1:count],
+                    leaf.values[:position] + leaf.values[position + 1:count])
+        self.rebalance(path, leaf)
+        return True
+
+    def find_path(self, sort_key):
+        """
+        Returns (path, leaf, position) of the key, path is list of (branch, kid position) from the root,
+        or None if the key is not found. Duplicates might span several subtrees, so all kids
+        whose ranges cover the key are tried, the leftmost first: the leftmost copy is deleted,
+        so the last one stays in the subtree point search descends to (bisect_right) and separators
+        equal to the key remain valid.
+        """
+        def find(tree, level):
+            count = tree.keys_count
+            if level == self._height:
+                position = bisect.bisect_left(tree.sort_keys, sort_key, 0, count)
+                if position < count and tree.sort_keys[position] == sort_key:
+                    return tree, position
+                return None
+            lo = bisect.bisect_left(tree.sort_keys, sort_key, 0, count)
+            hi = bisect.bisect_right(tree.sort_keys, sort_key, 0, count)
+            for position in range(lo, hi + 1):
+                path.append((tree, position))
+                result = find(self.load_tree(tree.kid_ids[position], leaf=level + 1 == self._height, level=level + 1),
+                              level + 1)
+                if result is not None:
+                    return result
+                path.pop()
+            return None
+
+        path = list()
+        found = find(self._root, 0)
+        return None if found is None else (path, *found)
+
+    def get_min_keys_count(self, leaf):
+        """
+        Minimal occupancy of non-root nodes of fixed size slots, see NodeCodec.
+        """
+        return self._fanout // 2 if leaf else (self._fanout - 1) // 2
+
+    def rebalance(self, path, tree):
+        """
+        Restores occupancy of the node and its ancestors after deletion, saves modified nodes.
+        Borrowing and merging are tried in turn, slotted pages (variable-length entries) might reject both,
+        then the underflown node is kept as is.
         """
-        pass
+        while path:
+            papa, position = path.pop()
+            leaf = isinstance(tree, Index.BTreeLeaf)
+            if not self._codec.is_underflown(tree, leaf):
+                self.save_tree(tree)
+                return
+            level = len(path) + 1
+            left = self.load_tree(papa.kid_ids[position - 1], leaf=leaf, level=level) if position > 0 else None
+            if left is not None and self.borrow_left(papa, position, left, tree):
+                return
+            right = None
+            if position < papa.keys_count:
+                right = self.load_tree(papa.kid_ids[position + 1], leaf=leaf, level=level)
+                if self.borrow_right(papa, position, tree, right):
+                    return
+            if not (left is not None and self.merge(papa, position - 1, left, tree) or
+                    right is not None and self.merge(papa, position, tree, right)):
+                self.save_tree(tree)
+                return
+            tree = papa
+        # the root
+        if tree.keys_count > 0:
+            self.save_tree(tree)
+        elif self._height == 0:
+            self.set_root(None)
+            self.free_tree(tree)
+        else:
+            self.set_root(self.load_tree(tree.kid_ids[0], leaf=self._height == 1, level=0))
+            self._height -= 1
+            self.free_tree(tree)
+
+    @staticmethod
+    def get_entries(tree):
+        """
+        Returns copy of (keys, values) of the leaf or (keys, kid ids) of the branch, see assign.
+        """
+        count = tree.keys_count
+        if isinstance(tree, Index.BTreeLeaf):
+            return tree.keys[:count], tree.values[:count]
+        return tree.keys[:count], tree.kid_ids[:count + 1]
+
+    def commit(self, nodes, entries):
+        """
+        Saves the modified nodes if they fit and the lender (the first one) is not underflown,
+        otherwise restores their entries. Returns True if saved.
+        """
+        valid = (not self._codec.is_underflown(nodes[0], isinstance(nodes[0], Index.BTreeLeaf)) and
+                 all(self._codec.fits(node, isinstance(node, Index.BTreeLeaf)) for node in nodes))
+        for node, (keys, items) in zip(nodes, entries):
+            if valid:
+                self.save_tree(node)
+            else:
+                node.assign(keys, items)
+        return valid
+
+    def borrow_left(self, papa, position, left, tree):
+        """
+        Moves the last entry of the left sibling to the node, the separator is updated.
+        Returns False if the sibling cannot lend.
+        """
+        entries = [Index.get_entries(node) for node in (left, tree, papa)]
+        left_count = left.keys_count
+        if left_count == 0:
+            return False
+        if isinstance(tree, Index.BTreeLeaf):
+            tree.assign([left.keys[left_count - 1]] + tree.keys[:tree.keys_count],
+                        [left.values[left_count - 1]] + tree.values[:tree.keys_count])
+            left.assign(left.keys[:left_count - 1], left.values[:left_count - 1])
+            if left.keys_count:
+                papa.set_key(self.get_separator(left.keys[left.keys_count - 1], tree.keys[0]), position - 1)
+            else:
+                papa.set_key(tree.keys[0], position - 1)
+        else:
+            tree.assign([papa.keys[position - 1]] + tree.keys[:tree.keys_count],
+                        [left.kid_ids[left_count]] + tree.kid_ids[:tree.keys_count + 1])
+            papa.set_key(left.keys[left_count - 1], position - 1)
+            left.assign(left.keys[:left_count - 1], left.kid_ids[:left_count])
+        return self.commit([left, tree, papa], entries)
+
+    def borrow_right(self, papa, position, tree, right):
+        """
+        Moves the first entry of the right sibling to the node, the separator is updated.
+        Returns False if the sibling cannot lend.
+        """
+        entries = [Index.get_entries(node) for node in (right, tree, papa)]
+        count = tree.keys_count
+        right_count = right.keys_count
+        if right_count == 0:
+            return False
+        if isinstance(tree, Index.BTreeLeaf):
+            tree.assign(tree.keys[:count] + [right.keys[0]], tree.values[:count] + [right.values[0]])
+            right.assign(right.keys[1:right_count], right.values[1:right_count])
+            if right.keys_count:
+                papa.set_key(self.get_separator(tree.keys[count], right.keys[0]), position)
+        else:
+            tree.assign(tree.keys[:count] + [papa.keys[position]],
+                        tree.kid_ids[:count + 1] + [right.kid_ids[0]])
+            papa.set_key(right.keys[0], position)
+            right.assign(right.keys[1:right_count], right.kid_ids[1:right_count + 1])
+        return self.commit([right, tree, papa], entries)
+
+    def merge(self, papa, position, left, right):
+        """
+        Merges the right node into the left one, the separator at position and the right kid
+        are removed from papa (saved by the caller), the right node is freed.
+        Returns False if the merged node does not fit.
+        """
+        keys, items = Index.get_entries(left)
+        left_count = left.keys_count
+        right_count = right.keys_count
+        leaf = isinstance(left, Index.BTreeLeaf)
+        if leaf:
+            left.assign(left.keys[:left_count] + right.keys[:right_count],
+                        left.values[:left_count] + right.values[:right_count])
+        else:
+            left.assign(left.keys[:left_count] + [papa.keys[position]] + right.keys[:right_count],
+                        left.kid_ids[:left_count + 1] + right.kid_ids[:right_count + 1])
+        if not self._codec.fits(left, leaf):
+            left.assign(keys, items)
+            return False
+        if leaf:
+            left.next_id = right.next_id
+            if right.next_id:
+                next_leaf = self.load_tree(right.next_id, leaf=True)
+                next_leaf.prev_id = left.id
+                self.save_tree(next_leaf)
+        count = papa.keys_count
+        papa.assign(papa.keys[:position] + papa.keys[position + 1:count],
+                    papa.kid_ids[:position + 1] + papa.kid_ids[position + 2:count + 1])
+        self.save_tree(left)
+        self.free_tree(right)
+        return True
 
     def save_tree(self, tree):
         """
+        Writes the node through the node cache.
         """
-        buffer = tree.serialize()
+        buffer = tree.serialize(self._codec)
         offset = self.calculate_offset(tree.id)
         self._repository.write(offset, buffer)
+        if not self._cache.pinned(tree.id):
+            self._cache.put(tree.id, tree)
+
+    def load_tree(self, id, leaf=False, level=None):
+        """
+        Returns the node from the node cache or reads and deserializes it,
+        nodes of the upper levels (level < PinnedLevels) are pinned.
+        """
+        pin = level is not None and level < Index.PinnedLevels
+        result = self._cache.get(id)
+        if result is not None:
+            if pin and not self._cache.pinned(id):
+                self._cache.pin(id, result)
+            return result
+        result = self.read_tree(id, leaf)
+        if pin:
+            self._cache.pin(id, result)
+        else:
+            self._cache.put(id, result)
+        return result
 
-    def load_tree(self, id, leaf=False):
+    def read_tree(self, id, leaf=False):
         """
+        Reads and deserializes the node bypassing the node cache.
         """
         offset = self.calculate_offset(id)
+        buffer = self._repository.read(offset, self._codec.size)
         if leaf:
-            size = Index.BTreeLeaf.calculate_size(self._fanout)
-            buffer = self._repository.read(offset, size)
-            header, keys_count, keys, values, prev_id, next_id = Index.BTreeLeaf.deserialize(buffer)
-            result = Index.BTreeLeaf(id, Index.M)
-            for k, key in enumerate(keys):
-                result.set_key(key, k)
-            for k, value in enumerate(values):
-                result.set_value(value, k)
+            header, keys_count, keys, values, prev_id, next_id = Index.BTreeLeaf.deserialize(buffer, self._codec)
+            result = Index.BTreeLeaf(id, self._fanout)
+            result.assign(keys, values)
             result.prev_id = prev_id
             result.next_id = next_id
         else:
-            size = Index.BTreeBranch.calculate_size(self._fanout)
-            buffer = self._repository.read(offset, size)
-            header, keys_count, keys, kids = Index.BTreeBranch.deserialize(buffer)
-            result = Index.BTreeBranch(id, Index.M)
-            for k, key in enumerate(keys):
-                result.set_key(key, k)
-            for k, kid in enumerate(kids):
-                result.kid_ids[k] = kid
+            header, keys_count, keys, kids = Index.BTreeBranch.deserialize(buffer, self._codec)
+            result = Index.BTreeBranch(id, self._fanout)
+            result.assign(keys, kids[:keys_count + 1])
         return result
 
     @lru_cache
@@ -853,7 +1666,7 @@ class Index(Entity):
         """
         """
         offset = Index.HeaderSize
-        offset += id * Index.BTreeBranch.calculate_size(self._fanout)
+        offset += id * self._codec.size
         return offset
 
     @staticmethod
@@ -0,0 +1,61 @@
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Memory-mapped Repository """
+import mmap
+import os
+from graph.indexing.repository import Repository
+from graph.indexing.file_repository import FileRepository
+from graph.indexing.readonly_mmap_repository import MmapReadOnlyRepository
+
+
+class MmapRepository(MmapReadOnlyRepository, Repository):
+    """
+    Repository over a memory-mapped file, the file is created if missing and grows in extents
+    of whole pages, growing remaps the file, slices returned by read before keep the old mapping.
+    """
+    def __init__(self, path, page_size, extent_size=FileRepository.ExtentSize):
+        """
+        """
+        super().__init__(path, page_size)
+        self._extent_size = FileRepository.calculate_extent_size(page_size, extent_size)
+
+    @property
+    def extent_size(self):
+        """
+        """
+        return self._extent_size
+
+    def open(self):
+        """
+        """
+        return os.open(self._path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+
+    def map(self, access=mmap.ACCESS_WRITE):
+        """
+        """
+        super().map(access)
+
+    def grow(self, size):
+        """
+        Extends the file to the extent boundary covering the size and remaps it.
+        """
+        size = (size + self._extent_size - 1) // self._extent_size * self._extent_size
+        self.unmap()
+        os.ftruncate(self._fd, size)
+        self._size = size
+        self.map()
+
+    def flush(self):
+        """
+        """
+        if self._map is not None:
+            self._map.flush()
+
+    def write(self, offset, buffer):
+        """
+        Writes specific buffer at the offset.
+        """
+        if offset + len(buffer) > self._size:
+            self.grow(offset + len(buffer))
+        self._view[offset:offset + len(buffer)] = buffer
@@ -0,0 +1,118 @@
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Node cache """
+from collections import OrderedDict
+from graph.core.base import Base
+
+
+class NodeCache(Base):
+    """
+    Bounded LRU cache of deserialized nodes keyed by node id.
+    Pinned nodes (e.g. the root and upper levels of a tree) are never evicted
+    and do not count against the capacity.
+    """
+    def __init__(self, capacity):
+        """
+        """
+        assert capacity >= 0, "Capacity must be non negative."
+        super().__init__()
+        self._capacity = capacity
+        self._nodes = OrderedDict()  # unpinned nodes, the least recently used first
+        self._pinned = dict()  # pinned nodes
+        self._hits = 0
+        self._misses = 0
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{len(self._nodes)}:{len(self._pinned)}:{self._capacity}"
+
+    __str__ = __repr__
+
+    def __len__(self):
+        """
+        """
+        return len(self._nodes) + len(self._pinned)
+
+    def __contains__(self, id):
+        """
+        """
+        return id in self._pinned or id in self._nodes
+
+    @property
+    def capacity(self):
+        """
+        """
+        return self._capacity
+
+    @property
+    def hits(self):
+        """
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        """
+        return self._misses
+
+    def get(self, id):
+        """
+        Returns cached node or None, the node becomes the most recently used one.
+        """
+        result = self._pinned.get(id)
+        if result is None:
+            result = self._nodes.get(id)
+            if result is not None:
+                self._nodes.move_to_end(id)
+        if result is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return result
+
+    def put(self, id, node):
+        """
+        Adds or replaces the node, evicts the least recently used unpinned nodes over capacity.
+        """
+        if id in self._pinned:
+            self._pinned[id] = node
+            return
+        self._nodes[id] = node
+        self._nodes.move_to_end(id)
+        while len(self._nodes) > self._capacity:
+            self._nodes.popitem(last=False)
+
+    def pin(self, id, node):
+        """
+        Adds the node and keeps it until unpinned.
+        """
+        self._nodes.pop(id, None)
+        self._pinned[id] = node
+
+    def unpin(self, id):
+        """
+        Returns the node back to LRU order, it is evicted as usual.
+        """
+        node = self._pinned.pop(id, None)
+        if node is not None:
+            self.put(id, node)
+
+    def pinned(self, id):
+        """
+        """
+        return id in self._pinned
+
+    def invalidate(self, id):
+        """
+        """
+        self._pinned.pop(id, None)
+        self._nodes.pop(id, None)
+
+    def clear(self):
+        """
+        """
+        self._nodes.clear()
+        self._pinned.clear()
@@ -0,0 +1,213 @@
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" B-Tree node codec """
+import struct
+from graph.core.base import Base
+
+
+class NodeCodec(Base):
+    """
+    Precompiled struct.Struct codecs of B-tree nodes for (fanout, key size, value size), see Index.
+      Branch: Header | Fanout | KeysCount | P(0) | ... | P(fanout) | K(0) | ... | K(fanout - 1)
+      Leaf:   Header | Prev | Next | Fanout | KeysCount | K(0) | V(0) | ... | K(fanout - 1) | V(fanout - 1)
+    Header, keys and values are fixed size fields, length followed by utf-8 bytes padded with zeros.
+    A node is packed with one call, unpacking is one call for the fixed part (counts, ids and lengths)
+    plus decoding of keys and values straight from memoryview slices of the buffer (no copies).
+    """
+    Endianness = '<'
+    Counts = struct.Struct(f"{Endianness}2I")  # fanout and keys count, the tail of both headers
+
+    def __init__(self, fanout, header, header_size, key_size, value_size, size):
+        """
+        size - node slot size, packed nodes are padded to it.
+        """
+        super().__init__()
+        self._fanout = fanout
+        self._header = header
+        self._header_size = header_size
+        self._key_size = key_size
+        self._value_size = value_size
+        self._size = size
+        e = NodeCodec.Endianness
+        branch_header = f"I{header_size - 12}s2I"
+        leaf_header = f"I{header_size - 20}s4I"
+        key = f"I{key_size - 4}s"
+        value = f"I{value_size - 4}s"
+        self._branch = struct.Struct(f"{e}{branch_header}{fanout + 1}I{key * fanout}")
+        self._branch_lengths = struct.Struct(f"{e}{branch_header}{fanout + 1}I{f'I{key_size - 4}x' * fanout}")
+        self._leaf = struct.Struct(f"{e}{leaf_header}{(key + value) * fanout}")
+        self._leaf_lengths = struct.Struct(f"{e}{leaf_header}{f'I{key_size - 4}xI{value_size - 4}x' * fanout}")
+        assert self._branch.size == header_size + (fanout + 1) * 4 + fanout * key_size, "Invalid branch codec."
+        assert self._leaf.size == header_size + fanout * (key_size + value_size), "Invalid leaf codec."
+        assert max(self._branch.size, self._leaf.size) <= size, "Invalid size."
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._fanout}:{self._key_size}:{self._value_size}"
+
+    __str__ = __repr__
+
+    @property
+    def header(self):
+        """
+        """
+        return self._header
+
+    @property
+    def fanout(self):
+        """
+        """
+        return self._fanout
+
+    @property
+    def size(self):
+        """
+        """
+        return self._size
+
+    def accepts(self, key):
+        """
+        """
+        return len(key.encode('utf-8')) <= self._key_size - 4
+
+    def is_inline(self, value):
+        """
+        Values are always inline, too long ones are rejected by pack_leaf.
+        """
+        return True
+
+    def get_entry_weight(self, key, value, leaf):
+        """
+        Nodes are measured in entries.
+        """
+        return 1
+
+    def get_min_keys_count(self, leaf):
+        """
+        Minimal occupancy of non-root nodes, halves of splits, see get_split_position.
+        """
+        return self._fanout // 2 if leaf else (self._fanout - 1) // 2
+
+    def is_full(self, tree, leaf):
+        """
+        """
+        return tree.keys_count == self._fanout
+
+    def fits(self, tree, leaf):
+        """
+        """
+        return tree.keys_count <= self._fanout
+
+    def is_underflown(self, tree, leaf):
+        """
+        """
+        return tree.keys_count < self.get_min_keys_count(leaf)
+
+    def get_split_position(self, tree, leaf):
+        """
+        Leaves keep keys before the position, branches push the key at the position up.
+        """
+        return self._fanout // 2
+
+    def get_load_budget(self, fill_factor, leaf):
+        """
+        Returns (chunk size, min chunk size, max chunk size) in entries (kids of branches) for bulk load.
+        """
+        capacity = self._fanout if leaf else self._fanout + 1
+        min_size = max(1, self.get_min_keys_count(leaf)) if leaf else self.get_min_keys_count(leaf) + 1
+        return max(min_size, int(capacity * fill_factor)), min_size, capacity
+
+    @staticmethod
+    def get_counts(buffer, header_size):
+        """
+        Returns (fanout, keys count) of a serialized branch or leaf.
+        """
+        return NodeCodec.Counts.unpack_from(buffer, header_size - NodeCodec.Counts.size)
+
+    @staticmethod
+    def encode_strings(strings, size):
+        """
+        Returns flat list of (length, bytes) of the strings, None is the empty string.
+        """
+        result = list()
+        for string in strings:
+            string = string.encode('utf-8') if string else b''
+            assert len(string) <= size - 4, "Invalid string, too long."
+            result.extend((len(string), string))
+        return result
+
+    @staticmethod
+    def decode_strings(view, offset, stride, lengths):
+        """
+        Decodes strings laid out every stride bytes from the offset, zero-copy slices of the view.
+        """
+        result = list()
+        for length in lengths:
+            result.append(str(view[offset + 4:offset + 4 + length], 'utf-8').strip())
+            offset += stride
+        return result
+
+    def pack_branch(self, keys_count, kid_ids, keys):
+        """
+        """
+        buffer = bytearray(self._size)
+        self._branch.pack_into(buffer,
+                               0,
+                               len(self._header),
+                               self._header,
+                               self._fanout,
+                               keys_count,
+                               *kid_ids,
+                               *NodeCodec.encode_strings(keys, self._key_size))
+        return buffer
+
+    def unpack_branch(self, buffer):
+        """
+        Returns (header, keys count, keys, kid ids).
+        """
+        header_length, header, _, keys_count, *tail = self._branch_lengths.unpack_from(buffer)
+        kids_count = self._fanout + 1
+        with memoryview(buffer) as view:
+            keys = NodeCodec.decode_strings(view,
+                                            self._header_size + 4 * kids_count,
+                                            self._key_size,
+                                            tail[kids_count:kids_count + keys_count])
+        return header[:header_length], keys_count, keys, tail[:kids_count]
+
+    def pack_leaf(self, prev_id, next_id, keys_count, keys, values):
+        """
+        """
+        buffer = bytearray(self._size)
+        kvps = list()
+        for key, value in zip(keys, values):
+            key = key.encode('utf-8') if key else b''
+            value = value.encode('utf-8') if value else b''
+            assert len(key) <= self._key_size - 4, "Invalid key, too long."
+            assert len(value) <= self._value_size - 4, "Invalid value, too long."
+            kvps.extend((len(key), key, len(value), value))
+        self._leaf.pack_into(buffer,
+                             0,
+                             len(self._header),
+                             self._header,
+                             prev_id,
+                             next_id,
+                             self._fanout,
+                             keys_count,
+                             *kvps)
+        return buffer
+
+    def unpack_leaf(self, buffer):
+        """
+        Returns (header, keys count, keys, values, prev id, next id).
+        """
+        header_length, header, prev_id, next_id, _, keys_count, *lengths = self._leaf_lengths.unpack_from(buffer)
+        stride = self._key_size + self._value_size
+        with memoryview(buffer) as view:
+            keys = NodeCodec.decode_strings(view, self._header_size, stride, lengths[0:2 * keys_count:2])
+            values = NodeCodec.decode_strings(view,
+                                              self._header_size + self._key_size,
+                                              stride,
+                                              lengths[1:2 * keys_count:2])
+        return header[:header_length], keys_count, keys, values, prev_id, next_id
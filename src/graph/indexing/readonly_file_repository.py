@@ -0,0 +1,75 @@
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" File ReadOnly Repository """
+import os
+import threading
+from graph.indexing.readonly_repository import ReadOnlyRepository
+
+
+class FileReadOnlyRepository(ReadOnlyRepository):
+    """
+    Repository over a file, reads are positional (os.pread), so concurrent readers
+    (e.g. cursor read-ahead) do not share the file position.
+    """
+    def __init__(self, path, page_size):
+        """
+        """
+        super().__init__(page_size)
+        self._path = path
+        self._fd = self.open()
+        self._size = os.fstat(self._fd).st_size
+        self._lock = threading.Lock()  # guards seek + read where os.pread is not available
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._path}:{self._size}"
+
+    __str__ = __repr__
+
+    def __enter__(self):
+        """
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        """
+        self.close()
+
+    @property
+    def path(self):
+        """
+        """
+        return self._path
+
+    @property
+    def size(self):
+        """
+        """
+        return self._size
+
+    def open(self):
+        """
+        Returns file descriptor.
+        """
+        return os.open(self._path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+
+    def close(self):
+        """
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def read(self, offset, size):
+        """
+        Reads specific number of bytes at the offset.
+        """
+        assert offset + size <= self._size
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, size, offset)
+        with self._lock:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, size)
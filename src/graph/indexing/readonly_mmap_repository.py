@@ -0,0 +1,55 @@
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Memory-mapped ReadOnly Repository """
+import mmap
+from graph.indexing.readonly_file_repository import FileReadOnlyRepository
+
+
+class MmapReadOnlyRepository(FileReadOnlyRepository):
+    """
+    Repository over a memory-mapped file, reads return memoryview slices of the mapping (no copies),
+    pages are loaded by the OS on access, so opening does not read the file.
+    """
+    def __init__(self, path, page_size):
+        """
+        """
+        super().__init__(path, page_size)
+        self._map = None
+        self._view = None
+        self.map()
+
+    def map(self, access=mmap.ACCESS_READ):
+        """
+        Maps the whole file, empty files are not mapped.
+        """
+        if self._size > 0:
+            self._map = mmap.mmap(self._fd, self._size, access=access)
+            self._view = memoryview(self._map)
+
+    def unmap(self):
+        """
+        The mapping is closed if no slices are alive, otherwise it is unmapped once they are released.
+        """
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+            self._map = None
+
+    def close(self):
+        """
+        """
+        self.unmap()
+        super().close()
+
+    def read(self, offset, size):
+        """
+        Returns memoryview of specific number of bytes at the offset.
+        """
+        assert offset + size <= self._size
+        return self._view[offset:offset + size]
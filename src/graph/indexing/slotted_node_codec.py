@@ -0,0 +1,314 @@
+# -*- encoding: utf-8 -*-
+# UI Lab Inc. Arthur Amshukov
+#
+""" Slotted page B-Tree node codec """
+import os
+import struct
+from collections import namedtuple
+from functools import lru_cache
+from graph.core.base import Base
+
+
+class SlottedNodeCodec(Base):
+    """
+    Slotted page codec of B-tree nodes with variable-length keys and values, the page is the node slot.
+      Branch: Header | Fanout | KeysCount | PrefixSize | Prefix | P(0) | ... | P(n) | Slot(0) ... Slot(n - 1)
+              | free space | entries, entry is KeySize(H) | key suffix
+      Leaf:   Header | Prev | Next | Fanout | KeysCount | PrefixSize | Prefix | Slot(0) ... Slot(n - 1)
+              | free space | entries, entry is KeySize(H) | key suffix | ValueSize(H) | value
+    Slots are offsets of entries, entries are packed from the end of the page backwards.
+    The common prefix of the node's keys is stored once (prefix compression), values too long
+    to be inline live in overflow page chains, the entry keeps OverflowTag and (head id, length).
+    Entries are limited to a quarter of the page, so a full node split in halves by bytes
+    takes one more entry and two underflown nodes always fit into one when merged.
+    Fanout is the maximal number of entries of a page (the smallest entries), see Index.
+    """
+    Endianness = '<'
+    OverflowTag = 0xFFFF
+    MinEntrySize = 6  # slot, key and value sizes
+    Overflow = namedtuple('Overflow', 'id length')
+    Size = struct.Struct(f"{Endianness}H")
+    OverflowRef = struct.Struct(f"{Endianness}2I")
+
+    def __init__(self, page_size, header):
+        """
+        """
+        assert page_size <= 0xFFFF + 1, "Invalid page size, too big."
+        super().__init__()
+        e = SlottedNodeCodec.Endianness
+        self._header = header
+        self._branch_header = struct.Struct(f"{e}I{len(header)}s2IH")
+        self._leaf_header = struct.Struct(f"{e}I{len(header)}s4IH")
+        self._size = page_size
+        self._capacity = page_size - self._leaf_header.size  # bytes of entries
+        assert self._capacity >= 64 * SlottedNodeCodec.MinEntrySize, "Invalid page size, too small."
+        self._fanout = self._capacity // SlottedNodeCodec.MinEntrySize
+        self._max_entry_size = self._capacity // 4
+        self._max_key_size = self._max_entry_size // 2 - SlottedNodeCodec.MinEntrySize
+        self._max_value_size = self._max_entry_size // 2 - 4  # inline values
+
+    def __repr__(self):
+        """
+        """
+        return f"{type(self).__name__}:{self._size}:{self._fanout}"
+
+    __str__ = __repr__
+
+    @property
+    def header(self):
+        """
+        """
+        return self._header
+
+    @property
+    def fanout(self):
+        """
+        """
+        return self._fanout
+
+    @property
+    def size(self):
+        """
+        """
+        return self._size
+
+    @property
+    def max_key_size(self):
+        """
+        """
+        return self._max_key_size
+
+    @property
+    def max_value_size(self):
+        """
+        """
+        return self._max_value_size
+
+    @staticmethod
+    @lru_cache
+    def get_slots_struct(count):
+        """
+        """
+        return struct.Struct(f"{SlottedNodeCodec.Endianness}{count}H")
+
+    @staticmethod
+    @lru_cache
+    def get_kids_struct(count):
+        """
+        """
+        return struct.Struct(f"{SlottedNodeCodec.Endianness}{count}I")
+
+    @staticmethod
+    def get_prefix(keys):
+        """
+        Returns the common prefix of encoded keys, keys of single key nodes are kept as is.
+        """
+        return os.path.commonprefix(keys) if len(keys) > 1 else b''
+
+    @staticmethod
+    def get_value_size(value):
+        """
+        """
+        if isinstance(value, SlottedNodeCodec.Overflow):
+            return SlottedNodeCodec.OverflowRef.size
+        return len(value.encode('utf-8')) if value else 0
+
+    def accepts(self, key):
+        """
+        """
+        return len(key.encode('utf-8')) <= self._max_key_size
+
+    def is_inline(self, value):
+        """
+        """
+        return SlottedNodeCodec.get_value_size(value) <= self._max_value_size
+
+    def get_entry_weight(self, key, value, leaf):
+        """
+        Returns number of bytes of the entry (uncompressed) including its slot.
+        """
+        if leaf:
+            return SlottedNodeCodec.MinEntrySize + len(key.encode('utf-8')) + SlottedNodeCodec.get_value_size(value)
+        return SlottedNodeCodec.MinEntrySize + len(key.encode('utf-8')) + 2  # + kid, - value size
+
+    def calculate_size(self, tree, leaf):
+        """
+        Returns number of bytes of the serialized node.
+        """
+        count = tree.keys_count
+        keys = [key.encode('utf-8') for key in tree.keys[:count]]
+        prefix_size = len(SlottedNodeCodec.get_prefix(keys))
+        result = self._leaf_header.size if leaf else self._branch_header.size + 4
+        result += prefix_size + sum(len(key) for key in keys) - count * prefix_size
+        if leaf:
+            result += 6 * count + sum(SlottedNodeCodec.get_value_size(value) for value in tree.values[:count])
+        else:
+            result += 8 * count
+        return result
+
+    def is_full(self, tree, leaf):
+        """
+        Full nodes might not accept the largest entry.
+        """
+        return tree.keys_count >= self._fanout or self.calculate_size(tree, leaf) + self._max_entry_size > self._size
+
+    def fits(self, tree, leaf):
+        """
+        """
+        return self.calculate_size(tree, leaf) <= self._size
+
+    def is_underflown(self, tree, leaf):
+        """
+        Less than a quarter of the page is used by entries.
+        """
+        header_size = self._leaf_header.size if leaf else self._branch_header.size + 4
+        return self.calculate_size(tree, leaf) - header_size < self._capacity // 4
+
+    def get_split_position(self, tree, leaf):
+        """
+        Splits entries in halves by bytes, branches keep at least one key on both sides of the pushed up one.
+        """
+        count = tree.keys_count
+        if leaf:
+            weights = [self.get_entry_weight(key, value, leaf) for key, value in zip(tree.keys[:count], tree.values)]
+        else:
+            weights = [self.get_entry_weight(key, None, leaf) for key in tree.keys[:count]]
+        half = sum(weights) / 2
+        total = 0
+        for result, weight in enumerate(weights):
+            total += weight
+            if total >= half:
+                break
+        else:
+            result = count // 2
+        return max(1, min(result, count - 1)) if leaf else max(1, min(result, count - 2))
+
+    def get_load_budget(self, fill_factor, leaf):
+        """
+        Returns (chunk size, min chunk size, max chunk size) in bytes for bulk load, see Index.pack.
+        """
+        capacity = self._capacity if leaf else self._size - self._branch_header.size - 4
+        min_size = capacity // 4
+        return max(min_size, int(capacity * fill_factor)), min_size, capacity
+
+    def pack_branch(self, keys_count, kid_ids, keys):
+        """
+        """
+        keys = [key.encode('utf-8') for key in keys[:keys_count]]
+        prefix = SlottedNodeCodec.get_prefix(keys)
+        prefix_size = len(prefix)
+        buffer = bytearray(self._size)
+        self._branch_header.pack_into(buffer,
+                                      0,
+                                      len(self._header),
+                                      self._header,
+                                      self._fanout,
+                                      keys_count,
+                                      prefix_size)
+        offset = self._branch_header.size
+        buffer[offset:offset + prefix_size] = prefix
+        offset += prefix_size
+        kids_struct = SlottedNodeCodec.get_kids_struct(keys_count + 1)
+        kids_struct.pack_into(buffer, offset, *kid_ids[:keys_count + 1])
+        offset += kids_struct.size
+        slots = list()
+        end = self._size
+        for key in keys:
+            suffix = key[prefix_size:]
+            end -= 2 + len(suffix)
+            slots.append(end)
+            SlottedNodeCodec.Size.pack_into(buffer, end, len(suffix))
+            buffer[end + 2:end + 2 + len(suffix)] = suffix
+        slots_struct = SlottedNodeCodec.get_slots_struct(keys_count)
+        assert offset + slots_struct.size <= end, "Invalid node, page overflow."
+        slots_struct.pack_into(buffer, offset, *slots)
+        return buffer
+
+    def unpack_branch(self, buffer):
+        """
+        Returns (header, keys count, keys, kid ids).
+        """
+        with memoryview(buffer) as view:
+            header_length, header, _, keys_count, prefix_size = self._branch_header.unpack_from(view)
+            offset = self._branch_header.size
+            prefix = bytes(view[offset:offset + prefix_size])
+            offset += prefix_size
+            kids = list(SlottedNodeCodec.get_kids_struct(keys_count + 1).unpack_from(view, offset))
+            offset += 4 * (keys_count + 1)
+            keys = list()
+            for slot in SlottedNodeCodec.get_slots_struct(keys_count).unpack_from(view, offset):
+                size, = SlottedNodeCodec.Size.unpack_from(view, slot)
+                keys.append(SlottedNodeCodec.decode(prefix, view, slot + 2, size))
+        return header[:header_length], keys_count, keys, kids
+
+    def pack_leaf(self, prev_id, next_id, keys_count, keys, values):
+        """
+        """
+        keys = [key.encode('utf-8') for key in keys[:keys_count]]
+        prefix = SlottedNodeCodec.get_prefix(keys)
+        prefix_size = len(prefix)
+        buffer = bytearray(self._size)
+        self._leaf_header.pack_into(buffer,
+                                    0,
+                                    len(self._header),
+                                    self._header,
+                                    prev_id,
+                                    next_id,
+                                    self._fanout,
+                                    keys_count,
+                                    prefix_size)
+        offset = self._leaf_header.size
+        buffer[offset:offset + prefix_size] = prefix
+        offset += prefix_size
+        slots = list()
+        end = self._size
+        for key, value in zip(keys, values):
+            suffix = key[prefix_size:]
+            if isinstance(value, SlottedNodeCodec.Overflow):
+                value_size = SlottedNodeCodec.OverflowTag
+                value = SlottedNodeCodec.OverflowRef.pack(*value)
+            else:
+                value = value.encode('utf-8') if value else b''
+                value_size = len(value)
+                assert value_size < SlottedNodeCodec.OverflowTag, "Invalid value, too long."
+            end -= 4 + len(suffix) + len(value)
+            slots.append(end)
+            SlottedNodeCodec.Size.pack_into(buffer, end, len(suffix))
+            position = end + 2 + len(suffix)
+            buffer[end + 2:position] = suffix
+            SlottedNodeCodec.Size.pack_into(buffer, position, value_size)
+            buffer[position + 2:position + 2 + len(value)] = value
+        slots_struct = SlottedNodeCodec.get_slots_struct(keys_count)
+        assert offset + slots_struct.size <= end, "Invalid node, page overflow."
+        slots_struct.pack_into(buffer, offset, *slots)
+        return buffer
+
+    def unpack_leaf(self, buffer):
+        """
+        Returns (header, keys count, keys, values, prev id, next id), overflown values are Overflow references.
+        """
+        with memoryview(buffer) as view:
+            header_length, header, prev_id, next_id, _, keys_count, prefix_size = self._leaf_header.unpack_from(view)
+            offset = self._leaf_header.size
+            prefix = bytes(view[offset:offset + prefix_size])
+            offset += prefix_size
+            keys = list()
+            values = list()
+            for slot in SlottedNodeCodec.get_slots_struct(keys_count).unpack_from(view, offset):
+                size, = SlottedNodeCodec.Size.unpack_from(view, slot)
+                keys.append(SlottedNodeCodec.decode(prefix, view, slot + 2, size))
+                slot += 2 + size
+                size, = SlottedNodeCodec.Size.unpack_from(view, slot)
+                if size == SlottedNodeCodec.OverflowTag:
+                    values.append(SlottedNodeCodec.Overflow(*SlottedNodeCodec.OverflowRef.unpack_from(view, slot + 2)))
+                else:
+                    values.append(str(view[slot + 2:slot + 2 + size], 'utf-8'))
+        return header[:header_length], keys_count, keys, values, prev_id, next_id
+
+    @staticmethod
+    def decode(prefix, view, offset, size):
+        """
+        """
+        if prefix:
+            return (prefix + view[offset:offset + size]).decode('utf-8')
+        return str(view[offset:offset + size], 'utf-8')
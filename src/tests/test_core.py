@@ -171,6 +171,27 @@ class Test(unittest.TestCase):
         assert Text.compare('HELLO', 'Hello') == -1
         assert Text.compare('HELLO', 'Hello', case_insensitive=True) == 0
 
+    def test_strings_sort_key_success(self):
+        assert Text.get_normalized('Rite\u0304') == 'Rit\u0113'
+        assert Text.get_normalized('HeLLo', case_insensitive=True) == 'hello'
+        assert Text.get_sort_key('Rit\u0113') == Text.get_sort_key('Rite\u0304')
+        assert Text.get_sort_key('ﬁ') == b'fi'  # NFKC
+        assert Text.get_sort_key('Straße', case_insensitive=True) == Text.get_sort_key('STRASSE', case_insensitive=True)
+        words = ['', ' ', 'habit', 'hat', 'bat', 'bail', 'HELLO', 'Hello', 'Я с детства', 'Я c детства',
+                 '山乇ㄥ', 'ɹoʇıp', 'Rit\u0113', 'Rite\u0304', 'a\U0001F600', 'a\uFFFF', 'ab']
+        for lhs in words:
+            for rhs in words:
+                lhs_key, rhs_key = Text.get_sort_key(lhs), Text.get_sort_key(rhs)
+                cmp = (lhs_key > rhs_key) - (lhs_key < rhs_key)
+                assert cmp == Text.compare(lhs, rhs)
+                assert (cmp == 0) == Text.equal(lhs, rhs)
+        Text.get_normalized.cache_clear()
+        Text.get_normalized('cached')
+        Text.get_normalized('cached')
+        info = Text.get_normalized.cache_info()
+        assert info.hits == 1 and info.misses == 1
+        assert info.maxsize == Text.NormalizationCacheSize  # bounded, LRU eviction
+
     def test_modify_flags_success(self):
         flags = Flags.DIRTY | Flags.PROCESSED | Flags.VISITED | Flags.LEAF | Flags.INVALID
         assert flags & Flags.DIRTY == Flags.DIRTY
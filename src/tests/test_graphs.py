@@ -6,6 +6,7 @@ import os
 import random
 import unittest
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import networkx as nx
 import numpy as np
@@ -14,12 +15,16 @@ import matplotlib.pyplot as plt
 from graph.core.flags import Flags
 from graph.core.colors import Colors
 from graph.core.domain_helper import DomainHelper
-from graph.algorithms.core_algorithms import Algorithms
+from graph.algorithms.core_algorithms import Algorithms, RangeQuery, BlockRangeQuery, SegmentTree, FenwickTree
 from graph.adt.disjoint_set import DisjointSet
 from graph.adt.vertex import Vertex
 from graph.adt.graph import Graph
+from graph.adt.csr_graph import CsrGraph
 from graph.adt.tree import Tree
 from graph.algorithms.graph_algorithms import GraphAlgorithms
+from graph.algorithms.csr_algorithms import CsrAlgorithms
+from graph.algorithms.graph_traversal import GraphTraversal
+from graph.algorithms.lca_index import LcaIndex
 from graph.algorithms.graph_visitor import GraphVisitor
 
 
@@ -1816,6 +1821,58 @@ class Test(unittest.TestCase):
         now = datetime.now()
         print(f"End: {now}")
 
+    def test_calculate_lowest_common_ancestor_repeated(self):
+        tree = Test.generate_random_tree(100)
+        for k in range(10):  # no flags are left between calls
+            assert GraphAlgorithms.calculate_lowest_common_ancestor(tree[0], tree[k], tree[k]) == tree[k]
+            assert GraphAlgorithms.calculate_lowest_common_ancestor(tree[0], tree[0], tree[k]) == tree[0]
+        assert all(node.flags == Flags.CLEAR for node in tree.values())
+
+    @staticmethod
+    def find_lowest_common_ancestor_naive(tree1, tree2):
+        ancestors = set()
+        while tree1 is not None:
+            ancestors.add(id(tree1))
+            tree1 = tree1.papa
+        while id(tree2) not in ancestors:
+            tree2 = tree2.papa
+        return tree2
+
+    def test_lca_index_success(self):
+        v0 = Tree(0, '0')
+        v1 = Tree(1, '1')
+        v2 = Tree(2, '2')
+        v3 = Tree(3, '3')
+        v4 = Tree(4, '4')
+        v0.add_kid(v1)
+        v0.add_kid(v2)
+        v1.add_kid(v3)
+        v2.add_kid(v4)
+        index = LcaIndex(v0)
+        assert len(index) == 5
+        assert index.nodes == (v0, v1, v3, v2, v4)
+        assert index.query(v3, v4) == v0
+        assert index.query(v4, v2) == v2
+        assert index.query(v3, v3) == v3
+        assert index.queries([(v3, v1), (v4, v0)]) == [v1, v0]
+        assert index.depth_of(v4) == 2
+        assert index.distance(v3, v4) == 4
+        assert LcaIndex(v4).query(v4, v4) == v4
+
+    def test_lca_index_random_success(self):
+        for n in (1, 2, 10, 1000):
+            tree = Test.generate_random_tree(n)
+            index = LcaIndex(tree[0])
+            assert len(index) == n
+            lhs = np.random.randint(0, n, 500)
+            rhs = np.random.randint(0, n, 500)
+            pairs = [(tree[k1], tree[k2]) for k1, k2 in zip(lhs.tolist(), rhs.tolist())]
+            expected = [Test.find_lowest_common_ancestor_naive(tree1, tree2) for tree1, tree2 in pairs]
+            assert all(lhs is rhs for lhs, rhs in zip(index.queries(pairs), expected))
+            indices = index.query_indices([index.index_of(tree1) for tree1, _ in pairs],
+                                          [index.index_of(tree2) for _, tree2 in pairs])
+            assert all(index.nodes[k] is node for k, node in zip(indices.tolist(), expected))
+
     def test_execute_range_minimum_queries(self):
         array = [4, 2, 3, 7, 1, 5, 3, 3, 9, 6, 7, -1, 4]
         queries = [(2, 7), (2, 10), (5, 9), (7, 9), (1, 11), (3, 5), (10, 14)]
@@ -1864,6 +1921,115 @@ class Test(unittest.TestCase):
         now = datetime.now()
         print(f"End: {now}")
 
+    def test_range_query_success(self):
+        array = [4, 2, 3, 7, 1, 5, 3, 3, 9, 6, 7, -1, 4]
+        queries = [(2, 7), (2, 10), (5, 9), (7, 9), (1, 11), (3, 5)]
+        for rmq_type in (RangeQuery, BlockRangeQuery):
+            rmq = rmq_type(array)
+            assert rmq.queries(queries) == [(1, 4), (1, 4), (3, 6), (3, 7), (-1, 11), (1, 4)]
+            values, indices = rmq.query([0, 12], [12, 12])
+            assert values.tolist() == [-1, 4]
+            assert indices.tolist() == [11, 12]
+            rmq = rmq_type(array, function=Algorithms.Functions.MAX)
+            assert rmq.queries(queries) == [(7, 3), (9, 8), (9, 8), (9, 8), (9, 8), (7, 3)]
+            rmq = rmq_type([5, 5, 5, 5, 5, 5, 5])
+            assert rmq.queries([(0, 6), (3, 6)]) == [(5, 0), (5, 3)]
+
+    def test_range_query_random_success(self):
+        for n in (1, 2, 63, 64, 65, 130, 1000):
+            array = np.random.randint(-10, 10, n)
+            lb = np.random.randint(0, n, 1000)
+            rb = np.random.randint(0, n, 1000)
+            lb, rb = np.minimum(lb, rb), np.maximum(lb, rb)
+            for function in (Algorithms.Functions.MIN, Algorithms.Functions.MAX):
+                arg = np.argmin if function == Algorithms.Functions.MIN else np.argmax
+                expected = [lhs + arg(array[lhs:rhs + 1]) for lhs, rhs in zip(lb.tolist(), rb.tolist())]
+                for rmq_type in (RangeQuery, BlockRangeQuery):
+                    rmq = rmq_type(array.astype(np.float64), function=function)
+                    values, indices = rmq.query(lb, rb)
+                    assert indices.tolist() == expected
+                    assert values.tolist() == array[expected].tolist()
+
+    def test_range_query_bool_success(self):
+        array = np.random.rand(200) < 0.5
+        array[[3, 150]] = [False, True]
+        lb = np.random.randint(0, len(array), 1000)
+        rb = np.random.randint(0, len(array), 1000)
+        lb, rb = np.minimum(lb, rb), np.maximum(lb, rb)
+        for function in (Algorithms.Functions.MIN, Algorithms.Functions.MAX):
+            arg = np.argmin if function == Algorithms.Functions.MIN else np.argmax
+            expected = [lhs + arg(array[lhs:rhs + 1]) for lhs, rhs in zip(lb.tolist(), rb.tolist())]
+            for rmq_type in (RangeQuery, BlockRangeQuery):
+                values, indices = rmq_type(array, function=function).query(lb, rb)
+                assert indices.tolist() == expected
+                assert values.tolist() == array[expected].tolist()
+
+    def test_block_range_query_memory_success(self):
+        array = np.random.rand(1 << 16)
+        assert BlockRangeQuery(array).nbytes * 4 < RangeQuery(array).nbytes
+
+    def test_segment_tree_success(self):
+        array = [4, 2, 3, 7, 1, 5, 3, 3, 9, 6, 7, -1, 4]
+        tree = SegmentTree(array)
+        assert tree.query([2, 1, 12], [7, 11, 12]).tolist() == [1, -1, 4]
+        tree.update(3, 5, 10)  # [4, 2, 3, 17, 11, 15, 3, 3, 9, 6, 7, -1, 4]
+        assert tree.query([3, 0], [5, 12]).tolist() == [11, -1]
+        tree.assign([11, 11], [0, 8])
+        assert tree.query(9, 12).tolist() == [4]
+        tree = SegmentTree(array, function=Algorithms.Functions.MAX)
+        tree.add([0, 0], [3, 3])
+        assert tree.query([0, 1], [12, 12]).tolist() == [10, 9]
+        tree = SegmentTree(array, function=Algorithms.Functions.SUM)
+        tree.update([0, 5], [12, 6], [1, -2])
+        assert tree.query(0, 12).tolist() == [sum(array) + 13 - 4]
+        assert tree.get_values().tolist() == [5, 3, 4, 8, 2, 4, 2, 4, 10, 7, 8, 0, 5]
+
+    def test_fenwick_tree_success(self):
+        array = [4, 2, 3, 7, 1, 5, 3, 3, 9, 6, 7, -1, 4]
+        tree = FenwickTree(array)
+        assert tree.query([0, 2, 12], [12, 7, 12]).tolist() == [sum(array), sum(array[2:8]), 4]
+        assert tree.prefix_sum([-1, 0, 3]).tolist() == [0, 4, 16]
+        tree.update([0, 5], [12, 6], [1, -2])
+        tree.add(12, 10)
+        assert tree.get_values().tolist() == [5, 3, 4, 8, 2, 4, 2, 4, 10, 7, 8, 0, 15]
+
+    def test_segment_fenwick_trees_random_success(self):
+        for n in (1, 2, 9, 100):
+            for dtype in (np.int64, np.float64):
+                array = np.random.randint(-9, 9, n).astype(dtype)
+                trees = {function: SegmentTree(array, function=function) for function in Algorithms.Functions}
+                fenwick_tree = FenwickTree(array)
+                for _ in range(50):
+                    lb = np.random.randint(0, n, 10)
+                    rb = np.random.randint(0, n, 10)
+                    lb, rb = np.minimum(lb, rb), np.maximum(lb, rb)
+                    if random.randint(0, 1):
+                        deltas = np.random.randint(-5, 5, 10).astype(dtype)
+                        for tree in trees.values():
+                            tree.update(lb, rb, deltas)
+                        fenwick_tree.update(lb, rb, deltas)
+                        for lhs, rhs, delta in zip(lb, rb, deltas):
+                            array[lhs:rhs + 1] += delta
+                    else:
+                        values = np.random.randint(-9, 9, 10).astype(dtype)
+                        for tree in trees.values():
+                            tree.assign(lb, values)
+                        for lhs, value in zip(lb, values):
+                            array[lhs] = value
+                        fenwick_tree = FenwickTree(array)  # point assign is not supported
+                    lb = np.random.randint(0, n, 10)
+                    rb = np.random.randint(0, n, 10)
+                    lb, rb = np.minimum(lb, rb), np.maximum(lb, rb)
+                    for function, aggregate in ((Algorithms.Functions.MIN, np.min),
+                                                (Algorithms.Functions.MAX, np.max),
+                                                (Algorithms.Functions.SUM, np.sum)):
+                        expected = [aggregate(array[lhs:rhs + 1]) for lhs, rhs in zip(lb, rb)]
+                        assert trees[function].query(lb, rb).tolist() == expected
+                    assert fenwick_tree.query(lb, rb).tolist() == [np.sum(array[lhs:rhs + 1])
+                                                                   for lhs, rhs in zip(lb, rb)]
+                for tree in trees.values():
+                    assert tree.get_values().tolist() == array.tolist()
+
     @staticmethod
     def graph_cleanup(graph):
         for vertex in graph.vertices.values():
@@ -2076,6 +2242,226 @@ class Test(unittest.TestCase):
         print(f"End: {now}")
 
 
+    @staticmethod
+    def collect_predecessors_naive(vertex, graph):
+        return set(DomainHelper.AdjValue(edge.endpoints[0], edge)
+                   for edge in graph.edges.values() if edge.endpoints[1].id == vertex.id)
+
+    @staticmethod
+    def collect_incidents_naive(vertex, graph):
+        return set(DomainHelper.AdjValue(vertex, edge)
+                   for edge in graph.edges.values() if vertex.id in (edge.endpoints[0].id, edge.endpoints[1].id))
+
+    def test_collect_predecessors_incidents_random_success(self):
+        n = 50
+        for k in range(10):
+            graph = Test.generate_random_graph(n, digraph=bool(k % 2))
+            vertices = list(graph.vertices.values())
+            random.shuffle(vertices)
+            while vertices:
+                for vertex in vertices:
+                    assert (GraphAlgorithms.collect_predecessors(vertex, graph) ==
+                            Test.collect_predecessors_naive(vertex, graph))
+                    assert (GraphAlgorithms.collect_incidents(vertex, graph) ==
+                            Test.collect_incidents_naive(vertex, graph))
+                    assert graph.get_vertex_in_degree(vertex) == len(Test.collect_predecessors_naive(vertex, graph))
+                for _ in range(min(len(vertices), n // 5)):
+                    graph.remove_vertex(vertices.pop())
+                edges = list(graph.edges.values())
+                for edge in edges[:len(edges) // 10]:
+                    if edge.id in graph.edges:
+                        graph.remove_edge(edge)
+                if len(vertices) > 1:
+                    graph.add_edge(vertices[0], vertices[1], 1)
+            assert len(graph.vertices) == 0
+            assert len(graph.edges) == 0
+
+    def test_graph_traversal_success(self):
+        graph = Test.generate_random_graph(50, digraph=True)
+        traversal = GraphTraversal(graph)
+        for vertex in graph.vertices.values():
+            dfs = [v for v in traversal.dfs(vertex)]
+            dfs_postorder = [v for v in traversal.dfs_postorder(vertex)]
+            bfs = [v for v in traversal.bfs(vertex)]
+            assert dfs == [v for v in traversal.dfs(vertex)]  # no reset between runs
+            assert bfs == [v for v in traversal.bfs(vertex)]
+            assert all(v.flags == Flags.CLEAR for v in graph.vertices.values())
+            assert dfs == [v for v in GraphAlgorithms.dfs(vertex)]
+            Test.graph_cleanup(graph)
+            assert dfs_postorder == [v for v in GraphAlgorithms.dfs_postorder(vertex)]
+            Test.graph_cleanup(graph)
+            assert bfs == [v for v in GraphAlgorithms.bfs(vertex)]
+            Test.graph_cleanup(graph)
+            visitor = Test.CollectNodesVisitor(graph)
+            traversal.accept(vertex, visitor)
+            collected_vertices = visitor.collected_vertices
+            visitor = Test.CollectNodesVisitor(graph)
+            vertex.accept(visitor)
+            assert collected_vertices == visitor.collected_vertices
+            Test.graph_cleanup(graph)
+            distances, prev_vertices, _ = traversal.calculate_shortest_distances_dijkstra(vertex)
+            distances0, prev_vertices0, _ = GraphAlgorithms.calculate_shortest_distances_dijkstra(vertex)
+            assert distances == dict(distances0)
+            Test.graph_cleanup(graph)
+
+    def test_graph_traversal_connected_components_success(self):
+        graph = Test.generate_random_graph(100, digraph=False)
+        traversal = GraphTraversal(graph)
+        visited = traversal.create_state()
+        components = list()
+        for vertex in graph.vertices.values():
+            component = [v for v in traversal.dfs(vertex, visited=visited)]
+            if component:
+                components.append(component)
+        assert sum(len(component) for component in components) == len(graph.vertices)
+        assert visited.all()
+
+    def test_graph_traversal_concurrent_success(self):
+        graph = Test.generate_random_graph(200, digraph=True)
+        traversal = GraphTraversal(graph)
+        vertices = list(graph.vertices.values()) * 5
+        expected = {vertex: [v.id for v in traversal.bfs(vertex)] for vertex in graph.vertices.values()}
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda vertex: (vertex, [v.id for v in traversal.bfs(vertex)]), vertices))
+        for vertex, result in results:
+            assert result == expected[vertex]
+
+    def test_csr_graph_from_graph_success(self):
+        graph = Graph(digraph=True)
+        v_a = Vertex(0, 'A', 'A')
+        v_b = Vertex(1, 'B', 'B')
+        v_c = Vertex(2, 'C', 'C')
+        v_d = Vertex(3, 'D', 'D')
+        v_e = Vertex(4, 'E', 'E')
+        v_f = Vertex(5, 'F', 'F')
+        graph.add_vertex(v_a)
+        graph.add_vertex(v_b)
+        graph.add_vertex(v_c)
+        graph.add_vertex(v_d)
+        graph.add_vertex(v_e)
+        graph.add_vertex(v_f)
+        graph.add_edge(v_a, v_b, 'A->B')
+        graph.add_edge(v_a, v_c, 'A->C')
+        graph.add_edge(v_a, v_d, 'A->D')
+        graph.add_edge(v_c, v_e, 'C->E')
+        graph.add_edge(v_d, v_f, 'D->F')
+        csr = CsrGraph.from_graph(graph)
+        assert csr.number_of_vertices == 6
+        assert csr.number_of_edges == 5
+        assert csr.weights is None
+        assert csr.offsets.tolist() == [0, 3, 3, 4, 5, 5, 5]
+        assert csr.targets.tolist() == [1, 2, 3, 4, 5]
+        dfs = [csr.ids[v] for v in CsrAlgorithms.dfs(csr, csr.index_of(v_a.id))]
+        assert dfs == [v.id for v in GraphAlgorithms.dfs(v_a)]
+        Test.graph_cleanup(graph)
+        bfs = [csr.ids[v] for v in CsrAlgorithms.bfs(csr, csr.index_of(v_a.id))]
+        assert bfs == [v.id for v in GraphAlgorithms.bfs(v_a)]
+        bfs = [v for v in CsrAlgorithms.bfs(csr.transpose(), csr.index_of(v_f.id))]
+        assert bfs == [5, 3, 0]
+
+    def test_csr_graph_from_edges_success(self):
+        csr = CsrGraph.from_edges([0, 0, 1, 2], [1, 2, 2, 3], [4, 1, 2, 5], digraph=False)
+        assert csr.number_of_vertices == 4
+        assert csr.number_of_edges == 8
+        assert csr.offsets.tolist() == [0, 2, 4, 7, 8]
+        assert csr.targets.tolist() == [1, 2, 0, 2, 0, 1, 3, 2]
+        assert csr.weights.tolist() == [4, 1, 4, 2, 1, 2, 5, 5]
+        assert csr.transpose() is csr
+        assert not csr.targets.flags.writeable
+        visited = np.zeros(csr.number_of_vertices, dtype=np.bool_)
+        assert [v for v in CsrAlgorithms.dfs(csr, 3, visited=visited)] == [3, 2, 1, 0]
+        assert [v for v in CsrAlgorithms.dfs(csr, 0, visited=visited)] == []
+
+    def test_csr_bfs_direction_optimizing_success(self):
+        rng = np.random.default_rng(7)
+        for n in (1, 2, 50, 300):
+            for digraph in (True, False):
+                for m in (n, n * 8):  # sparse, dense (bottom-up steps)
+                    sources = rng.integers(0, n, m)
+                    targets = rng.integers(0, n, m)
+                    csr = CsrGraph.from_edges(sources, targets, number_of_vertices=n, digraph=digraph)
+                    for source in (0, n - 1):
+                        levels, parents = CsrAlgorithms.bfs_direction_optimizing(csr, source, alpha=2, beta=2)
+                        expected = np.full(n, -1, dtype=np.int64)
+                        expected[source] = 0
+                        vertices = list(CsrAlgorithms.bfs(csr, source))
+                        for vertex in vertices:
+                            for adjacence in csr.get_adjacencies(vertex)[0].tolist():
+                                if expected[adjacence] == -1:
+                                    expected[adjacence] = expected[vertex] + 1
+                        assert levels.tolist() == expected.tolist()
+                        assert parents[source] == source
+                        assert sorted(np.flatnonzero(parents != -1).tolist()) == sorted(vertices)
+                        for vertex in vertices:
+                            if vertex != source:
+                                parent = parents[vertex]
+                                assert levels[parent] == levels[vertex] - 1
+                                assert vertex in csr.get_adjacencies(parent)[0].tolist()
+
+    def test_graph_traversal_bfs_direction_optimizing_success(self):
+        graph = Test.generate_random_graph(200, True)
+        traversal = GraphTraversal(graph)
+        start_vertex = traversal.vertices[0]
+        levels, parents = traversal.bfs_direction_optimizing(start_vertex)
+        reached = [traversal.index_of(vertex) for vertex in traversal.bfs(start_vertex)]
+        assert sorted(reached) == sorted(np.flatnonzero(levels != -1).tolist())
+        assert parents[traversal.index_of(start_vertex)] == traversal.index_of(start_vertex)
+
+    def test_csr_shortest_distances_dijkstra_success(self):
+        graph = Graph(digraph=True)
+        vertices = [Vertex(k, str(k), k) for k in range(6)]
+        for vertex in vertices:
+            graph.add_vertex(vertex)
+        v0, v1, v2, v3, v4, v5 = vertices
+        graph.add_edge(v0, v1, 5)
+        graph.add_edge(v0, v2, 1)
+        graph.add_edge(v1, v2, 2)
+        graph.add_edge(v1, v3, 3)
+        graph.add_edge(v1, v4, 20)
+        graph.add_edge(v2, v1, 3)
+        graph.add_edge(v2, v4, 12)
+        graph.add_edge(v3, v2, 3)
+        graph.add_edge(v3, v4, 2)
+        graph.add_edge(v3, v5, 6)
+        graph.add_edge(v4, v5, 1)
+        csr = CsrGraph.from_graph(graph)
+        distances, prev_vertices, _ = CsrAlgorithms.calculate_shortest_distances_dijkstra(csr, 0)
+        assert distances.tolist() == [0, 4, 1, 7, 9, 10]
+        assert prev_vertices.tolist() == [-1, 2, 0, 1, 3, 4]
+        path, dst_distance = CsrAlgorithms.find_shortest_distance_dijkstra(csr, 0, 5)
+        assert [v for v in path] == [0, 2, 1, 3, 4, 5]
+        assert dst_distance == 10
+        path, dst_distance = CsrAlgorithms.find_shortest_distance_dijkstra(csr, 5, 0)
+        assert [v for v in path] == []
+        assert dst_distance == np.inf
+
+    def test_csr_shortest_distances_dijkstra_random_success(self):
+        n = 100
+        for k in range(10):
+            graph = Test.generate_random_graph(n, digraph=True)
+            csr = CsrGraph.from_graph(graph)
+            vertices = list(graph.vertices.values())
+            src_vertex = random.choice(vertices)
+            distances0, _, _ = GraphAlgorithms.calculate_shortest_distances_dijkstra(src_vertex)
+            distances, _, _ = CsrAlgorithms.calculate_shortest_distances_dijkstra(csr, csr.index_of(src_vertex.id))
+            for vertex in vertices:
+                distance = distances[csr.index_of(vertex.id)]
+                if vertex in distances0:
+                    assert distance == distances0[vertex]
+                else:
+                    assert distance == np.inf
+
+    def test_csr_minimum_spanning_tree_kruskal_success(self):
+        sources = [0, 0, 0, 1, 1, 2, 2, 2, 3, 3, 3, 3, 4, 5, 6, 6, 7, 8]
+        targets = [1, 3, 4, 2, 3, 7, 8, 9, 4, 5, 6, 7, 5, 6, 7, 9, 9, 9]
+        weights = [5, 4, 1, 4, 2, 4, 2, 1, 2, 5, 11, 2, 1, 5, 1, 4, 6, 0]
+        csr = CsrGraph.from_edges(sources, targets, weights, digraph=False)
+        mst = [edge for edge in CsrAlgorithms.find_minimum_spanning_tree_kruskal(csr)]
+        assert len(mst) == 9
+        assert sum(edge[2] for edge in mst) == 14
+        assert mst[0] == (8, 9, 0)
+
+
 if __name__ == '__main__':
     """
     """
@@ -2,13 +2,20 @@
 # -*- encoding: utf-8 -*-
 # UI Lab Inc. Arthur Amshukov
 #
+import os
 import random
+import tempfile
 import unittest
 import locale
 from graph.core.domain_helper import DomainHelper
 from graph.core.text import Text
 from graph.indexing.index import Index
+from graph.indexing.file_repository import FileRepository
 from graph.indexing.memory_repository import InMemoryRepository
+from graph.indexing.mmap_repository import MmapRepository
+from graph.indexing.readonly_file_repository import FileReadOnlyRepository
+from graph.indexing.readonly_mmap_repository import MmapReadOnlyRepository
+from graph.indexing.node_cache import NodeCache
 
 
 class Test(unittest.TestCase):
@@ -82,6 +89,55 @@ class Test(unittest.TestCase):
             read_data = repository.read(offset, len(data_to_write))
             assert data_to_write == read_data
 
+    def test_file_repository_random_success(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for repository_type, readonly_repository_type in ((FileRepository, FileReadOnlyRepository),
+                                                              (MmapRepository, MmapReadOnlyRepository)):
+                path = os.path.join(directory, f'{repository_type.__name__}.bin')
+                page_size = random.randint(1, 4097)
+                expected = bytearray()
+                with repository_type(path, page_size, extent_size=random.randint(1, 3 * page_size)) as repository:
+                    assert repository.extent_size % page_size == 0
+                    for _ in range(100):
+                        offset = random.randint(0, 16 * page_size)
+                        data_to_write = DomainHelper.generate_random_bytes(random.randint(1, 4 * page_size))
+                        repository.write(offset, data_to_write)
+                        expected.extend([0] * max(0, offset + len(data_to_write) - len(expected)))
+                        expected[offset:offset + len(data_to_write)] = data_to_write
+                        assert repository.size % repository.extent_size == 0
+                        assert repository.size >= len(expected)
+                        assert repository.read(offset, len(data_to_write)) == data_to_write
+                    assert repository.read(0, len(expected)) == expected
+                    repository.flush()
+                assert os.path.getsize(path) % page_size == 0
+                with readonly_repository_type(path, page_size) as repository:
+                    assert repository.read(0, len(expected)) == expected
+                    if repository_type is MmapRepository:
+                        assert isinstance(repository.read(0, 1), memoryview)
+
+    def test_file_repository_index_success(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for repository_type in (FileRepository, MmapRepository):
+                for page_size in (None, 1024):
+                    path = os.path.join(directory, f'{repository_type.__name__}{page_size}.index')
+                    kvps = [(str(random.randint(0, 1000)), str(k)) for k in range(500)]
+                    with repository_type(path, 4096) as repository:
+                        index = Index(repository, fanout=5, page_size=page_size)
+                        index.load(kvps[:250])
+                        for key, value in kvps[250:]:
+                            index.insert(key, value, replace=False)
+                        for key, _ in kvps[:50]:
+                            assert index.delete(key)
+                        expected = list(index.range())
+                    with repository_type(path, 4096) as repository:  # restart
+                        index = Index(repository)
+                        index.load_header()
+                        assert index.page_size == page_size
+                        assert list(index.range()) == expected
+                        assert list(index.range(reverse=True, readahead=2)) == expected[::-1]
+                        index.insert('x', 'x*')
+                        assert index.search('x')[1] == 'x*'
+
     def test_branch_tree_serialization_success(self):
         fanout = 5
         btree_branch = Index.BTreeBranch(0, fanout)
@@ -119,6 +175,61 @@ class Test(unittest.TestCase):
         assert keys == btree_leaf.keys
         assert values == btree_leaf.values
 
+    def test_node_codec_success(self):
+        for fanout in range(3, 16):
+            codec = Index.get_codec(fanout)
+            assert codec is Index.get_codec(fanout)
+            assert codec.size == Index.BTreeBranch.calculate_size(fanout)
+            for count in range(fanout + 1):
+                keys = [''.join(random.choice('abя山ಠ') for _ in range(random.randint(1, 8))) for _ in range(count)]
+                values = [''.join(random.choice('xyzé') for _ in range(random.randint(0, 12))) for _ in range(count)]
+                leaf = Index.BTreeLeaf(1, fanout)
+                leaf.assign(keys, values)
+                leaf.prev_id = 7
+                leaf.next_id = 9
+                buffer = leaf.serialize()
+                assert len(buffer) == codec.size
+                assert Index.BTreeLeaf.deserialize(memoryview(buffer)) == (Index.TreeHeader, count, keys, values, 7, 9)
+                branch = Index.BTreeBranch(2, fanout)
+                kid_ids = list(range(100, 100 + count + 1))
+                branch.assign(keys, kid_ids)
+                buffer = branch.serialize()
+                header, keys_count, branch_keys, kids = Index.BTreeBranch.deserialize(bytes(buffer))
+                assert (keys_count, branch_keys) == (count, keys)
+                assert kids == kid_ids + [0] * (fanout - count)
+        leaf = Index.BTreeLeaf(1, 3)
+        leaf.set_key('k' * Index.KeySize, 0)
+        with self.assertRaises(AssertionError):
+            leaf.serialize()
+
+    def test_slotted_node_codec_success(self):
+        codec = Index.get_slotted_codec(512)
+        assert codec is Index.get_slotted_codec(512)
+        for _ in range(50):
+            prefix = ''.join(random.choice('abя') for _ in range(random.randint(0, 8)))
+            keys = sorted(prefix + ''.join(random.choice('abя山ಠ') for _ in range(random.randint(0, 8)))
+                          for _ in range(random.randint(0, 12)))
+            values = [random.choice(['', 'xyzé' * random.randint(1, 5), Index.Overflow(7, 1000)]) for _ in keys]
+            count = len(keys)
+            leaf = Index.BTreeLeaf(1, codec.fanout)
+            leaf.assign(keys, values)
+            leaf.prev_id = 7
+            leaf.next_id = 9
+            assert codec.fits(leaf, True)
+            buffer = leaf.serialize(codec)
+            assert len(buffer) == codec.size
+            assert Index.BTreeLeaf.deserialize(memoryview(buffer), codec) == \
+                   (Index.SlottedTreeHeader, count, keys, values, 7, 9)
+            branch = Index.BTreeBranch(2, codec.fanout)
+            kid_ids = list(range(100, 100 + count + 1))
+            branch.assign(keys, kid_ids)
+            header, keys_count, branch_keys, kids = Index.BTreeBranch.deserialize(bytes(branch.serialize(codec)), codec)
+            assert (keys_count, branch_keys, kids) == (count, keys, kid_ids)
+        assert codec.accepts('k' * codec.max_key_size)
+        assert not codec.accepts('k' * (codec.max_key_size + 1))
+        assert codec.is_inline('v' * codec.max_value_size)
+        assert not codec.is_inline('v' * (codec.max_value_size + 1))
+
     def test_tree_calculate_offset_success(self):
         fanout = 4
         repository = InMemoryRepository(512)
@@ -393,6 +504,348 @@ class Test(unittest.TestCase):
         papa, kid, new_kid = index.split_leaf(papa, papa.kids[0])
         pass
 
+    def test_node_cache_success(self):
+        cache = NodeCache(2)
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        assert cache.get(1) == 'a'  # 2 is the least recently used now
+        cache.put(3, 'c')
+        assert 2 not in cache and 1 in cache and 3 in cache
+        cache.pin(4, 'd')
+        cache.put(5, 'e')
+        cache.put(6, 'f')
+        assert len(cache) == 3 and cache.get(4) == 'd'  # pinned nodes are never evicted
+        cache.unpin(4)  # the most recently used one
+        cache.put(7, 'g')
+        assert 4 in cache and 6 not in cache
+        cache.put(8, 'h')
+        assert 4 not in cache
+        assert cache.hits == 2 and cache.misses == 0
+        assert cache.get(2) is None and cache.misses == 1
+
+    def test_index_search_success(self):
+        fanout = 3
+        repository = InMemoryRepository(512)
+        index = Index(repository, fanout=fanout)
+        assert index.search('5') == (None, None, -1)
+        for key in '5937128604':
+            index.insert(key, f'{key}*')
+        assert index.height == 2
+        for key in '5937128604':
+            tree, value, position = index.search(key)
+            assert value == f'{key}*'
+            assert tree.keys[position] == key
+        assert index.search('a') == (None, None, -1)
+        index.insert('5', '5**')
+        assert index.search('5')[1] == '5**'
+        assert index.multi_search(['9', 'a', '0', '5', '9']) == ['9*', None, '0*', '5**', '9*']
+        assert index.multi_search([]) == []
+        assert index.cache.pinned(index.root.id)
+
+    def test_index_search_random_success(self):
+        for _ in range(30):
+            fanout = random.randint(3, 8)
+            index = Index(InMemoryRepository(512), fanout=fanout, cache_size=random.choice([0, 4, 64]))
+            expected = dict()
+            for _ in range(random.randint(0, 300)):
+                key = str(random.randint(0, 300))
+                expected[key] = f'{key}*{random.randint(0, 9)}'
+                index.insert(key, expected[key])
+            for key, value in expected.items():
+                assert index.search(key)[1] == value
+            probes = [str(random.randint(0, 400)) for _ in range(100)]
+            assert index.multi_search(probes) == [expected.get(probe) for probe in probes]
+
+    def test_index_range_success(self):
+        index = Index(InMemoryRepository(512), fanout=3)
+        assert list(index.range()) == []
+        assert list(index.prefix('a')) == []
+        for key in '5937128604':
+            index.insert(key, f'{key}*')
+        assert [kvp.key for kvp in index.range()] == list('0123456789')
+        assert [kvp.key for kvp in index.range(reverse=True)] == list('9876543210')
+        assert list(index.range('3', '6')) == [Index.Kvp('3', '3*'), Index.Kvp('4', '4*'), Index.Kvp('5', '5*')]
+        assert [kvp.key for kvp in index.range('3', '6', reverse=True)] == ['5', '4', '3']
+        assert [kvp.key for kvp in index.range('35', '55')] == ['4', '5']
+        assert [kvp.key for kvp in index.range('7')] == ['7', '8', '9']
+        assert [kvp.key for kvp in index.range(hi='2', reverse=True)] == ['1', '0']
+        assert list(index.range('6', '3')) == []
+        with index.cursor('45') as cursor:
+            assert next(cursor) == Index.Kvp('5', '5*')
+            assert next(cursor).key == '6'
+        with index.cursor('45', reverse=True, readahead=0) as cursor:
+            assert [kvp.key for kvp in cursor] == ['4', '3', '2', '1', '0']
+
+    def test_index_prefix_success(self):
+        index = Index(InMemoryRepository(512), fanout=4)
+        keys = ['apple', 'app', 'application', 'apt', 'banana', 'ap', 'b', 'apps', 'a']
+        for key in keys:
+            index.insert(key, key.upper())
+        assert [kvp.key for kvp in index.prefix('app')] == ['app', 'apple', 'application', 'apps']
+        assert [kvp.value for kvp in index.prefix('app', reverse=True)] == ['APPS', 'APPLICATION', 'APPLE', 'APP']
+        assert [kvp.key for kvp in index.prefix('b')] == ['b', 'banana']
+        assert [kvp.key for kvp in index.prefix('b', reverse=True)] == ['banana', 'b']
+        assert list(index.prefix('c')) == []
+        assert len(list(index.prefix(''))) == len(keys)
+
+    def test_index_range_random_success(self):
+        for _ in range(20):
+            fanout = random.randint(3, 8)
+            index = Index(InMemoryRepository(512), fanout=fanout, cache_size=random.choice([0, 4, 64]))
+            expected = dict()
+            for _ in range(random.randint(0, 300)):
+                key = str(random.randint(0, 300))
+                expected[key] = f'{key}*'
+                index.insert(key, expected[key])
+            keys = sorted(expected)
+            readahead = random.choice([0, 1, 4])
+            assert [kvp.key for kvp in index.range(readahead=readahead)] == keys
+            assert [kvp.key for kvp in index.range(reverse=True, readahead=readahead)] == keys[::-1]
+            for _ in range(10):
+                lo, hi = str(random.randint(0, 400)), str(random.randint(0, 400))
+                actual = [kvp.key for kvp in index.range(lo, hi, readahead=readahead)]
+                assert actual == [key for key in keys if lo <= key < hi]
+                actual = [kvp.key for kvp in index.range(lo, hi, reverse=True, readahead=readahead)]
+                assert actual == [key for key in keys if lo <= key < hi][::-1]
+                prefix = str(random.randint(0, 30))
+                actual = [kvp.key for kvp in index.prefix(prefix, readahead=readahead)]
+                assert actual == [key for key in keys if key.startswith(prefix)]
+                actual = [kvp.key for kvp in index.prefix(prefix, reverse=True, readahead=readahead)]
+                assert actual == [key for key in keys if key.startswith(prefix)][::-1]
+            cursor = index.cursor(readahead=2)
+            next(cursor, None)
+            cursor.close()
+
+    def test_index_delete_success(self):
+        repository = InMemoryRepository(512)
+        index = Index(repository, fanout=3)
+        assert not index.delete('5')
+        for key in '5937128604':
+            index.insert(key, f'{key}*')
+        number_of_nodes = index.number_of_nodes
+        assert not index.delete('a')
+        for key in '3816702':
+            assert index.delete(key)
+            assert index.search(key) == (None, None, -1)
+        assert [kvp.key for kvp in index.range()] == list('459')
+        assert [kvp.key for kvp in index.range(reverse=True)] == list('954')
+        assert index.number_of_nodes < number_of_nodes
+        assert index.height == 1
+        assert index.free_id > 0
+        last_id = index.last_id
+        for key in '3816702':
+            index.insert(key, f'{key}**')
+        assert index.last_id == last_id  # freed slots are reused
+        assert index.free_id == 0
+        assert [kvp.value for kvp in index.range('3', '7')] == ['3**', '4*', '5*', '6**']
+        reopened = Index(repository)
+        reopened.load_header()
+        assert reopened.fanout == 3
+        assert reopened.height == index.height
+        assert reopened.free_id == index.free_id
+        assert reopened.last_id == index.last_id
+        assert list(reopened.range()) == list(index.range())
+        for key in '0123456789':
+            assert index.delete(key)
+        assert index.root is None
+        assert index.number_of_nodes == 0
+        assert list(index.range()) == []
+        index.insert('x', 'x*')
+        assert index.search('x')[1] == 'x*'
+        assert index.last_id == last_id
+
+    def test_index_node_ids_success(self):
+        indexes = [Index(InMemoryRepository(512), fanout=3) for _ in range(2)]
+        for key in range(300):
+            for index in indexes:
+                index.insert(str(key), str(key))
+        for index in indexes:
+            assert index.last_id == index.number_of_nodes  # dense ids per index
+            reopened = Index(index.repository)
+            reopened.load_header()
+            assert reopened.last_id == index.last_id
+            expected = list(index.range()) + [Index.Kvp('x', 'x')]
+            reopened.insert('x', 'x')
+            assert list(reopened.range()) == expected
+
+    def test_index_delete_random_success(self):
+        for _ in range(20):
+            fanout = random.randint(3, 8)
+            index = Index(InMemoryRepository(512), fanout=fanout, cache_size=random.choice([0, 4, 64]))
+            expected = list()
+            for _ in range(random.randint(0, 200)):
+                key = str(random.randint(0, 50))
+                expected.append(key)
+                index.insert(key, f'{key}*', replace=False)  # duplicates
+            random.shuffle(expected)
+            while expected:
+                if random.random() < 0.8:
+                    assert index.delete(expected.pop())
+                else:
+                    key = str(random.randint(0, 60))
+                    assert index.delete(key) == (key in expected)
+                    if key in expected:
+                        expected.remove(key)
+                if random.random() < 0.1:
+                    key = str(random.randint(0, 50))
+                    expected.append(key)
+                    index.insert(key, f'{key}*', replace=False)
+                keys = sorted(expected)
+                assert [kvp.key for kvp in index.range(readahead=0)] == keys
+                assert [kvp.key for kvp in index.range(reverse=True, readahead=0)] == keys[::-1]
+                probes = [str(key) for key in range(61)]
+                values = [f'{key}*' if key in expected else None for key in probes]
+                assert [index.search(key)[1] for key in probes] == values
+                assert index.multi_search(probes) == values
+            assert index.root is None
+            assert index.number_of_nodes == 0
+        index = Index(InMemoryRepository(512), fanout=3)
+        for key in 'baac':
+            index.insert(key, f'{key}*', replace=False)
+        assert index.delete('a')  # one of duplicates
+        assert index.search('a')[1] == 'a*'
+        assert index.multi_search(['a']) == ['a*']
+        index.insert('a', 'a**')
+        assert [kvp.value for kvp in index.range()] == ['a**', 'b*', 'c*']
+
+    def test_index_load_success(self):
+        offsets = list()
+
+        class Repository(InMemoryRepository):
+            def write(self, offset, buffer):
+                offsets.append(offset)
+                super().write(offset, buffer)
+
+        index = Index(Repository(512), fanout=3)
+        index.load([])
+        assert index.root is None
+        kvps = [(key, f'{key}*') for key in '5937128604']
+        index.load(kvps, fill_factor=1.0, run_size=3)
+        assert index.height == 1
+        assert index.number_of_leaves == 4
+        assert index.number_of_branches == 1
+        assert offsets[:-1] == sorted(offsets[:-1])  # sequential, the index header goes last
+        assert offsets[-1] == 0
+        assert list(index.range()) == sorted(Index.Kvp(*kvp) for kvp in kvps)
+        assert [kvp.key for kvp in index.range(reverse=True)] == list('9876543210')
+        assert index.search('7')[1] == '7*'
+        assert list(Index.sort_kvps([('b', 1), ('a', 2), ('b', 3), ('a', 4)], run_size=1)) == \
+               [('a', 2), ('a', 4), ('b', 1), ('b', 3)]
+        offsets.clear()
+        index = Index(Repository(512), page_size=1024)
+        kvps = [(f'{k:04}', 'v' * 3000) for k in range(300)]  # overflow page chains of 3 pages
+        index.load(kvps)
+        assert offsets[:-1] == sorted(offsets[:-1])
+        assert offsets[-1] == 0
+        assert index.last_id == index.number_of_nodes + 3 * len(kvps)
+        assert list(index.range()) == [Index.Kvp(*kvp) for kvp in kvps]
+        for key, _ in kvps:
+            assert index.delete(key)
+        last_id = index.last_id
+        index.load(kvps[:100])
+        assert index.last_id == last_id  # freed pages are reused
+        assert list(index.range()) == [Index.Kvp(*kvp) for kvp in kvps[:100]]
+
+    def test_index_load_random_success(self):
+        def validate(index, tree, level=0):
+            if level > 0:
+                assert tree.keys_count >= index.get_min_keys_count(leaf=level == index.height)
+            if level < index.height:
+                for position in range(tree.keys_count + 1):
+                    validate(index, index.load_tree(tree.kid_ids[position], leaf=level + 1 == index.height), level + 1)
+
+        for _ in range(20):
+            fanout = random.randint(3, 8)
+            index = Index(InMemoryRepository(512), fanout=fanout)
+            kvps = [(str(random.randint(0, 300)), str(k)) for k in range(random.randint(1, 500))]
+            presorted = random.random() < 0.5
+            if presorted:
+                kvps.sort(key=lambda kvp: Text.get_sort_key(kvp[0]))
+            index.load(kvps, fill_factor=random.choice([0.1, 0.5, 0.9, 1.0]), presorted=presorted,
+                       run_size=random.randint(1, 100))
+            validate(index, index.root)
+            expected = sorted(kvps, key=lambda kvp: Text.get_sort_key(kvp[0]))  # stable
+            assert [tuple(kvp) for kvp in index.range()] == expected
+            assert [tuple(kvp) for kvp in index.range(reverse=True, readahead=0)] == expected[::-1]
+            for key, _ in kvps[:20]:
+                assert index.delete(key)
+            index.insert('x', 'x*')
+            assert index.search('x')[1] == 'x*'
+
+    def test_index_slotted_success(self):
+        repository = InMemoryRepository(512)
+        index = Index(repository, page_size=1024)
+        codec = index.codec
+        assert index.fanout == codec.fanout
+        with self.assertRaises(AssertionError):
+            index.insert('k' * (codec.max_key_size + 1), '')
+        prefix = 'http://www.example.com/'
+        keys = [f'{prefix}{k:04}/{"x" * (k % 40)}' for k in range(300)]
+        for key in keys[::2] + keys[1::2]:
+            index.insert(key, key[::-1])
+        assert index.height > 0
+        assert all(len(key) <= len(prefix) + 4 for key in index.root.keys[:index.root.keys_count])  # truncated
+        assert [kvp.key for kvp in index.range()] == keys
+        value = 'v' * 2000  # overflow page chain
+        index.insert(keys[7], value)
+        assert index.search(keys[7])[1] == value
+        assert index.multi_search([keys[7], keys[8], 'x']) == [value, keys[8][::-1], None]
+        assert [kvp.value for kvp in index.prefix(keys[7])] == [value]
+        last_id = index.last_id
+        index.insert(keys[7], 'v')
+        index.insert(keys[9], value)  # overflow pages are reused
+        assert index.last_id == last_id
+        reopened = Index(repository)
+        reopened.load_header()
+        assert reopened.page_size == 1024
+        assert reopened.fanout == index.fanout
+        assert list(reopened.range()) == list(index.range())
+        assert reopened.search(keys[9])[1] == value
+        for key in keys:
+            assert index.delete(key)
+        assert index.root is None
+        assert index.number_of_nodes == 0
+
+    def test_index_slotted_random_success(self):
+        for _ in range(5):
+            index = Index(InMemoryRepository(512), page_size=random.choice([512, 1024]),
+                          cache_size=random.choice([0, 8]))
+            codec = index.codec
+            expected = dict()
+            for _ in range(1500):
+                if random.random() < 0.7 or not expected:
+                    key = ''.join(random.choice('abcxyz') for _ in range(random.randint(1, codec.max_key_size)))
+                    value = 'v' * random.choice([0, 5, codec.max_value_size, codec.max_value_size + 1, 2000])
+                    index.insert(key, value)
+                    expected[key] = value
+                else:
+                    key = random.choice(list(expected))
+                    assert index.delete(key)
+                    del expected[key]
+            keys = sorted(expected, key=Text.get_sort_key)
+            assert [kvp.key for kvp in index.range()] == keys
+            assert [kvp.key for kvp in index.range(reverse=True, readahead=0)] == keys[::-1]
+            assert index.multi_search(keys) == [expected[key] for key in keys]
+            for key in keys:
+                assert index.delete(key)
+            assert index.root is None
+            assert index.number_of_nodes == 0
+
+    def test_index_slotted_load_success(self):
+        for _ in range(5):
+            repository = InMemoryRepository(512)
+            index = Index(repository, page_size=1024)
+            kvps = [(''.join(random.choice('abc') for _ in range(random.randint(1, 40))),
+                     'v' * random.choice([0, 3, 500, 3000])) for _ in range(random.randint(1, 600))]
+            index.load(kvps, fill_factor=random.choice([0.1, 0.5, 0.9, 1.0]), run_size=random.randint(1, 100))
+            expected = sorted(kvps, key=lambda kvp: Text.get_sort_key(kvp[0]))  # stable
+            assert [tuple(kvp) for kvp in index.range()] == expected
+            reopened = Index(repository)
+            reopened.load_header()
+            assert [tuple(kvp) for kvp in reopened.range(reverse=True)] == expected[::-1]
+            for key, _ in kvps[:50]:
+                assert reopened.delete(key)
+
     # def test_index_insert_5937128604_success(self):
     #     fanout = 3
     #     repository = InMemoryRepository(512)
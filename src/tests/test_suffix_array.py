@@ -2,9 +2,22 @@
 # -*- encoding: utf-8 -*-
 # UI Lab Inc. Arthur Amshukov
 #
+import os
+import pathlib
+import random
+import tempfile
 import unittest
+from collections import Counter
+from array import array
+import numpy as np
 from graph.core.text import Text
 from graph.algorithms.suffix_array import SuffixArray
+from graph.algorithms.suffix_index import SuffixIndex
+from graph.algorithms.fm_index import FmIndex
+from graph.algorithms.generalized_suffix_array import GeneralizedSuffixArray
+from graph.algorithms.external_suffix_array import ExternalSuffixArray
+from graph.adt.bit_vector import BitVector
+from graph.adt.wavelet_matrix import WaveletMatrix
 
 
 class Test(unittest.TestCase):
@@ -181,6 +194,281 @@ class Test(unittest.TestCase):
         for k in range(1, 1001):
             test_case(11 * k)
 
+    def test_build_suffix_array_sais_success(self):
+        for length in (0, 1, 2, 10, 100, 2000):
+            for abc_size in (2, 3, 5, 300):
+                sequence = [random.randint(1, abc_size - 1) for _ in range(length)]
+                sa = SuffixArray.build_suffix_array_sais(sequence, abc_size)
+                assert isinstance(sa, array)
+                assert sa.typecode == 'i'
+                suffixes = sequence + [0]
+                assert sa.tolist() == sorted(range(length + 1), key=lambda k: suffixes[k:])
+        sequence = [1, 2] * 500 + [1] * 3000 + [1, 2] * 500 + [1] * 3000 + [2]  # long LMS-substrings
+        suffixes = sequence + [0]
+        sa = SuffixArray.build_suffix_array_sais(sequence, 3)
+        assert sa.tolist() == sorted(range(len(suffixes)), key=lambda k: suffixes[k:])
+
+    def test_build_suffix_array_alphabets_success(self):
+        def naive(symbols):
+            return sorted(range(len(symbols) + 1), key=lambda k: list(symbols[k:]))
+
+        for text in ('', 'привет, мир, привет', 'naïve café résumé', '日本語のテキスト日本語', 'a\U0001F600b\U0001F600a',
+                     'a\0b\0a\xff\u0100'):
+            assert SuffixArray.build_suffix_array_induced_sorting(text) == naive([ord(ch) for ch in text])
+        for text in (b'', b'\x00\xff\x00\xff\x01', bytes(random.getrandbits(8) for _ in range(1000))):
+            assert SuffixArray.build_suffix_array_induced_sorting(text) == naive(text)
+        for length in (1, 10, 1000):
+            tokens = [random.choice((-7, 3, 10 ** 12, 2 ** 40, 5)) for _ in range(length)]
+            assert SuffixArray.build_suffix_array_induced_sorting(tokens) == naive(tokens)
+            tokens = [random.randint(0, 200000) for _ in range(length)]
+            assert SuffixArray.build_suffix_array_induced_sorting(tokens) == naive(tokens)
+        ranks, abc_size = SuffixArray.rank_alphabet([10 ** 12, 5, 10 ** 12, 7])
+        assert ranks.tolist() == [3, 1, 3, 2]
+        assert abc_size == 4
+        ranks, abc_size = SuffixArray.rank_alphabet('ba\u4e00')
+        assert ranks.tolist() == [2, 1, 3]
+        assert abc_size == 4
+
+    def test_find_longest_repeated_substring_tokens_success(self):
+        tokens = [7, 1, 2, 3, 9, 1, 2, 3, 4]
+        assert SuffixArray.find_longest_repeated_substring(tokens) == (5, 3)
+        assert SuffixArray.find_longest_repeated_substring(b'abcXabcY') == (0, 3)
+        assert SuffixArray.find_longest_repeated_substring('шалаш-шалаш') == (6, 5)
+
+    @staticmethod
+    def find_all_occurrences_naive(text, pattern):
+        return [k for k in range(len(text) - len(pattern) + 1) if text[k:k + len(pattern)] == pattern]
+
+    def test_suffix_index_success(self):
+        index = SuffixIndex('mississippi')
+        assert len(index) == 11
+        assert index.suffixes.tolist() == [11, 10, 7, 4, 1, 0, 9, 8, 6, 3, 5, 2]
+        assert index.count('issi') == 2
+        assert index.locate('issi').tolist() == [1, 4]
+        assert index.locate('i').tolist() == [1, 4, 7, 10]
+        assert index.find('ss') == (10, 12)
+        assert index.contains('mississippi')
+        assert not index.contains('mississippis')
+        assert not index.contains('x')
+        assert index.count('') == 12
+        assert index.count_all(['s', 'p', 'pi', 'ppp']).tolist() == [4, 2, 1, 0]
+        assert index.contains_all(['sip', 'pis']).tolist() == [True, False]
+        assert [offsets.tolist() for offsets in index.locate_all(['ssi', 'm'])] == [[2, 5], [0]]
+        index = SuffixIndex([10 ** 9, 5, 10 ** 9, 5, 7])
+        assert index.locate([10 ** 9, 5]).tolist() == [0, 2]
+        index = SuffixIndex(b'abracadabra')
+        assert index.locate(b'abra').tolist() == [0, 7]
+
+    def test_suffix_index_random_success(self):
+        for length in (0, 1, 2, 10, 100, 1000):
+            for alphabet in ('a', 'ab', 'acgt'):
+                text = ''.join(random.choice(alphabet) for _ in range(length))
+                index = SuffixIndex(text)
+                patterns = [''.join(random.choice(alphabet + 'z') for _ in range(random.randint(1, 8)))
+                            for _ in range(100)]
+                patterns += [text[k:k + random.randint(1, 20)] for k in range(0, length, 7)]
+                for pattern, offsets in zip(patterns, index.locate_all(patterns)):
+                    assert offsets.tolist() == Test.find_all_occurrences_naive(text, pattern)
+
+    def test_bit_vector_wavelet_matrix_success(self):
+        bits = np.random.rand(1000) < 0.3
+        vector = BitVector(bits)
+        assert len(vector) == 1000
+        assert vector.count == bits.sum()
+        assert [vector[k] for k in range(1000)] == bits.astype(int).tolist()
+        assert [vector.rank1(k) for k in range(1001)] == [int(bits[:k].sum()) for k in range(1001)]
+        values = np.random.randint(0, 11, 500)
+        matrix = WaveletMatrix(values, 11)
+        assert [matrix[k] for k in range(500)] == values.tolist()
+        for value in range(11):
+            assert ([matrix.rank(value, k) for k in range(0, 501, 7)] ==
+                    [int((values[:k] == value).sum()) for k in range(0, 501, 7)])
+
+    def test_fm_index_success(self):
+        index = FmIndex('mississippi', sample=4)
+        assert FmIndex.build_burrows_wheeler_transform([2, 1, 4, 4, 1, 4, 4, 1, 3, 3, 1],
+                                                       SuffixIndex('mississippi').suffixes).tolist() ==\
+            [1, 3, 4, 4, 2, 0, 3, 1, 4, 4, 1, 1]  # ipssm$pissii
+        assert index.count('issi') == 2
+        assert index.locate('issi').tolist() == [1, 4]
+        assert index.locate('i').tolist() == [1, 4, 7, 10]
+        assert index.contains('mississippi')
+        assert not index.contains('mississippis')
+        assert not index.contains('x')
+        assert index.count('') == 12
+        assert index.count_all(['s', 'p', 'pi', 'ppp']).tolist() == [4, 2, 1, 0]
+        assert [offsets.tolist() for offsets in index.locate_all(['ssi', 'm'])] == [[2, 5], [0]]
+        index = FmIndex([10 ** 9, 5, 10 ** 9, 5, 7])
+        assert index.locate([10 ** 9, 5]).tolist() == [0, 2]
+
+    def test_fm_index_random_success(self):
+        for length in (0, 1, 2, 10, 100, 1000):
+            for alphabet in ('a', 'ab', 'acgt', 'пр一'):
+                text = ''.join(random.choice(alphabet) for _ in range(length))
+                index = FmIndex(text, sample=random.randint(1, 8))
+                patterns = [''.join(random.choice(alphabet + 'z') for _ in range(random.randint(1, 8)))
+                            for _ in range(100)]
+                patterns += [text[k:k + random.randint(1, 20)] for k in range(0, length, 7)]
+                for pattern, offsets in zip(patterns, index.locate_all(patterns)):
+                    assert offsets.tolist() == Test.find_all_occurrences_naive(text, pattern)
+
+    def test_fm_index_save_load_success(self):
+        text = bytes(random.choice(b'acgt') for _ in range(10000))
+        index = FmIndex(text)
+        assert index.nbytes < len(text)
+        patterns = [text[k:k + 10] for k in range(0, len(text), 97)] + [b'acgtacgtacgt', b'x']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.npz')
+            index.save(path)
+            loaded = FmIndex.load(path)
+        assert len(loaded) == len(index)
+        assert loaded.count_all(patterns).tolist() == index.count_all(patterns).tolist()
+        assert ([offsets.tolist() for offsets in loaded.locate_all(patterns)] ==
+                [offsets.tolist() for offsets in index.locate_all(patterns)])
+
+    def test_generalized_suffix_array_success(self):
+        gsa = GeneralizedSuffixArray(['abcde', 'xbcdy', 'zzbcdq'])
+        assert len(gsa) == 3
+        assert len(gsa.suffixes) == len(gsa.document_ids) == len(gsa.offsets) == 20
+        assert gsa.find_longest_common_substring() == (3, [(0, 1), (1, 1), (2, 2)])
+        assert gsa.find_longest_common_substring(2) == (3, [(0, 1), (1, 1), (2, 2)])  # all occurrences
+        assert gsa.list_documents('bc').tolist() == [0, 1, 2]
+        assert gsa.list_documents('z').tolist() == [2]
+        assert gsa.list_documents('w').tolist() == []
+        assert gsa.locate('d') == [(0, 3), (1, 3), (2, 4)]
+        assert gsa.count('cd') == 3
+        documents, counts = gsa.count_documents('z')
+        assert documents.tolist() == [2]
+        assert counts.tolist() == [2]
+        gsa = GeneralizedSuffixArray([f'record-{k % 50}' for k in range(300)])  # more documents than chr(k) allows
+        assert gsa.list_documents('record-7').tolist() == [k for k in range(300) if str(k % 50).startswith('7')]
+        assert gsa.find_longest_common_substring()[0] == len('record-')
+        gsa = GeneralizedSuffixArray([[1, 2, 3, 10 ** 9], [2, 3, 10 ** 9, 5]])
+        assert gsa.find_longest_common_substring() == (3, [(0, 1), (1, 0)])
+        gsa = GeneralizedSuffixArray([np.array([1, 2, 3, 2, 3], dtype=np.int32), array('i', [7, 2, 3]), [2, 3]])
+        assert isinstance(gsa.documents[0], np.ndarray) and isinstance(gsa.documents[1], np.ndarray)
+        assert gsa.find_longest_common_substring() == (2, [(0, 1), (0, 3), (1, 1), (2, 0)])
+        assert gsa.find_longest_common_substring(1) == (5, [(0, 0)])
+
+    def test_generalized_suffix_array_random_success(self):
+        def find_longest_common_substring_naive(documents, k):
+            result = 0
+            for document in documents:
+                for i in range(len(document)):
+                    for j in range(i + result + 1, len(document) + 1):
+                        if sum(document[i:j] in other for other in documents) >= k:
+                            result = j - i
+            return result
+
+        for _ in range(200):
+            documents = [''.join(random.choice('abc') for _ in range(random.randint(0, 8)))
+                         for _ in range(random.randint(1, 6))]
+            gsa = GeneralizedSuffixArray(documents)
+            for k in range(1, len(documents) + 1):
+                length, occurrences = gsa.find_longest_common_substring(k)
+                assert length == find_longest_common_substring_naive(documents, k)
+                if length > 0:
+                    assert len({documents[d][offset:offset + length] for d, offset in occurrences}) == 1
+                    assert len({d for d, _ in occurrences}) >= k
+                    d, offset = occurrences[0]
+                    assert occurrences == gsa.locate(documents[d][offset:offset + length])  # all occurrences
+            pattern = ''.join(random.choice('abc') for _ in range(random.randint(1, 3)))
+            assert gsa.list_documents(pattern).tolist() == [d for d, document in enumerate(documents)
+                                                            if pattern in document]
+            assert gsa.locate(pattern) == [(d, offset) for d, document in enumerate(documents)
+                                           for offset in Test.find_all_occurrences_naive(document, pattern)]
+
+    def test_external_suffix_array_success(self):
+        for text in ['', 'a', 'banana', 'mississippi', 'шалаш-шалаш', b'abracadabra', [5, 10 ** 9, 5, 10 ** 9, 5],
+                     'ab' * 1000 + 'c' + 'ab' * 1000]:
+            expected = SuffixArray.build_suffix_array_sais(*SuffixArray.rank_alphabet(text)).tolist()
+            chunk_sizes = [1, 7, 1 << 20] if len(text) < 100 else [7, 256, 1 << 20]  # a run file per chunk
+            for chunk_size in chunk_sizes:
+                assert ExternalSuffixArray.build(text, chunk_size=chunk_size, workers=1, block_size=5).tolist()\
+                       == expected
+
+    def test_external_suffix_array_file_success(self):
+        with tempfile.TemporaryDirectory() as directory:
+            text = bytes(random.choice(b'acgt') for _ in range(20000))
+            text_path = pathlib.Path(directory) / 'text.bin'
+            text_path.write_bytes(text)
+            suffixes_path = os.path.join(directory, 'text.sa')
+            suffixes = ExternalSuffixArray.build(text_path, path=suffixes_path, chunk_size=3000, workers=2,
+                                                 directory=directory, block_size=256)
+            expected = SuffixArray.build_suffix_array_sais(*SuffixArray.rank_alphabet(text)).tolist()
+            assert suffixes.tolist() == expected
+            del suffixes
+            assert np.fromfile(suffixes_path, dtype=np.int64).tolist() == expected
+            assert sorted(os.listdir(directory)) == ['text.bin', 'text.sa']  # temporary runs are removed
+
+    def test_external_suffix_array_random_success(self):
+        for _ in range(100):
+            text = ''.join(random.choice('ab') for _ in range(random.randint(0, 300)))
+            expected = SuffixArray.build_suffix_array_sais(*SuffixArray.rank_alphabet(text)).tolist()
+            assert ExternalSuffixArray.build(text, chunk_size=random.randint(1, 64), workers=1,
+                                             block_size=random.randint(1, 32)).tolist() == expected
+
+    def test_external_suffix_array_wide_ranks_success(self):
+        max_narrow_length = ExternalSuffixArray.MAX_NARROW_LENGTH
+        ExternalSuffixArray.MAX_NARROW_LENGTH = 0  # texts over 4G symbols, uint64 ranks and S16 keys
+        try:
+            for text in ['a', 'banana', 'mississippi', 'ab' * 500 + 'c' + 'ab' * 500,
+                         ''.join(random.choice('ab') for _ in range(300))]:
+                expected = SuffixArray.build_suffix_array_sais(*SuffixArray.rank_alphabet(text)).tolist()
+                for chunk_size in [1, 7, 1 << 20]:
+                    assert ExternalSuffixArray.build(text, chunk_size=chunk_size, workers=1, block_size=5).tolist()\
+                           == expected
+        finally:
+            ExternalSuffixArray.MAX_NARROW_LENGTH = max_narrow_length
+
+    def test_build_longest_common_prefixes_array_success(self):
+        for text in ['', 'a', 'banana', 'a' * 1000, 'ab' * 500 + 'x', 'шалаш-шалаш', b'abracadabra',
+                     [10 ** 9, 3, 10 ** 9, 3, 10 ** 9]]:
+            suffixes = SuffixArray.build_suffix_array_induced_sorting(text)
+            lcp = SuffixArray.build_longest_common_prefixes_array(text, suffixes)
+            assert lcp.dtype == np.int32
+            assert lcp.tolist() == SuffixArray.build_longest_common_prefixes(text, suffixes)
+        for _ in range(300):
+            text = ''.join(random.choice('ab' if _ % 2 else 'abcdefgh') for _ in range(random.randint(0, 200)))
+            suffixes = SuffixArray.build_suffix_array_induced_sorting(text)
+            assert (SuffixArray.build_longest_common_prefixes_array(text, suffixes).tolist() ==
+                    SuffixArray.build_longest_common_prefixes(text, suffixes))
+
+    def test_suffix_index_lcp_analytics_success(self):
+        index = SuffixIndex('banana')
+        assert index.ranks.tolist() == [4, 3, 6, 2, 5, 1, 0]
+        assert index.get_longest_common_extension(1, 3) == 3
+        assert index.get_longest_common_extension(0, 2) == 0
+        assert index.get_longest_common_extension(2, 2) == 4
+        assert index.get_longest_common_extensions([1, 1, 5], [3, 5, 5]).tolist() == [3, 1, 1]
+        assert index.count_distinct_substrings() == 15
+        assert index.find_top_repeated_substrings(3) == [(1, 1, 3), (1, 3, 2), (2, 2, 2)]
+        assert index.find_top_repeated_substrings(3, min_length=2) == [(1, 3, 2), (2, 2, 2)]
+        assert SuffixIndex('abc').find_top_repeated_substrings(3) == []
+        assert SuffixIndex('').count_distinct_substrings() == 0
+
+    def test_suffix_index_lcp_analytics_random_success(self):
+        for _ in range(300):
+            text = ''.join(random.choice('abc'[:random.randint(1, 3)]) for _ in range(random.randint(0, 40)))
+            index = SuffixIndex(text)
+            n = len(text)
+            counts = Counter(text[i:j] for i in range(n) for j in range(i + 1, n + 1))
+            assert index.count_distinct_substrings() == len(counts)
+            for _ in range(10):
+                lhs, rhs = random.randint(0, n), random.randint(0, n)
+                length = 0
+                while lhs + length < n and rhs + length < n and text[lhs + length] == text[rhs + length]:
+                    length += 1
+                assert index.get_longest_common_extension(lhs, rhs) == length
+            top = index.find_top_repeated_substrings(5)
+            for offset, length, count in top:
+                substring = text[offset:offset + length]
+                assert counts[substring] == count > 1
+                assert text.find(substring) == offset
+            repeats = sorted((count for count in counts.values() if count > 1), reverse=True)
+            assert [count for _, _, count in top] == sorted(count for _, _, count in top)[::-1]
+            assert not repeats or top[0][2] == repeats[0]
+
     def test_find_longest_repeated_substring_success(self):
         """
         https://algs4.cs.princeton.edu/63suffix/tinyTale.txt
@@ -2,12 +2,16 @@
 # -*- encoding: utf-8 -*-
 # UI Lab Inc. Arthur Amshukov
 #
+import itertools
+import mmap
 import os
 import random
 import re
+import tempfile
 import unittest
 from graph.core.text import Text
 from graph.algorithms.text_algorithms import TextAlgorithms
+from graph.algorithms.aho_corasick import AhoCorasick
 
 
 class Test(unittest.TestCase):
@@ -77,6 +81,112 @@ class Test(unittest.TestCase):
         for k in range(1, 10001):
             test_case(11 * k)
 
+    def test_aho_corasick_success(self):
+        automaton = AhoCorasick(['he', 'she', 'his', 'hers'])
+        assert automaton.search('ushers') == [(1, 1), (2, 0), (2, 3)]
+        assert automaton.search('ushers', how_many=1) == [(1, 1)]
+        text = 'ushers' * AhoCorasick.BLOCK_SIZE
+        assert automaton.search(text, how_many=7) == automaton.search(text)[:7]
+        assert automaton.search(text, how_many=10 ** 6) == automaton.search(text)
+        assert automaton.nbytes >= 4 * len(automaton) * (len(set('heisr')) + 1)
+        assert automaton.search('') == []
+        assert automaton.search('xyz') == []
+        assert list(automaton.search_stream(['us', 'h', 'ers'])) == [(1, 1), (2, 0), (2, 3)]
+        automaton = AhoCorasick([b'ab', b'ab', b'b'])
+        assert automaton.search(b'aab') == [(1, 0), (1, 1), (2, 2)]
+        automaton = AhoCorasick([[1, 2], [2, 3], [10 ** 9]])
+        assert automaton.search([1, 2, 3, 10 ** 9, 1, 2]) == [(0, 0), (1, 1), (3, 2), (4, 0)]
+        automaton = AhoCorasick([[token, token + 1] for token in range(0, 2000, 2)])  # wide alphabet
+        assert not automaton.dense
+        assert automaton.nbytes < 4 * len(automaton) * 2001
+        assert automaton.search([3, 4, 5, 10, 11]) == [(1, 2), (3, 5)]
+        assert automaton.search([3, 4, 5, 10, 11], how_many=1) == [(1, 2)]
+        assert AhoCorasick([]).search('abc') == []
+
+    def test_aho_corasick_random_success(self):
+        def search_naive(text, patterns):
+            return sorted((offset, pattern_id) for pattern_id, pattern in enumerate(patterns)
+                          for offset in range(len(text) - len(pattern) + 1)
+                          if text[offset:offset + len(pattern)] == pattern)
+
+        wide = ''.join(chr(0x4e00 + k) for k in range(AhoCorasick.DENSE_MAX_WIDTH))
+        for _ in range(500):
+            sparse = random.random() < 0.5
+            symbols = 'abc' + wide[:3] if sparse else 'abc'
+            patterns = [''.join(random.choice(symbols) for _ in range(random.randint(1, 5)))
+                        for _ in range(random.randint(1, 10))]
+            if sparse:
+                patterns.append(wide)
+            text = ''.join(random.choice(symbols + 'd') for _ in range(random.randint(0, 100)))
+            automaton = AhoCorasick(patterns)
+            assert automaton.dense != sparse
+            result = automaton.search(text)
+            assert sorted(result) == search_naive(text, patterns)
+            cuts = sorted(random.randint(0, len(text)) for _ in range(3))
+            chunks = [text[lhs:rhs] for lhs, rhs in zip([0] + cuts, cuts + [len(text)])]
+            assert list(automaton.search_stream(chunks)) == result
+
+    def test_search_stream_kmp_success(self):
+        assert list(TextAlgorithms.search_stream_kmp('ACABACACDACABACACD', 'ACABACACD', chunk_size=4)) == [0, 9]
+        assert list(TextAlgorithms.search_stream_kmp(['AC', 'A', 'BACA', 'CD'], 'ACA')) == [0, 4]
+        assert list(TextAlgorithms.search_stream_kmp(b'aaaaa', b'aa', how_many=3, chunk_size=2)) == [0, 1, 2]
+        assert list(TextAlgorithms.search_stream_kmp('', 'a')) == []
+        matches = TextAlgorithms.search_stream_kmp(itertools.repeat('ab'), 'ba')
+        assert next(matches) == 1 and next(matches) == 3  # lazy
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'text.bin')
+            data = os.urandom(10000) + b'needle' + os.urandom(10) + b'needleneedle'
+            with open(path, 'wb') as stream:
+                stream.write(data)
+            expected = [m.start() for m in re.finditer(b'needle', data)]
+            with open(path, 'rb') as stream:
+                assert list(TextAlgorithms.search_stream_kmp(stream, b'needle', chunk_size=1000)) == expected
+            with open(path, 'rb') as stream, mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                assert list(TextAlgorithms.search_stream_kmp(mapped, b'needle', chunk_size=1003)) == expected
+            with open(path, 'w', encoding='utf-8') as stream:
+                stream.write('шалаш' * 100)
+            with open(path, 'r', encoding='utf-8') as stream:
+                assert list(TextAlgorithms.search_stream_kmp(stream, 'шшал', chunk_size=7)) == list(range(4, 495, 5))
+
+    def test_search_stream_kmp_random_success(self):
+        for _ in range(2000):
+            text = ''.join(random.choice('ab') for _ in range(random.randint(0, 60)))
+            pattern = ''.join(random.choice('ab') for _ in range(random.randint(1, 5)))
+            chunk_size = random.randint(1, 10)
+            expected = [k for k in range(len(text) - len(pattern) + 1) if text[k:k + len(pattern)] == pattern]
+            assert list(TextAlgorithms.search_stream_kmp(text, pattern, chunk_size=chunk_size)) == expected
+            assert list(TextAlgorithms.search_stream_kmp(text.encode(), pattern.encode(),
+                                                         chunk_size=chunk_size)) == expected
+            assert list(TextAlgorithms.search_stream_kmp(text, pattern, how_many=2,
+                                                         chunk_size=chunk_size)) == expected[:2]
+    def test_search_text_engines_success(self):
+        for engine in TextAlgorithms.Engines:
+            assert TextAlgorithms.search_text('ACABACACDACABACACD', 'ACABACACD', engine=engine) == [0, 9]
+            assert TextAlgorithms.search_text('ACABACACD', 'ACA', engine=engine) == [0, 4]
+            assert TextAlgorithms.search_text('ACABACACD', 'ACA', how_many=1, engine=engine) == [0]
+            assert TextAlgorithms.search_text('aaaaa', 'aa', engine=engine) == [0, 1, 2, 3]
+            assert TextAlgorithms.search_text(b'abababa', b'aba', engine=engine) == [0, 2, 4]
+            assert TextAlgorithms.search_text([1, 2, 1, 2, 1], [1, 2, 1], engine=engine) == [0, 2]
+            assert TextAlgorithms.search_text('', 'a', engine=engine) == []
+            assert TextAlgorithms.search_text('ab', 'abc', engine=engine) == []
+        assert TextAlgorithms.select_engine('', 'needle') == TextAlgorithms.Engines.HORSPOOL
+        assert TextAlgorithms.select_engine('', 'ACGTACGA') == TextAlgorithms.Engines.HORSPOOL
+        assert TextAlgorithms.select_engine('', 'abababab') == TextAlgorithms.Engines.TWO_WAY
+        assert TextAlgorithms.select_engine('', 'aab') == TextAlgorithms.Engines.Z
+        assert TextAlgorithms.calculate_z_array('aabxaab') == [7, 1, 0, 0, 3, 1, 0]
+
+    def test_search_text_engines_random_success(self):
+        for _ in range(3000):
+            alphabet = random.choice(['a', 'ab', 'abc', 'abcdefg'])
+            text = ''.join(random.choice(alphabet) for _ in range(random.randint(0, 80)))
+            pattern = ''.join(random.choice(alphabet) for _ in range(random.randint(1, 9)))
+            if text and random.random() < 0.3:
+                k = random.randrange(len(text))
+                pattern = text[k:k + random.randint(1, 9)]
+            expected = [k for k in range(len(text) - len(pattern) + 1) if text[k:k + len(pattern)] == pattern]
+            for engine in TextAlgorithms.Engines:
+                assert TextAlgorithms.search_text(text, pattern, engine=engine) == expected
+                assert TextAlgorithms.search_text(text, pattern, how_many=2, engine=engine) == expected[:2]
 
 if __name__ == '__main__':
     """